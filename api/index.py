@@ -1,125 +1,308 @@
-from flask import Flask, request, jsonify, render_template, session, redirect, url_for
-import google.generativeai as genai
-from supabase import create_client, Client
+from flask import Flask, Response, request, jsonify, render_template, session, redirect, url_for
 from dotenv import load_dotenv
 import os
-from pywebpush import webpush
+import sys
+import importlib
 import json
 import uuid
 import re
 import time
-import gc  # 가비지 컬렉션용
+import hashlib
+import threading
+import atexit
+import queue
+import sqlite3
+import tempfile
+from urllib.parse import urlparse
+from email.utils import parsedate_to_datetime
 from datetime import datetime
+from collections import deque
+from functools import lru_cache
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import numpy as np
 
 # 환경변수 로딩
 load_dotenv()
 
-# --- [사주 계산 함수 초고속 최적화 버전 + 캐싱] ---
-# 사주 계산 결과 캐시 (메모리 캐싱으로 동일 데이터 반복 계산 방지)
-saju_cache = {}
-
-# --- [사주 분석 결과 캐시] ---
-# 동일한 사주 + MBTI 조합에 대한 AI 분석 결과를 캐싱 (파일 기반)
-import json
-import os
-
-SAJU_CACHE_FILE = os.path.join(os.path.dirname(__file__), 'saju_cache.json')
-MATCHING_CACHE_FILE = os.path.join(os.path.dirname(__file__), 'matching_cache.json')
+# --- [지연 로딩] ---
+# google.generativeai, supabase, pywebpush, requests는 import만 해도 1초 가까이 걸리므로
+# 모듈 로드 시점이 아니라 처음 사용할 때 불러와 콜드 스타트(Vercel 인스턴스마다 발생)를 줄임
+class LazyProxy:
+    """처음 속성에 접근할 때 factory()로 실제 객체(모듈/클라이언트)를 만들어 위임하는 대리 객체"""
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._target = None
+        self._lock = threading.Lock()
+
+    def _resolve(self):
+        if self._target is None:
+            with self._lock:
+                if self._target is None:
+                    self._target = self._factory()
+        return self._target
+
+    @property
+    def is_loaded(self):
+        return self._target is not None
+
+    def __getattr__(self, name):
+        return getattr(self._resolve(), name)
+
+requests = LazyProxy(lambda: importlib.import_module('requests'))
+
+# --- [SQLite 기반 키-값 캐시] ---
+# JSON 파일 전체를 다시 쓰는 대신 WAL 모드 SQLite에 저장하여
+# O(1) 단건 조회, 일괄 upsert, LRU/TTL 제거, 여러 워커 프로세스의 동시 접근을 지원
+def _resolve_cache_dir():
+    """캐시 디렉터리 결정 (api 폴더가 읽기 전용이면 임시 폴더 사용 - Vercel)"""
+    cache_dir = os.getenv('LOVECODE_CACHE_DIR')
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        return cache_dir
+    api_dir = os.path.dirname(os.path.abspath(__file__))
+    return api_dir if os.access(api_dir, os.W_OK) else tempfile.gettempdir()
+
+CACHE_DIR = _resolve_cache_dir()
+CACHE_DB_FILE = os.path.join(CACHE_DIR, 'lovecode_cache.db')
+
+def open_sqlite_connection(db_path):
+    """WAL 모드 SQLite 연결 생성 (autocommit, 여러 프로세스 동시 접근용 busy_timeout)"""
+    conn = sqlite3.connect(db_path, timeout=5.0, isolation_level=None)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA busy_timeout=5000')
+    return conn
+
+class SqliteCache:
+    """WAL 모드 SQLite 키-값 캐시 (스레드별 연결, 접근 시각 기반 LRU + TTL 만료)"""
+
+    EVICT_CHECK_INTERVAL = 64  # 쓰기 64건마다 크기 제한 확인
+
+    def __init__(self, db_path, table, max_entries=10000, ttl=None):
+        self.db_path = db_path
+        self.table = table
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.local = threading.local()
+        self.writes_since_evict = 0
+        self.lock = threading.Lock()
+
+    def _connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = open_sqlite_connection(self.db_path)
+            conn.execute(f'''
+                CREATE TABLE IF NOT EXISTS {self.table} (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            ''')
+            conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{self.table}_accessed_at ON {self.table}(accessed_at)')
+            self.local.conn = conn
+        return conn
+
+    def _min_created_at(self, now):
+        return now - self.ttl if self.ttl else float('-inf')
+
+    def get(self, key, touch=True):
+        """단건 조회 (없거나 만료되었으면 None)"""
+        return self.get_many([key], touch=touch).get(key)
+
+    def get_many(self, keys, touch=True):
+        """여러 키를 한 번에 조회 → {key: value}"""
+        keys = list(keys)
+        if not keys:
+            return {}
+        try:
+            conn = self._connection()
+            now = time.time()
+            found = {}
+            # SQLite 바인딩 변수 제한을 피하기 위해 500개씩 조회
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                rows = conn.execute(
+                    f'SELECT key, value FROM {self.table} WHERE key IN ({placeholders}) AND created_at >= ?',
+                    (*chunk, self._min_created_at(now))
+                ).fetchall()
+                found.update((key, json.loads(value)) for key, value in rows)
+            if touch and found:
+                found_keys = list(found)
+                for start in range(0, len(found_keys), 500):
+                    chunk = found_keys[start:start + 500]
+                    placeholders = ','.join('?' * len(chunk))
+                    conn.execute(f'UPDATE {self.table} SET accessed_at = ? WHERE key IN ({placeholders})', (now, *chunk))
+            return found
+        except Exception as e:
+            print(f"⚠️ 캐시 조회 오류 ({self.table}): {e}")
+            return {}
 
-# 전역 메모리 캐시 (파일 I/O 최소화)
-_global_matching_cache = None
-_cache_save_counter = 0
+    def put(self, key, value):
+        """단건 저장"""
+        self.put_many({key: value})
 
-def load_saju_cache():
-    """캐시 파일에서 사주 분석 캐시 로드"""
-    try:
-        if os.path.exists(SAJU_CACHE_FILE):
-            with open(SAJU_CACHE_FILE, 'r', encoding='utf-8') as f:
-                # MBTI별 캐시 로드 (키는 MBTI 문자열)
-                cache_data = json.load(f)
-                print(f"✅ 캐시 파일 로드 완료: {len(cache_data)}개 항목")
-                if 'ENFP' in cache_data:
-                    preview = cache_data['ENFP'][:100] + "..."
-                    print(f"📋 ENFP 템플릿 미리보기: {preview}")
-                return cache_data  # 그대로 반환
-    except Exception as e:
-        print(f"❌ 캐시 파일 로드 오류: {e}")
-    return {}
+    def put_many(self, items):
+        """여러 항목을 하나의 트랜잭션으로 upsert"""
+        if not items:
+            return
+        try:
+            conn = self._connection()
+            now = time.time()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.executemany(
+                    f'''INSERT INTO {self.table} (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)
+                        ON CONFLICT(key) DO UPDATE SET value = excluded.value,
+                            created_at = excluded.created_at, accessed_at = excluded.accessed_at''',
+                    [(key, json.dumps(value, ensure_ascii=False), now, now) for key, value in items.items()]
+                )
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+
+            with self.lock:
+                self.writes_since_evict += len(items)
+                should_evict = self.writes_since_evict >= self.EVICT_CHECK_INTERVAL
+                if should_evict:
+                    self.writes_since_evict = 0
+            if should_evict:
+                self.evict()
+        except Exception as e:
+            print(f"⚠️ 캐시 저장 오류 ({self.table}): {e}")
 
-def save_saju_cache(cache):
-    """사주 분석 캐시를 파일에 저장"""
-    try:
-        # MBTI별 캐시 저장 (키는 MBTI 문자열 그대로)
-        with open(SAJU_CACHE_FILE, 'w', encoding='utf-8') as f:
-            json.dump(cache, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        print(f"캐시 파일 저장 오류: {e}")
+    def evict(self):
+        """만료 항목 삭제 후 최대 크기를 넘는 만큼 가장 오래 사용되지 않은 항목 삭제"""
+        try:
+            conn = self._connection()
+            if self.ttl:
+                conn.execute(f'DELETE FROM {self.table} WHERE created_at < ?', (self._min_created_at(time.time()),))
+            overflow = conn.execute(f'SELECT COUNT(*) FROM {self.table}').fetchone()[0] - self.max_entries
+            if overflow > 0:
+                conn.execute(
+                    f'DELETE FROM {self.table} WHERE key IN (SELECT key FROM {self.table} ORDER BY accessed_at ASC LIMIT ?)',
+                    (overflow,)
+                )
+                print(f"🧹 캐시 LRU 제거 ({self.table}): {overflow}개 항목")
+        except Exception as e:
+            print(f"⚠️ 캐시 정리 오류 ({self.table}): {e}")
 
-def load_matching_cache():
-    """매칭 호환성 캐시 로드 (크기 제한 및 검증 포함)"""
-    try:
-        if os.path.exists(MATCHING_CACHE_FILE):
-            # 파일 크기 확인 (10MB 제한)
-            file_size = os.path.getsize(MATCHING_CACHE_FILE)
-            if file_size > 10 * 1024 * 1024:  # 10MB
-                print(f"⚠️ 매칭 캐시 파일이 너무 큽니다 ({file_size/1024/1024:.1f}MB). 백업 후 초기화합니다.")
-                # 백업 생성
-                backup_file = f"{MATCHING_CACHE_FILE}.backup_{int(time.time())}"
-                os.rename(MATCHING_CACHE_FILE, backup_file)
-                return {}
-            
-            with open(MATCHING_CACHE_FILE, 'r', encoding='utf-8') as f:
-                content = f.read()
-                
-                # JSON 유효성 사전 검증
-                if not content.strip():
-                    return {}
-                
-                # 기본적인 JSON 형식 검증
-                if not (content.strip().startswith('{') and content.strip().endswith('}')):
-                    print("⚠️ 매칭 캐시 파일 형식이 잘못되었습니다. 초기화합니다.")
-                    return {}
-                
-                cache = json.loads(content)
-                print(f"📖 매칭 캐시 로드: {len(cache)}개 항목 ({file_size/1024:.1f}KB)")
-                return cache
-                
-    except json.JSONDecodeError as e:
-        print(f"⚠️ 매칭 캐시 JSON 파싱 오류: {e}")
-        # 손상된 파일 백업 후 초기화
-        if os.path.exists(MATCHING_CACHE_FILE):
-            backup_file = f"{MATCHING_CACHE_FILE}.error_backup_{int(time.time())}"
-            os.rename(MATCHING_CACHE_FILE, backup_file)
-            print(f"📁 손상된 캐시 파일을 {backup_file}로 백업했습니다.")
-        return {}
-    except Exception as e:
-        print(f"매칭 캐시 로드 오류: {e}")
-        return {}
+    def __len__(self):
+        try:
+            return self._connection().execute(f'SELECT COUNT(*) FROM {self.table}').fetchone()[0]
+        except Exception:
+            return 0
+
+class WriteBehindCache:
+    """쓰기 지연 캐시 (put은 메모리 대기열에만 넣고, 백그라운드 스레드가 모아서 SQLite에 일괄 저장)
+
+    요청 경로에서는 파일 쓰기를 하지 않는다. 대기열은 flush_interval초마다 또는
+    batch_size건이 쌓이면 backend.put_many로 한 트랜잭션에 저장된다.
+    여러 워커 프로세스의 동시 쓰기는 SQLite WAL 잠금(busy_timeout)이 직렬화한다.
+    """
+
+    def __init__(self, backend, flush_interval=2.0, batch_size=64):
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.pending = {}  # 아직 저장되지 않은 항목
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.worker = None
+        self.stats = {'writes': 0, 'flushes': 0, 'flushed_entries': 0}
+
+    def _ensure_worker(self):
+        """저장 스레드가 없으면 시작 (self.lock을 잡은 상태에서 호출)"""
+        if self.worker is None or not self.worker.is_alive():
+            self.worker = threading.Thread(target=self._worker_loop, name=f'write-behind-{self.backend.table}', daemon=True)
+            self.worker.start()
+
+    def _worker_loop(self):
+        while True:
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            self.flush()
+
+    def put(self, key, value):
+        """저장 예약 (즉시 반환)"""
+        with self.lock:
+            self.pending[key] = value
+            self.stats['writes'] += 1
+            self._ensure_worker()
+            if len(self.pending) >= self.batch_size:
+                self.wakeup.set()
+
+    def get(self, key, default=None):
+        """대기열 → SQLite 순으로 조회"""
+        with self.lock:
+            if key in self.pending:
+                return self.pending[key]
+        value = self.backend.get(key)
+        return default if value is None else value
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.put(key, value)
+
+    def flush(self):
+        """대기 중인 항목을 한 번에 저장 → 저장한 항목 수"""
+        with self.flush_lock:
+            with self.lock:
+                items, self.pending = self.pending, {}
+            if not items:
+                return 0
+            self.backend.put_many(items)
+            with self.lock:
+                self.stats['flushes'] += 1
+                self.stats['flushed_entries'] += len(items)
+            return len(items)
+
+    def snapshot(self):
+        """대기열 크기와 저장 통계"""
+        with self.lock:
+            return {'pending': len(self.pending), **self.stats}
+
+# 사용자 쌍별 최종 매칭 결과 캐시 (재실행 시 AI 분석 재사용)
+MATCHING_RESULT_CACHE_MAX_ENTRIES = int(os.getenv('MATCHING_RESULT_CACHE_MAX_ENTRIES', '50000'))
+MATCHING_RESULT_CACHE_TTL = int(os.getenv('MATCHING_RESULT_CACHE_TTL', str(7 * 24 * 3600)))  # 기본 7일
+matching_result_cache = SqliteCache(CACHE_DB_FILE, 'matching_results', MATCHING_RESULT_CACHE_MAX_ENTRIES, MATCHING_RESULT_CACHE_TTL)
+
+def get_matching_cache_key(user1, user2):
+    """사용자 쌍 키 생성 (AI 프롬프트 버전 포함, 순서 유지)
+
+    프롬프트가 바뀌면 AI 응답 캐시와 함께 무효화되고, 이유 문구가 user1의 MBTI부터 서술하므로
+    (A, B)와 (B, A)는 따로 저장한다.
+    """
+    return f"{AI_PROMPT_VERSION}:{user1['id']}_{user2['id']}"
+
+def get_cached_matching_results(pairs):
+    """여러 사용자 쌍의 매칭 결과를 한 번에 조회 → {pair_index: (score, reason)}"""
+    keys = [get_matching_cache_key(user1, user2) for user1, user2 in pairs]
+    found = matching_result_cache.get_many(keys)
+    return {
+        pair_index: (found[key]['score'], found[key]['reason'])
+        for pair_index, key in enumerate(keys) if key in found
+    }
 
-def save_matching_cache(cache):
-    """매칭 호환성 캐시 저장 (메모리 최적화)"""
-    try:
-        # 캐시 크기 제한 (1500개 항목으로 더 엄격하게)
-        if len(cache) > 1500:
-            print(f"⚠️ 매칭 캐시가 너무 큽니다 ({len(cache)}개). 최신 1000개만 유지합니다.")
-            # 최신 1000개만 유지 (키를 정렬해서)
-            sorted_keys = sorted(cache.keys())[-1000:]
-            cache = {k: cache[k] for k in sorted_keys}
-        
-        # 임시 파일에 먼저 저장 (원자적 쓰기, compact format)
-        temp_file = f"{MATCHING_CACHE_FILE}.tmp"
-        with open(temp_file, 'w', encoding='utf-8') as f:
-            json.dump(cache, f, ensure_ascii=False, separators=(',', ':'))  # compact format
-        
-        # 성공적으로 저장되면 원본 파일로 이동
-        os.rename(temp_file, MATCHING_CACHE_FILE)
-        
-    except Exception as e:
-        print(f"매칭 캐시 저장 오류: {e}")
-        # 임시 파일 정리
-        temp_file = f"{MATCHING_CACHE_FILE}.tmp"
-        if os.path.exists(temp_file):
-            os.remove(temp_file)
+def save_matching_results_to_cache(results):
+    """[(user1, user2, score, reason), ...] 매칭 결과 일괄 저장"""
+    matching_result_cache.put_many({
+        get_matching_cache_key(user1, user2): {'score': score, 'reason': reason}
+        for user1, user2, score, reason in results
+    })
 
 def calculate_mbti_compatibility_score(mbti1, mbti2):
     """MBTI 기반 호환성 점수 계산 (룰 기반)"""
@@ -256,54 +439,18 @@ def get_compatible_mbti_examples(mbti):
     
     return compatibility_map.get(mbti, ['ENFJ', 'INFP', 'ESFJ', 'ISFP'])
 
-def get_cached_matching_result(user1, user2):
-    """메모리 캐시에서 매칭 결과 조회 (파일 I/O 최소화)"""
-    global _global_matching_cache
-    
-    try:
-        # 첫 번째 호출시에만 파일에서 로드
-        if _global_matching_cache is None:
-            print("📖 매칭 캐시 초기 로드...")
-            _global_matching_cache = load_matching_cache()
-            print(f"✅ 캐시 로드 완료: {len(_global_matching_cache)}개 항목")
-        
-        # 정규화된 키 생성 (항상 ID 순으로 정렬)
-        key_parts = sorted([str(user1['id']), str(user2['id'])])
-        cache_key = f"{key_parts[0]}_{key_parts[1]}"
-        
-        # 캐시 확인
-        if cache_key in _global_matching_cache:
-            cached_result = _global_matching_cache[cache_key]
-            return cached_result['score'], cached_result['reason']
-            
-        return None
-    except Exception as e:
-        print(f"메모리 캐시 조회 오류: {e}")
-        return None
-
-def save_matching_result_to_cache(user1, user2, score, reason):
-    """메모리 캐시에 매칭 결과 저장 (주기적으로만 파일 저장)"""
-    global _global_matching_cache, _cache_save_counter
-    
-    try:
-        if _global_matching_cache is None:
-            _global_matching_cache = {}
-        
-        # 정규화된 키 생성
-        key_parts = sorted([str(user1['id']), str(user2['id'])])
-        cache_key = f"{key_parts[0]}_{key_parts[1]}"
-        
-        # 메모리 캐시에 저장
-        _global_matching_cache[cache_key] = {'score': score, 'reason': reason}
-        
-        # 카운터 증가 및 주기적 파일 저장 (100개마다)
-        _cache_save_counter += 1
-        if _cache_save_counter % 100 == 0:
-            save_matching_cache(_global_matching_cache)
-            print(f"💾 메모리 캐시 파일 저장: {len(_global_matching_cache)}개 항목")
-            
-    except Exception as e:
-        print(f"메모리 캐시 저장 오류: {e}")
+def render_rule_based_reason(mbti1, mbti2, final_score):
+    """룰 기반 점수 구간별 매칭 이유 생성 (140자 제한)"""
+    if final_score >= 85:
+        return f"{mbti1}와 {mbti2}는 성격적으로 완벽한 조화를 이루며, 사주상 오행의 기운도 서로 보완하여 천생연분의 인연을 만들어갑니다. 깊은 정신적 교감과 운명적 만남이 기대됩니다."
+    elif final_score >= 75:
+        return f"{mbti1}와 {mbti2}는 성격적으로 잘 어울리며, 사주상 기운의 흐름도 긍정적으로 상호작용합니다. 서로를 이해하고 지지하는 안정적이고 조화로운 관계를 만들어갈 수 있어요."
+    elif final_score >= 65:
+        return f"{mbti1}와 {mbti2}는 성격적 특성이 적절히 조화되며, 사주상 오행의 균형도 나쁘지 않은 궁합입니다. 서로 노력한다면 좋은 파트너십을 형성할 수 있습니다."
+    elif final_score >= 55:
+        return f"{mbti1}와 {mbti2}는 기본적인 호환성을 가지고 있으며, 사주상 큰 충돌은 없는 관계입니다. 서로를 이해하려 노력한다면 안정적인 관계 발전이 가능해요."
+    else:
+        return f"{mbti1}와 {mbti2}는 성격적 차이가 있지만, 사주상 서로 다른 기운이 때로는 새로운 시너지를 만들 수 있습니다. 차이점을 존중하며 소통하는 것이 중요합니다."
 
 def calculate_rule_based_matching(user1, user2):
     """룰 기반 매칭 계산"""
@@ -319,16 +466,7 @@ def calculate_rule_based_matching(user1, user2):
         final_score = max(20, min(100, final_score))
 
         # MBTI와 사주를 종합한 매칭 이유 생성 (140자 제한)
-        if final_score >= 85:
-            reason = f"{user1['mbti']}와 {user2['mbti']}는 성격적으로 완벽한 조화를 이루며, 사주상 오행의 기운도 서로 보완하여 천생연분의 인연을 만들어갑니다. 깊은 정신적 교감과 운명적 만남이 기대됩니다."
-        elif final_score >= 75:
-            reason = f"{user1['mbti']}와 {user2['mbti']}는 성격적으로 잘 어울리며, 사주상 기운의 흐름도 긍정적으로 상호작용합니다. 서로를 이해하고 지지하는 안정적이고 조화로운 관계를 만들어갈 수 있어요."
-        elif final_score >= 65:
-            reason = f"{user1['mbti']}와 {user2['mbti']}는 성격적 특성이 적절히 조화되며, 사주상 오행의 균형도 나쁘지 않은 궁합입니다. 서로 노력한다면 좋은 파트너십을 형성할 수 있습니다."
-        elif final_score >= 55:
-            reason = f"{user1['mbti']}와 {user2['mbti']}는 기본적인 호환성을 가지고 있으며, 사주상 큰 충돌은 없는 관계입니다. 서로를 이해하려 노력한다면 안정적인 관계 발전이 가능해요."
-        else:
-            reason = f"{user1['mbti']}와 {user2['mbti']}는 성격적 차이가 있지만, 사주상 서로 다른 기운이 때로는 새로운 시너지를 만들 수 있습니다. 차이점을 존중하며 소통하는 것이 중요합니다."
+        reason = render_rule_based_reason(user1['mbti'], user2['mbti'], final_score)
 
         return final_score, reason
 
@@ -336,6 +474,454 @@ def calculate_rule_based_matching(user1, user2):
         print(f"❌ 룰 기반 매칭 계산 오류: {e}")
         return 50, "MBTI 성격 분석과 사주상 기운을 종합해보니 기본적인 호환성을 가진 관계로, 서로를 이해하고 배려한다면 안정적인 관계를 만들어갈 수 있습니다."
 
+# --- [벡터화 룰 기반 매칭 엔진] ---
+# calculate_rule_based_matching과 같은 점수를 N×M 행렬로 한 번에 계산
+# 각 사용자를 MBTI 4비트 코드와 오행 5비트 마스크로 한 번만 인코딩하고,
+# 매칭 이유 문자열은 최종 후보로 선정된 쌍에 대해서만 생성
+# 동일한 (MBTI, 오행) 조합은 동치 클래스로 묶어 클래스 × 클래스 점수만 계산
+MBTI_DIMENSION_LETTERS = ('EI', 'SN', 'TF', 'JP')
+MBTI_DIMENSION_POINTS = (15, 15, 10, 10)
+SAJU_ELEMENTS = ('목', '화', '토', '금', '수')
+
+# 두 MBTI 코드의 XOR(서로 다른 차원 비트) → MBTI 호환성 점수
+MBTI_XOR_SCORE_TABLE = np.array([
+    max(20, min(100, 50 + sum(points for bit, points in enumerate(MBTI_DIMENSION_POINTS) if not (xor >> bit) & 1)))
+    for xor in range(16)
+], dtype=np.int16)
+
+# 공통 오행 마스크(AND) → 사주 호환성 점수
+SAJU_COMMON_SCORE_TABLE = np.array([
+    max(30, min(100, 60 + bin(common).count('1') * 8 if common else 50))
+    for common in range(32)
+], dtype=np.int16)
+
+def encode_mbti(mbti):
+    """MBTI 문자열 → 4비트 코드 (규칙에 맞지 않으면 -1)"""
+    if not isinstance(mbti, str) or len(mbti) < 4:
+        return -1
+    code = 0
+    for bit, letters in enumerate(MBTI_DIMENSION_LETTERS):
+        position = letters.find(mbti[bit])
+        if position < 0:
+            return -1
+        code |= position << bit
+    return code
+
+def encode_saju_elements(saju_result):
+    """사주 결과 문자열 → 포함된 오행 5비트 마스크 (문자열이 아니면 -1)"""
+    if not isinstance(saju_result, str):
+        return -1
+    mask = 0
+    for bit, element in enumerate(SAJU_ELEMENTS):
+        if element in saju_result:
+            mask |= 1 << bit
+    return mask
+
+def encode_matching_features(users):
+    """사용자 목록을 (MBTI 코드 배열, 오행 마스크 배열, 정상 인코딩 여부 배열)로 변환"""
+    mbti_codes = np.array([encode_mbti(user.get('mbti')) for user in users], dtype=np.int16)
+    element_masks = np.array([encode_saju_elements(user.get('saju_result')) for user in users], dtype=np.int16)
+    regular = (mbti_codes >= 0) & (element_masks >= 0)
+    return np.where(regular, mbti_codes, 0), np.where(regular, element_masks, 0), regular
+
+def compute_rule_score_block(features1, features2):
+    """인코딩된 두 그룹의 룰 기반 점수 행렬 계산 (calculate_rule_based_matching과 동일한 점수)"""
+    mbti_codes1, element_masks1, _ = features1
+    mbti_codes2, element_masks2, _ = features2
+
+    mbti_scores = MBTI_XOR_SCORE_TABLE[mbti_codes1[:, None] ^ mbti_codes2[None, :]]
+    saju_scores = SAJU_COMMON_SCORE_TABLE[element_masks1[:, None] & element_masks2[None, :]]
+
+    final_scores = (mbti_scores * 0.6 + saju_scores * 0.4).astype(np.int16)
+    return np.clip(final_scores, 20, 100)
+
+# 1단계 점수 행렬이 이 셀 수 이상이면 행 블록을 워커 스레드들에 나눠 계산
+# (NumPy 배열 연산은 GIL을 놓으므로 스레드로도 병렬 실행됨. 여러 스레드가 도는 프로세스에서
+#  fork 프로세스 풀을 만들면 다른 스레드가 잡고 있던 잠금이 자식에 복사되어 교착될 수 있어 쓰지 않음)
+RULE_SCORE_WORKERS = int(os.getenv('RULE_SCORE_WORKERS', str(os.cpu_count() or 1)))
+RULE_SCORE_PARALLEL_MIN_CELLS = int(os.getenv('RULE_SCORE_PARALLEL_MIN_CELLS', str(1 << 20)))
+
+_rule_score_pool = None
+_rule_score_pool_lock = threading.Lock()
+
+def get_rule_score_pool():
+    """행 블록 계산용 스레드 풀 (처음 필요할 때 생성)"""
+    global _rule_score_pool
+    with _rule_score_pool_lock:
+        if _rule_score_pool is None:
+            _rule_score_pool = ThreadPoolExecutor(max_workers=RULE_SCORE_WORKERS, thread_name_prefix='rule-score')
+        return _rule_score_pool
+
+def compute_rule_score_block_sharded(features1, features2):
+    """점수 행렬을 행 블록으로 나눠 병렬 계산 (작으면 바로 계산, 결과는 행 순서대로 결합)"""
+    rows, columns = len(features1[0]), len(features2[0])
+    if RULE_SCORE_WORKERS <= 1 or rows < 2 or rows * columns < RULE_SCORE_PARALLEL_MIN_CELLS:
+        return compute_rule_score_block(features1, features2)
+
+    bounds = np.linspace(0, rows, min(RULE_SCORE_WORKERS, rows) + 1, dtype=np.int64)
+    blocks = [tuple(feature[start:end] for feature in features1) for start, end in zip(bounds[:-1], bounds[1:])]
+    pool = get_rule_score_pool()
+    futures = [pool.submit(compute_rule_score_block, block, features2) for block in blocks]
+    return np.vstack([future.result() for future in futures])
+
+def compute_rule_score_matrix(user_group_1, user_group_2, features1=None, features2=None):
+    """전체 N×M 룰 기반 점수 행렬 계산 (인코딩 불가 사용자는 기존 함수로 보정)"""
+    features1 = features1 or encode_matching_features(user_group_1)
+    features2 = features2 or encode_matching_features(user_group_2)
+    scores = compute_rule_score_block_sharded(features1, features2)
+
+    # MBTI/사주 형식이 비정상인 사용자는 기존 룰 기반 함수로 개별 계산
+    for i in np.flatnonzero(~features1[2]):
+        for j in range(len(user_group_2)):
+            scores[i, j] = calculate_rule_based_matching(user_group_1[i], user_group_2[j])[0]
+    for j in np.flatnonzero(~features2[2]):
+        for i in range(len(user_group_1)):
+            scores[i, j] = calculate_rule_based_matching(user_group_1[i], user_group_2[j])[0]
+
+    return scores
+
+def build_feature_classes(users):
+    """(MBTI, 오행 시그니처)가 같은 사용자끼리 동치 클래스로 묶기
+
+    룰 기반 점수는 MBTI 문자열과 사주에 포함된 오행 집합에만 의존하므로
+    같은 클래스의 사용자는 모든 상대와 같은 점수를 가짐.
+    반환: (클래스 대표 사용자 목록, 클래스별 사용자 인덱스 배열 목록)
+    """
+    class_index = {}
+    representatives = []
+    members = []
+    for i, user in enumerate(users):
+        mbti = user.get('mbti')
+        key = (mbti if isinstance(mbti, str) else repr(mbti), encode_saju_elements(user.get('saju_result')))
+        class_id = class_index.get(key)
+        if class_id is None:
+            class_id = class_index[key] = len(representatives)
+            representatives.append(user)
+            members.append([])
+        members[class_id].append(i)
+    return representatives, [np.array(member, dtype=np.int64) for member in members]
+
+# --- [상한 기반 가지치기] ---
+# MBTI 점수는 두 MBTI 코드로 정해지고 사주 점수는 공통 오행이 많을수록 커지므로
+# (그룹1 클래스의 MBTI, 오행 마스크)만으로 상대 MBTI 그룹 전체의 최고 가능 점수를 구할 수 있음.
+# 최고 가능 점수가 기준 미만인 (행 그룹, 상대 MBTI 그룹) 블록은 점수를 계산하지 않고 0으로 둠
+_rule_pruning_stats_lock = threading.Lock()
+rule_pruning_stats = {'evaluated_pairs': 0, 'pruned_pairs': 0}
+
+def rule_score_upper_bound(mbti_xor, max_saju_score):
+    """MBTI XOR과 사주 점수 상한으로 얻을 수 있는 최고 룰 점수"""
+    final_score = int(MBTI_XOR_SCORE_TABLE[mbti_xor] * 0.6 + max_saju_score * 0.4)
+    return max(20, min(100, final_score))
+
+def compute_class_rule_scores(representatives1, members1, representatives2, members2, min_score=70):
+    """클래스 × 클래스 룰 점수 행렬 (상한이 min_score 미만인 블록은 계산하지 않고 0)
+
+    반환: (점수 행렬, 계산한 사용자 쌍 수, 가지치기한 사용자 쌍 수)
+    """
+    features1 = encode_matching_features(representatives1)
+    features2 = encode_matching_features(representatives2)
+    sizes1 = np.array([len(member) for member in members1], dtype=np.int64)
+    sizes2 = np.array([len(member) for member in members2], dtype=np.int64)
+    scores = np.zeros((len(representatives1), len(representatives2)), dtype=np.int16)
+
+    # 그룹2 정상 클래스를 MBTI 코드별로, 그룹1 정상 클래스를 (MBTI 코드, 사주 점수 상한)별로 묶음
+    # (사주 점수 상한 = 공통 오행이 그룹1 오행 전체일 때의 점수)
+    mbti_groups2 = {}
+    for class2 in np.flatnonzero(features2[2]):
+        mbti_groups2.setdefault(int(features2[0][class2]), []).append(class2)
+    row_groups1 = {}
+    for class1 in np.flatnonzero(features1[2]):
+        max_saju_score = int(SAJU_COMMON_SCORE_TABLE[features1[1][class1]])
+        row_groups1.setdefault((int(features1[0][class1]), max_saju_score), []).append(class1)
+
+    pruned_pairs = 0
+    for (mbti_code1, max_saju_score), rows in row_groups1.items():
+        rows = np.array(rows)
+        columns = []
+        for mbti_code2, group_columns in mbti_groups2.items():
+            if rule_score_upper_bound(mbti_code1 ^ mbti_code2, max_saju_score) >= min_score:
+                columns.extend(group_columns)
+            else:
+                pruned_pairs += int(sizes1[rows].sum() * sizes2[group_columns].sum())
+        if columns:
+            columns = np.array(columns)
+            block = compute_rule_score_block_sharded(
+                tuple(feature[rows] for feature in features1), tuple(feature[columns] for feature in features2)
+            )
+            scores[np.ix_(rows, columns)] = block
+
+    # MBTI/사주 형식이 비정상인 클래스는 상한을 구할 수 없으므로 기존 룰 기반 함수로 모두 계산
+    for i in np.flatnonzero(~features1[2]):
+        for j in range(len(representatives2)):
+            scores[i, j] = calculate_rule_based_matching(representatives1[i], representatives2[j])[0]
+    for j in np.flatnonzero(~features2[2]):
+        for i in np.flatnonzero(features1[2]):
+            scores[i, j] = calculate_rule_based_matching(representatives1[i], representatives2[j])[0]
+
+    evaluated_pairs = int(sizes1.sum() * sizes2.sum()) - pruned_pairs
+    with _rule_pruning_stats_lock:
+        rule_pruning_stats['evaluated_pairs'] += evaluated_pairs
+        rule_pruning_stats['pruned_pairs'] += pruned_pairs
+    return scores, evaluated_pairs, pruned_pairs
+
+def select_top_rule_candidates(user_group_1, user_group_2, top_k=3, min_score=70, classes2=None):
+    """각 사용자별 룰 기반 상위 top_k 후보 선정 → {user1_id: [(user2, score, reason), ...]}
+
+    클래스 × 클래스 점수를 한 번만 계산한 뒤 후보 선정 시에만 사용자 단위로 펼침.
+    classes2에 미리 계산한 build_feature_classes(user_group_2) 결과를 넘기면 재사용.
+    """
+    user_candidates = {user1['id']: [] for user1 in user_group_1}
+    if not user_group_1 or not user_group_2:
+        return user_candidates
+
+    representatives1, members1 = build_feature_classes(user_group_1)
+    representatives2, members2 = classes2 or build_feature_classes(user_group_2)
+    class_scores, evaluated_pairs, pruned_pairs = compute_class_rule_scores(
+        representatives1, members1, representatives2, members2, min_score
+    )
+    print(f"🧮 동치 클래스: {len(user_group_1)}명 → {len(representatives1)}개, {len(user_group_2)}명 → {len(representatives2)}개 "
+          f"(상한 가지치기: {pruned_pairs}/{evaluated_pairs + pruned_pairs}쌍 제외)")
+
+    group2_ids = {user2['id'] for user2 in user_group_2}
+
+    for class1, row_scores in enumerate(class_scores):
+        # 자기 자신이 상대 그룹에 포함된 경우를 대비해 1명 더 뽑아둠
+        needed = top_k + 1 if any(user_group_1[i]['id'] in group2_ids for i in members1[class1]) else top_k
+
+        # 점수 내림차순, 같은 점수 내에서는 상대 그룹의 앞쪽 사용자 우선 (기존 정렬과 동일)
+        ranked = []
+        eligible_classes = np.flatnonzero(row_scores >= min_score)
+        for score in sorted(set(row_scores[eligible_classes].tolist()), reverse=True):
+            same_score_classes = eligible_classes[row_scores[eligible_classes] == score]
+            columns = np.sort(np.concatenate([members2[class2] for class2 in same_score_classes]))
+            ranked.extend((int(j), score) for j in columns[:needed - len(ranked)])
+            if len(ranked) >= needed:
+                break
+
+        # 매칭 이유는 클래스당 한 번만 생성 (MBTI가 같으므로 클래스 내 사용자가 공유)
+        mbti1 = representatives1[class1]['mbti']
+        ranked = [
+            (user_group_2[j], score, render_rule_based_reason(mbti1, user_group_2[j]['mbti'], score))
+            for j, score in ranked
+        ]
+        for i in members1[class1]:
+            user1 = user_group_1[i]
+            user_candidates[user1['id']] = [
+                candidate for candidate in ranked if candidate[0]['id'] != user1['id']
+            ][:top_k]
+
+    return user_candidates
+
+# --- [전역 배정 (용량 제한 최소 비용 유량)] ---
+# 인당 상위 3명을 독립적으로 고르면 인기 있는 상대에게 후보가 몰리므로,
+# 상대 그룹 사용자마다 최대 후보 수(용량)를 두고 전체 룰 점수 합이 최대가 되도록 후보 쌍을 한 번에 배정
+MATCHING_ASSIGNMENT = os.getenv('MATCHING_ASSIGNMENT', 'greedy').lower()  # 'greedy'(인당 상위 3명) 또는 'flow'(전역 배정)
+MATCHING_PARTNER_CAPACITY = int(os.getenv('MATCHING_PARTNER_CAPACITY', '3'))  # 전역 배정 시 상대 그룹 사용자 1명당 최대 후보 수
+
+_FLOW_INF = 1 << 40
+
+def _max_flow(node_count, arcs, source, sink):
+    """Dinic 최대 유량 → 간선별 유량 목록 (arcs: [(u, v, 용량), ...])"""
+    graph = [[] for _ in range(node_count)]
+    to, capacity = [], []
+    for u, v, cap in arcs:
+        graph[u].append(len(to)); to.append(v); capacity.append(cap)
+        graph[v].append(len(to)); to.append(u); capacity.append(0)
+    original = capacity[:]
+
+    while True:
+        level = [-1] * node_count
+        level[source] = 0
+        frontier = deque([source])
+        while frontier:
+            u = frontier.popleft()
+            for edge in graph[u]:
+                if capacity[edge] > 0 and level[to[edge]] < 0:
+                    level[to[edge]] = level[u] + 1
+                    frontier.append(to[edge])
+        if level[sink] < 0:
+            break
+
+        # 현재 간선 포인터를 쓰는 반복 DFS로 블로킹 유량 계산
+        pointer = [0] * node_count
+        while True:
+            path = []
+            u = source
+            while u != sink:
+                while pointer[u] < len(graph[u]):
+                    edge = graph[u][pointer[u]]
+                    if capacity[edge] > 0 and level[to[edge]] == level[u] + 1:
+                        break
+                    pointer[u] += 1
+                else:
+                    if u == source:
+                        break
+                    level[u] = -1  # 막다른 노드 제거 후 한 단계 되돌아감
+                    edge = path.pop()
+                    u = to[edge ^ 1]
+                    pointer[u] += 1
+                    continue
+                path.append(graph[u][pointer[u]])
+                u = to[path[-1]]
+            if u != sink:
+                break
+            pushed = min(capacity[edge] for edge in path)
+            for edge in path:
+                capacity[edge] -= pushed
+                capacity[edge ^ 1] += pushed
+
+    return [original[2 * k] - capacity[2 * k] for k in range(len(arcs))]
+
+def solve_class_assignment(class_scores, sizes1, sizes2, capacity1, capacity2, min_score=70):
+    """클래스 단위 최소 비용 유량으로 클래스 쌍별 배정 수 행렬 계산 (룰 점수 합 최대화)
+
+    소스 → 그룹1 클래스(인원 × capacity1) → 그룹2 클래스(점수 ≥ min_score, 최대 인원1 × 인원2) → 싱크(인원 × capacity2).
+    간선 비용은 -점수이며 primal-dual 방식으로 푼다: 잔여 그래프 최단 거리를 밀집 행렬 Bellman-Ford로 구한 뒤
+    최단 경로에 속하는 간선들만으로 최대 유량을 흘리고, 최단 경로 비용이 음수인 동안 반복한다.
+    같은 클래스의 사용자는 모든 상대와 점수가 같으므로 클래스 단위 최적해는 사용자 단위 최적해와 같다.
+    """
+    scores = np.asarray(class_scores, dtype=np.int64)
+    sizes1 = np.asarray(sizes1, dtype=np.int64)
+    sizes2 = np.asarray(sizes2, dtype=np.int64)
+    n1, n2 = scores.shape
+    flow = np.zeros((n1, n2), dtype=np.int64)
+    if n1 == 0 or n2 == 0:
+        return flow
+
+    edge_capacity = np.where(scores >= min_score, np.outer(sizes1, sizes2), 0)
+    source_residual = sizes1 * capacity1
+    sink_residual = sizes2 * capacity2
+    rows1 = np.arange(n1)
+    columns2 = np.arange(n2)
+    # 최대 유량용 노드 번호: 소스 0, 그룹1 클래스 1..n1, 그룹2 클래스 n1+1..n1+n2, 싱크 n1+n2+1
+    source_node, sink_node = 0, n1 + n2 + 1
+
+    while True:
+        # 잔여 그래프 최단 거리 (그룹1 클래스: dist1, 그룹2 클래스: dist2)
+        forward_open = edge_capacity - flow > 0
+        backward_open = flow > 0
+        forward_cost = np.where(forward_open, -scores, _FLOW_INF)
+        backward_cost = np.where(backward_open, scores, _FLOW_INF)
+        dist1 = np.where(source_residual > 0, 0, _FLOW_INF)
+        dist2 = np.full(n2, _FLOW_INF)
+        for _ in range(n1 + n2 + 1):
+            candidate2 = (dist1[:, None] + forward_cost).min(axis=0)
+            improved2 = candidate2 < dist2
+            dist2 = np.where(improved2, candidate2, dist2)
+            candidate1 = (dist2[None, :] + backward_cost).min(axis=1)
+            improved1 = candidate1 < dist1
+            dist1 = np.where(improved1, candidate1, dist1)
+            if not improved1.any() and not improved2.any():
+                break
+
+        sink_dist = np.where(sink_residual > 0, dist2, _FLOW_INF).min()
+        if sink_dist >= 0:
+            break
+
+        # 최단 경로 위의 간선(축소 비용 0)만으로 구성한 네트워크에 최대 유량을 흘림
+        arcs = []
+        for class1 in np.flatnonzero((source_residual > 0) & (dist1 == 0)):
+            arcs.append((source_node, 1 + class1, int(source_residual[class1])))
+        forward_arcs = np.argwhere(forward_open & (dist1[:, None] - scores == dist2[None, :]) & (dist1[:, None] < _FLOW_INF))
+        for class1, class2 in forward_arcs:
+            arcs.append((1 + class1, 1 + n1 + class2, int(edge_capacity[class1, class2] - flow[class1, class2])))
+        backward_arcs = np.argwhere(backward_open & (dist2[None, :] + scores == dist1[:, None]) & (dist2[None, :] < _FLOW_INF))
+        for class1, class2 in backward_arcs:
+            arcs.append((1 + n1 + class2, 1 + class1, int(flow[class1, class2])))
+        for class2 in np.flatnonzero((sink_residual > 0) & (dist2 == sink_dist)):
+            arcs.append((1 + n1 + class2, sink_node, int(sink_residual[class2])))
+
+        arc_flows = _max_flow(n1 + n2 + 2, arcs, source_node, sink_node)
+        for (u, v, _), amount in zip(arcs, arc_flows):
+            if not amount:
+                continue
+            if u == source_node:
+                source_residual[v - 1] -= amount
+            elif v == sink_node:
+                sink_residual[u - 1 - n1] -= amount
+            elif u <= n1:
+                flow[u - 1, v - 1 - n1] += amount
+            else:
+                flow[v - 1, u - 1 - n1] -= amount
+
+    return flow
+
+def disaggregate_class_assignment(class_flow, members1, members2, capacity1, capacity2):
+    """클래스 쌍별 배정 수를 사용자 쌍으로 펼침 → [(그룹1 인덱스, 그룹2 인덱스), ...]
+
+    클래스 안에서는 남은 용량이 큰 사용자부터 (같으면 앞쪽 사용자) 배정하여 용량과 쌍 중복 없이 분배.
+    """
+    demands2 = [[] for _ in members2]  # 그룹2 클래스별 [(그룹1 인덱스, 필요한 상대 수), ...]
+    for class1, members in enumerate(members1):
+        remaining = np.full(len(members), capacity1, dtype=np.int64)
+        row = class_flow[class1]
+        for class2 in sorted(np.flatnonzero(row), key=lambda c: -row[c]):
+            units = int(row[class2])
+            limit = len(members2[class2])
+            given = np.zeros(len(members), dtype=np.int64)
+            while units > 0:
+                available = np.flatnonzero((remaining - given > 0) & (given < limit))
+                if not len(available):
+                    break
+                chosen = available[np.argsort(given[available] - remaining[available], kind='stable')][:units]
+                given[chosen] += 1
+                units -= len(chosen)
+            remaining -= given
+            demands2[class2].extend((int(members[k]), int(given[k])) for k in np.flatnonzero(given))
+
+    pairs = []
+    for class2, members in enumerate(members2):
+        remaining = np.full(len(members), capacity2, dtype=np.int64)
+        for i, units in sorted(demands2[class2], key=lambda demand: -demand[1]):
+            available = np.flatnonzero(remaining > 0)
+            chosen = available[np.argsort(-remaining[available], kind='stable')][:units]
+            remaining[chosen] -= 1
+            pairs.extend((i, int(members[k])) for k in chosen)
+    return pairs
+
+def select_assigned_rule_candidates(user_group_1, user_group_2, top_k=3, min_score=70, partner_capacity=None):
+    """전역 배정으로 후보 선정 → select_top_rule_candidates와 같은 형식
+
+    그룹1 사용자는 최대 top_k명, 그룹2 사용자는 최대 partner_capacity명까지 후보 쌍에 포함된다.
+    """
+    partner_capacity = partner_capacity or MATCHING_PARTNER_CAPACITY
+    user_candidates = {user1['id']: [] for user1 in user_group_1}
+    if not user_group_1 or not user_group_2:
+        return user_candidates
+
+    representatives1, members1 = build_feature_classes(user_group_1)
+    representatives2, members2 = build_feature_classes(user_group_2)
+    class_scores, _, _ = compute_class_rule_scores(representatives1, members1, representatives2, members2, min_score)
+    class_of1 = np.empty(len(user_group_1), dtype=np.int64)
+    for class1, members in enumerate(members1):
+        class_of1[members] = class1
+    class_of2 = np.empty(len(user_group_2), dtype=np.int64)
+    for class2, members in enumerate(members2):
+        class_of2[members] = class2
+
+    class_flow = solve_class_assignment(
+        class_scores, [len(m) for m in members1], [len(m) for m in members2], top_k, partner_capacity, min_score
+    )
+    pairs = disaggregate_class_assignment(class_flow, members1, members2, top_k, partner_capacity)
+
+    reasons = {}
+    for i, j in sorted(pairs):
+        user1, user2 = user_group_1[i], user_group_2[j]
+        if user1['id'] == user2['id']:
+            continue
+        class_pair = (class_of1[i], class_of2[j])
+        score = int(class_scores[class_pair])
+        if class_pair not in reasons:
+            reasons[class_pair] = render_rule_based_reason(user1['mbti'], user2['mbti'], score)
+        user_candidates[user1['id']].append((user2, score, reasons[class_pair]))
+    for candidates in user_candidates.values():
+        candidates.sort(key=lambda candidate: -candidate[1])
+
+    partner_load = np.bincount([j for _, j in pairs], minlength=len(user_group_2)) if pairs else np.zeros(1, dtype=np.int64)
+    print(f"🧮 전역 배정: 후보 쌍 {len(pairs)}개, 룰 점수 합 {int((class_flow * class_scores).sum())} "
+          f"(상대 1명당 최대 {int(partner_load.max())}/{partner_capacity}쌍)")
+    return user_candidates
+
 def should_use_ai_matching(user1, user2, quick_score):
     """AI 심층 분석을 사용할지 결정"""
     # 70점 이상 쌍들에 대해 AI 분석 진행 (매칭 대상이므로)
@@ -346,84 +932,351 @@ def should_use_ai_matching(user1, user2, quick_score):
         print(f"⚡ 룰 기반 결과 사용: {user1['name']} ↔ {user2['name']} (점수: {quick_score}점)")
         return False
 
-def perform_ai_matching_analysis(user1, user2, quick_score, model):
-    """AI를 활용한 심층 매칭 분석"""
-    try:
-        # MBTI와 사주 종합 분석 (강제 패턴)
-        prompt = f"""
-{user1['mbti']}와 {user2['mbti']} 두 사람의 궁합을 분석해주세요.
+# --- [AI 매칭 분석 응답 캐시] ---
+# 프롬프트는 두 사람의 MBTI에만 의존하므로 순서 있는 MBTI 쌍(최대 256개) 단위로 AI 응답을 재사용
+AI_MATCHING_PROMPT_TEMPLATE = """
+{mbti1}와 {mbti2} 두 사람의 궁합을 분석해주세요.
 
 ⚠️ 반드시 이 패턴으로 답변하세요:
-"{user1['mbti']}와 {user2['mbti']}는 [MBTI특성]. 사주상 [기운분석]."
+"{mbti1}와 {mbti2}는 [MBTI특성]. 사주상 [기운분석]."
 
 ⚠️ "사주상"이라는 단어를 반드시 포함해야 합니다.
 ⚠️ 140자 이하로 작성하세요.
 
 출력 형식:
 점수: [70-90점 사이]
-이유: {user1['mbti']}와 {user2['mbti']}는 성격적으로 잘 맞습니다. 사주상 오행의 기운이 조화롭게 어울려 좋은 인연을 만들어갈 수 있어요.
+이유: {mbti1}와 {mbti2}는 성격적으로 잘 맞습니다. 사주상 오행의 기운이 조화롭게 어울려 좋은 인연을 만들어갈 수 있어요.
 """
 
-        # AI 호출 전 딜레이 (API 한도 방지)
-        time.sleep(0.3)  # 더 긴 딜레이로 안정성 확보
-        
-        print(f"🤖 AI 분석 시작: {user1['name']} ↔ {user2['name']}")
-        print(f"📝 전송 프롬프트: {prompt[:100]}...")
-        ai_start_time = time.time()
-        
-        # 타임아웃 강제 설정 (10초)
-        import threading
-        import queue
-        
-        # 결과를 담을 큐
-        result_queue = queue.Queue()
-        exception_queue = queue.Queue()
-        
-        def ai_call_with_timeout():
+# 여러 MBTI 쌍을 한 번의 요청으로 분석하는 배치 프롬프트 (JSON 배열 응답)
+AI_BATCH_MATCHING_PROMPT_TEMPLATE = """
+아래 {count}쌍의 궁합을 각각 분석해주세요.
+
+{pair_lines}
+
+⚠️ 각 이유는 반드시 이 패턴으로 작성하세요:
+"[첫 번째 MBTI]와 [두 번째 MBTI]는 [MBTI특성]. 사주상 [기운분석]."
+
+⚠️ "사주상"이라는 단어를 반드시 포함해야 합니다.
+⚠️ 각 이유는 140자 이하로 작성하세요.
+⚠️ 점수는 70-90점 사이의 정수로 작성하세요.
+
+다른 설명 없이 아래 형식의 JSON 배열만 출력하세요:
+[{{"id": 1, "score": 80, "reason": "..."}}]
+"""
+
+# 프롬프트나 캐시 키 방식이 바뀌면 버전이 바뀌어 이전 캐시 항목은 자동으로 무효화됨
+AI_RESPONSE_CACHE_KEY_SCHEME = 'ordered'  # MBTI 쌍을 순서대로 구분 (정렬 키로 저장된 이전 항목은 방향을 알 수 없음)
+AI_PROMPT_VERSION = hashlib.sha1(
+    (AI_MATCHING_PROMPT_TEMPLATE + AI_BATCH_MATCHING_PROMPT_TEMPLATE + AI_RESPONSE_CACHE_KEY_SCHEME).encode('utf-8')
+).hexdigest()[:12]
+AI_RESPONSE_CACHE_TTL = int(os.getenv('AI_RESPONSE_CACHE_TTL', str(30 * 24 * 3600)))  # 기본 30일
+
+# MBTI 쌍 응답은 SQLite 캐시에 저장되어 여러 워커 프로세스가 공유
+ai_response_cache = SqliteCache(CACHE_DB_FILE, 'ai_responses', max_entries=5000, ttl=AI_RESPONSE_CACHE_TTL)
+_ai_response_cache_stats_lock = threading.Lock()
+ai_response_cache_stats = {'hits': 0, 'misses': 0}
+
+def normalize_mbti_pair(mbti1, mbti2):
+    """MBTI 쌍의 대소문자/공백 정규화 (순서는 유지)
+
+    AI가 만든 이유 문구는 첫 번째 MBTI부터 각 유형의 특성을 서술하므로,
+    (A, B)의 문구를 (B, A)에 그대로 쓰거나 유형 이름만 바꿔 넣으면 사용자 순서나 특성 설명이 어긋난다.
+    """
+    return str(mbti1).strip().upper(), str(mbti2).strip().upper()
+
+def get_ai_response_cache_key(mbti1, mbti2):
+    """정규화된 프롬프트 입력(순서 있는 MBTI 쌍)으로 캐시 키 생성"""
+    mbti_a, mbti_b = normalize_mbti_pair(mbti1, mbti2)
+    return f"{mbti_a}|{mbti_b}"
+
+def _versioned_ai_response_key(mbti1, mbti2):
+    """프롬프트 버전이 포함된 저장용 키 (프롬프트가 바뀌면 이전 항목은 조회되지 않고 LRU/TTL로 제거됨)"""
+    return f"{AI_PROMPT_VERSION}:{get_ai_response_cache_key(mbti1, mbti2)}"
+
+def get_cached_ai_response(mbti1, mbti2):
+    """MBTI 쌍에 대한 AI 응답 캐시 조회 → (ai_score, reason) 또는 None"""
+    entry = ai_response_cache.get(_versioned_ai_response_key(mbti1, mbti2))
+    with _ai_response_cache_stats_lock:
+        ai_response_cache_stats['hits' if entry else 'misses'] += 1
+    if entry:
+        return entry['score'], entry['reason']
+    return None
+
+def has_cached_ai_response(mbti1, mbti2):
+    """통계에 반영하지 않고 AI 응답 캐시 존재 여부만 확인"""
+    return ai_response_cache.get(_versioned_ai_response_key(mbti1, mbti2), touch=False) is not None
+
+def save_ai_response_to_cache(mbti1, mbti2, ai_score, reason):
+    """AI 응답을 캐시에 저장"""
+    ai_response_cache.put(_versioned_ai_response_key(mbti1, mbti2), {'score': ai_score, 'reason': reason})
+
+def parse_ai_matching_response(ai_response):
+    """AI 응답에서 점수와 이유 추출 → (ai_score, reason) 또는 None"""
+    # AI 응답에서 점수와 이유 추출 (한국어 복원, 멀티라인 처리)
+    score_match = re.search(r'점수:\s*(\d+)', ai_response)
+    reason_match = re.search(r'이유:\s*(.+?)(?:\n\n|\n\*\*|\*\*|$)', ai_response, re.DOTALL)
+
+    if not (score_match and reason_match):
+        return None
+
+    ai_score = int(score_match.group(1))
+    return ai_score, clean_ai_matching_reason(reason_match.group(1))
+
+def clean_ai_matching_reason(ai_reason):
+    """AI가 생성한 매칭 이유 정리 (마크다운 제거, 사주 키워드 보강, 140자 제한)"""
+    ai_reason = ai_reason.strip()
+
+    # 마크다운 제거 및 자연스러운 문장 단위로 자르기
+    clean_reason = ai_reason.replace('**', '').replace('*', '').replace('#', '').strip()
+
+    # 사주 키워드가 없으면 강제로 추가
+    if '사주상' not in clean_reason and '오행' not in clean_reason:
+        print("⚠️ AI가 사주 분석을 누락함 - 강제 추가")
+        # MBTI 분석 뒤에 사주 내용 추가
+        if '. ' in clean_reason:
+            parts = clean_reason.split('. ', 1)
+            clean_reason = f"{parts[0]}. 사주상 오행의 기운도 조화롭게 어울려 좋은 인연을 만들어갈 수 있어요."
+        else:
+            # 마지막에 사주 내용 추가
+            clean_reason = clean_reason.rstrip('.') + ". 사주상 기운의 조화도 긍정적입니다."
+
+    if len(clean_reason) <= 140:
+        final_reason = clean_reason
+    else:
+        # 140자 근처에서 자연스러운 문장 끝을 찾기
+        truncated = clean_reason[:140]
+        # 마지막 완전한 문장 찾기 (마침표, 느낌표, 물음표, '요', '다' 등으로 끝나는)
+        sentence_endings = ['.', '!', '?', '요', '다', '음', '네', '죠']
+        last_sentence_end = -1
+
+        for ending in sentence_endings:
+            pos = truncated.rfind(ending)
+            if pos > last_sentence_end:
+                last_sentence_end = pos
+
+        if last_sentence_end > 80:  # 너무 짧지 않으면 문장 단위로 자르기
+            final_reason = clean_reason[:last_sentence_end + 1]
+        else:
+            # 문장 끝을 찾지 못하면 140자로 자르고 마침표 추가
+            final_reason = clean_reason[:135] + '요.'
+
+    print(f"✂️ 최종 결과: '{final_reason}' (길이: {len(final_reason)}자)")
+    return final_reason
+
+def parse_ai_batch_matching_response(ai_response, mbti_pairs):
+    """배치 응답(JSON 배열)에서 검증을 통과한 항목만 추출 → {쌍 인덱스: (ai_score, reason)}"""
+    # 코드 블록 등 앞뒤 텍스트를 제외하고 JSON 배열 부분만 사용
+    start, end = ai_response.find('['), ai_response.rfind(']')
+    if start < 0 or end <= start:
+        return {}
+    try:
+        items = json.loads(ai_response[start:end + 1])
+    except json.JSONDecodeError:
+        return {}
+    if not isinstance(items, list):
+        return {}
+
+    parsed = {}
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        pair_id, score, reason = item.get('id'), item.get('score'), item.get('reason')
+        if isinstance(pair_id, bool) or not isinstance(pair_id, int) or not 1 <= pair_id <= len(mbti_pairs):
+            continue
+        if isinstance(score, bool) or not isinstance(score, (int, float)) or not 0 <= score <= 100:
+            continue
+        if not isinstance(reason, str) or not reason.strip():
+            continue
+        # 다른 쌍의 이유가 섞이지 않았는지 MBTI 포함 여부로 확인
+        mbti_a, mbti_b = mbti_pairs[pair_id - 1]
+        if mbti_a not in reason.upper() or mbti_b not in reason.upper():
+            continue
+        parsed[pair_id - 1] = (int(score), clean_ai_matching_reason(reason))
+    return parsed
+
+def combine_matching_scores(quick_score, ai_score):
+    """룰 기반과 AI 결과 조합"""
+    final_score = int((quick_score * 0.7) + (ai_score * 0.3))
+    return max(20, min(100, final_score))
+
+# --- [Gemini 호출 실행기: 동시성 제한 + 토큰 버킷 속도 제한] ---
+# 호출마다 스레드를 만들고 고정 sleep으로 간격을 두는 대신, 공유 워커 풀과
+# Gemini 할당량(RPM/TPM)에 맞춘 토큰 버킷으로 처리량을 제어
+GEMINI_MAX_CONCURRENCY = int(os.getenv('GEMINI_MAX_CONCURRENCY', '4'))
+GEMINI_RPM_LIMIT = int(os.getenv('GEMINI_RPM_LIMIT', '15'))  # 무료 티어 분당 요청 수
+GEMINI_TPM_LIMIT = int(os.getenv('GEMINI_TPM_LIMIT', '1000000'))  # 무료 티어 분당 토큰 수
+GEMINI_CALL_TIMEOUT = float(os.getenv('GEMINI_CALL_TIMEOUT', '10'))  # 호출당 마감 시간 (초)
+GEMINI_BATCH_SIZE = int(os.getenv('GEMINI_BATCH_SIZE', '8'))  # 배치 프롬프트당 MBTI 쌍 수 (1이면 쌍별 요청)
+GEMINI_BATCH_CALL_TIMEOUT = float(os.getenv('GEMINI_BATCH_CALL_TIMEOUT', '30'))  # 배치 요청 마감 시간 (초)
+GEMINI_ADMISSION_TIMEOUT = float(os.getenv('GEMINI_ADMISSION_TIMEOUT', '120'))  # 할당량/슬롯 대기 한도 (초, 0이면 무제한)
+GEMINI_BURST_RATIO = float(os.getenv('GEMINI_BURST_RATIO', '0.2'))  # 분당 허용량 중 한 번에 몰아 쓸 수 있는 비율
+
+GEMINI_SAFETY_SETTINGS = [
+    {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"},
+]
+
+class TokenBucket:
+    """분당 허용량을 넘지 않도록 채우는 토큰 버킷 (스레드 안전)
+
+    버스트(capacity)만큼 미리 채워 두고 나머지(per_minute - capacity)를 1분에 걸쳐 채우므로
+    어느 60초 구간에서도 per_minute을 넘지 않는다.
+    """
+
+    def __init__(self, per_minute, capacity=None):
+        self.capacity = capacity or max(1, int(per_minute * GEMINI_BURST_RATIO))
+        self.rate = max(per_minute - self.capacity, 1) / 60.0
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def acquire(self, amount=1, deadline=None):
+        """토큰을 얻을 때까지 대기 (deadline(monotonic)까지 얻지 못하면 False)"""
+        amount = min(amount, self.capacity)
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return True
+                wait_time = (amount - self.tokens) / self.rate
+            if deadline is not None and time.monotonic() + wait_time > deadline:
+                return False
+            time.sleep(min(wait_time, 1.0))
+
+    def refund(self, amount=1):
+        """사용하지 못한 토큰 반환"""
+        self.adjust(-min(amount, self.capacity))
+
+    def adjust(self, amount):
+        """예상치와 실제 사용량의 차이를 반영 (음수 잔량 허용)"""
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens - amount)
+
+class GeminiExecutor:
+    """공유 워커 풀 + RPM/TPM 토큰 버킷 + 호출별 마감 시간을 가진 Gemini 실행기
+
+    할당량·슬롯 대기(입장)는 admission_timeout으로 따로 제한하고,
+    호출 마감 시간은 입장한 뒤부터 잰다 (대기열이 길어도 호출 시간을 잠식하지 않음).
+    """
+
+    def __init__(self, max_workers, rpm_limit, tpm_limit, call_timeout, admission_timeout=None):
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='gemini')
+        self.slots = threading.BoundedSemaphore(max_workers)
+        self.request_bucket = TokenBucket(rpm_limit)
+        self.token_bucket = TokenBucket(tpm_limit)
+        self.call_timeout = call_timeout
+        self.admission_timeout = admission_timeout
+        self.stats = {'calls': 0, 'timeouts': 0, 'rate_limited': 0}
+        self.stats_lock = threading.Lock()
+
+    def _count(self, key):
+        with self.stats_lock:
+            self.stats[key] += 1
+
+    def get_stats(self):
+        """통계 스냅샷"""
+        with self.stats_lock:
+            return dict(self.stats)
+
+    def submit(self, fn, *args, **kwargs):
+        """워커 풀에 작업 제출 → Future"""
+        return self.pool.submit(fn, *args, **kwargs)
+
+    def _admit(self, estimated_tokens):
+        """RPM/TPM 토큰과 실행 슬롯 확보 (입장 대기 한도 초과 시 TimeoutError)"""
+        admission_deadline = time.monotonic() + self.admission_timeout if self.admission_timeout else None
+
+        if not self.request_bucket.acquire(1, admission_deadline):
+            self._count('rate_limited')
+            raise TimeoutError("Gemini 요청 할당량 대기 시간 초과")
+        if not self.token_bucket.acquire(estimated_tokens, admission_deadline):
+            # 호출하지 않으므로 이미 받은 요청 토큰은 돌려줌
+            self.request_bucket.refund(1)
+            self._count('rate_limited')
+            raise TimeoutError("Gemini 토큰 할당량 대기 시간 초과")
+
+        slot_timeout = max(admission_deadline - time.monotonic(), 0) if admission_deadline else None
+        if not self.slots.acquire(timeout=slot_timeout):
+            self.request_bucket.refund(1)
+            self.token_bucket.refund(estimated_tokens)
+            self._count('rate_limited')
+            raise TimeoutError("Gemini 실행 슬롯 대기 시간 초과")
+
+    def generate_content(self, model, prompt, generation_config=None, timeout=None):
+        """속도 제한을 지키며 마감 시간 안에서 generate_content 호출 (초과 시 TimeoutError)"""
+        timeout = timeout or self.call_timeout
+        # 한국어 프롬프트는 대략 2글자당 1토큰, 출력 토큰 여유분 포함
+        estimated_tokens = len(prompt) // 2 + 300
+
+        self._admit(estimated_tokens)
+        try:
+            self._count('calls')
             try:
-                # 안전 필터 완전 비활성화
-                safety_settings = [
-                    {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
-                    {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
-                    {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
-                    {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"},
-                ]
-                
+                # request_options의 timeout으로 실제 HTTP 요청 자체에 마감 시간을 적용
                 response = model.generate_content(
                     prompt,
-                    generation_config=genai.types.GenerationConfig(
-                        temperature=0.3,  # 더 창의적인 응답을 위해 약간 증가
-                        max_output_tokens=1000,  # 토큰 제한 해결을 위해 감소
-                    ),
-                    safety_settings=safety_settings
+                    generation_config=generation_config,
+                    safety_settings=GEMINI_SAFETY_SETTINGS,
+                    request_options={'timeout': timeout}
                 )
-                result_queue.put(response)
             except Exception as e:
-                exception_queue.put(e)
-        
-        # 스레드로 AI 호출 실행
-        ai_thread = threading.Thread(target=ai_call_with_timeout)
-        ai_thread.daemon = True
-        ai_thread.start()
-        
-        # 10초 타임아웃으로 결과 대기
-        ai_thread.join(timeout=10.0)
-        
-        if ai_thread.is_alive():
-            ai_elapsed = time.time() - ai_start_time
-            print(f"⏰ AI 호출 타임아웃 ({ai_elapsed:.2f}초) - 강제 중단")
-            return quick_score, f"{user1['mbti']}와 {user2['mbti']}는 성격적으로 조화를 이루며, 사주상 기운의 흐름도 긍정적입니다. 서로의 특성이 잘 어울려 좋은 파트너십을 형성할 수 있는 인연이에요."
-        
-        # 예외 확인
-        if not exception_queue.empty():
-            raise exception_queue.get()
-        
-        # 결과 확인
-        if result_queue.empty():
-            print(f"⚠️ AI 응답 없음 - 알 수 없는 오류")
-            return quick_score, f"{user1['mbti']}와 {user2['mbti']}는 성격적으로 조화를 이루며, 사주상 기운의 흐름도 긍정적입니다. 서로의 특성이 잘 어울려 좋은 파트너십을 형성할 수 있는 인연이에요."
-        
-        response = result_queue.get()
+                if 'deadline' in str(e).lower() or 'timeout' in str(e).lower():
+                    self._count('timeouts')
+                raise
+        finally:
+            self.slots.release()
+
+        usage = getattr(response, 'usage_metadata', None)
+        if usage and getattr(usage, 'total_token_count', None):
+            self.token_bucket.adjust(usage.total_token_count - estimated_tokens)
+        return response
+
+gemini_executor = GeminiExecutor(GEMINI_MAX_CONCURRENCY, GEMINI_RPM_LIMIT, GEMINI_TPM_LIMIT, GEMINI_CALL_TIMEOUT,
+                                 GEMINI_ADMISSION_TIMEOUT)
+
+def perform_ai_matching_analysis(user1, user2, quick_score, model):
+    """AI를 활용한 심층 매칭 분석 (MBTI 쌍 단위 응답 캐시 사용)"""
+    # 캐시 확인 (같은 MBTI 쌍이면 AI 호출 없이 즉시 반환)
+    cached = get_cached_ai_response(user1['mbti'], user2['mbti'])
+    if cached:
+        ai_score, ai_reason = cached
+        print(f"⚡ AI 응답 캐시 사용: {user1['name']} ↔ {user2['name']} ({user1['mbti']}/{user2['mbti']})")
+        return combine_matching_scores(quick_score, ai_score), ai_reason
+
+    return request_ai_matching_analysis(user1, user2, quick_score, model)
+
+def request_ai_matching_analysis(user1, user2, quick_score, model):
+    """한 쌍에 대한 AI 심층 매칭 분석 요청 (캐시 조회 없이 호출 후 캐시에 저장)"""
+    fallback_reason = f"{user1['mbti']}와 {user2['mbti']}는 성격적으로 조화를 이루며, 사주상 기운의 흐름도 긍정적입니다. 서로의 특성이 잘 어울려 좋은 파트너십을 형성할 수 있는 인연이에요."
+
+    try:
+        # MBTI와 사주 종합 분석 (강제 패턴) - 사용자 순서대로 정규화한 MBTI 쌍으로 프롬프트 생성
+        mbti_a, mbti_b = normalize_mbti_pair(user1['mbti'], user2['mbti'])
+        prompt = AI_MATCHING_PROMPT_TEMPLATE.format(mbti1=mbti_a, mbti2=mbti_b)
+
+        print(f"🤖 AI 분석 시작: {user1['name']} ↔ {user2['name']}")
+        print(f"📝 전송 프롬프트: {prompt[:100]}...")
+        ai_start_time = time.time()
+
+        # 공유 실행기를 통해 호출 (속도 제한 + 마감 시간 적용)
+        response = gemini_executor.generate_content(
+            model,
+            prompt,
+            generation_config=genai.types.GenerationConfig(
+                temperature=0.3,  # 더 창의적인 응답을 위해 약간 증가
+                max_output_tokens=1000,  # 토큰 제한 해결을 위해 감소
+            )
+        )
         
         ai_elapsed = time.time() - ai_start_time
         print(f"🤖 AI 응답 완료: {ai_elapsed:.2f}초")
@@ -437,7 +1290,7 @@ def perform_ai_matching_analysis(user1, user2, quick_score, model):
         # 안전성 검사
         if not response.candidates or len(response.candidates) == 0:
             print(f"⚠️ AI 응답 없음: 안전 필터 차단")
-            return quick_score, f"{user1['mbti']}와 {user2['mbti']}는 성격적으로 조화를 이루며, 사주상 기운의 흐름도 긍정적입니다. 서로의 특성이 잘 어울려 좋은 파트너십을 형성할 수 있는 인연이에요."
+            return quick_score, fallback_reason
 
         candidate = response.candidates[0]
         if candidate.finish_reason != 1:  # 1 = STOP (정상 완료)
@@ -446,170 +1299,266 @@ def perform_ai_matching_analysis(user1, user2, quick_score, model):
                 print(f"🚫 토큰 한도 초과 또는 안전 필터 차단")
             elif candidate.finish_reason == 3:
                 print(f"🚫 최대 토큰 길이 초과")
-            return quick_score, f"{user1['mbti']}와 {user2['mbti']}는 성격적으로 조화를 이루며, 사주상 기운의 흐름도 긍정적입니다. 서로의 특성이 잘 어울려 좋은 파트너십을 형성할 수 있는 인연이에요."
+            return quick_score, fallback_reason
             
 
         try:
             ai_response = response.text.strip()
         except:
             print(f"⚠️ AI 응답 텍스트 추출 실패")
-            return quick_score, f"{user1['mbti']}와 {user2['mbti']}는 성격적으로 조화를 이루며, 사주상 기운의 흐름도 긍정적입니다. 서로의 특성이 잘 어울려 좋은 파트너십을 형성할 수 있는 인연이에요."
-
-        # AI 응답에서 점수와 이유 추출 (한국어 복원, 멀티라인 처리)
-        score_match = re.search(r'점수:\s*(\d+)', ai_response)
-        reason_match = re.search(r'이유:\s*(.+?)(?:\n\n|\n\*\*|\*\*|$)', ai_response, re.DOTALL)
+            return quick_score, fallback_reason
 
-        if score_match and reason_match:
-            ai_score = int(score_match.group(1))
-            ai_reason = reason_match.group(1).strip()
+        parsed = parse_ai_matching_response(ai_response)
+        if parsed:
+            ai_score, final_reason = parsed
 
-            # 룰 기반과 AI 결과 조합
-            final_score = int((quick_score * 0.7) + (ai_score * 0.3))
-            final_score = max(20, min(100, final_score))
-
-            # 마크다운 제거 및 자연스러운 문장 단위로 자르기
-            clean_reason = ai_reason.replace('**', '').replace('*', '').replace('#', '').strip()
-            
-            # 사주 키워드가 없으면 강제로 추가
-            if '사주상' not in clean_reason and '오행' not in clean_reason:
-                print("⚠️ AI가 사주 분석을 누락함 - 강제 추가")
-                # MBTI 분석 뒤에 사주 내용 추가
-                if '. ' in clean_reason:
-                    parts = clean_reason.split('. ', 1)
-                    clean_reason = f"{parts[0]}. 사주상 오행의 기운도 조화롭게 어울려 좋은 인연을 만들어갈 수 있어요."
-                else:
-                    # 마지막에 사주 내용 추가
-                    clean_reason = clean_reason.rstrip('.') + ". 사주상 기운의 조화도 긍정적입니다."
-            
-            if len(clean_reason) <= 140:
-                final_reason = clean_reason
-            else:
-                # 140자 근처에서 자연스러운 문장 끝을 찾기
-                truncated = clean_reason[:140]
-                # 마지막 완전한 문장 찾기 (마침표, 느낌표, 물음표, '요', '다' 등으로 끝나는)
-                sentence_endings = ['.', '!', '?', '요', '다', '음', '네', '죠']
-                last_sentence_end = -1
-                
-                for ending in sentence_endings:
-                    pos = truncated.rfind(ending)
-                    if pos > last_sentence_end:
-                        last_sentence_end = pos
-                
-                if last_sentence_end > 80:  # 너무 짧지 않으면 문장 단위로 자르기
-                    final_reason = clean_reason[:last_sentence_end + 1]
-                else:
-                    # 문장 끝을 찾지 못하면 140자로 자르고 마침표 추가
-                    final_reason = clean_reason[:135] + '요.'
-            
-            print(f"✂️ 최종 결과: '{final_reason}' (길이: {len(final_reason)}자)")
+            # 파싱에 성공한 응답만 캐시에 저장 (폴백 결과는 저장하지 않음)
+            save_ai_response_to_cache(user1['mbti'], user2['mbti'], ai_score, final_reason)
 
+            final_score = combine_matching_scores(quick_score, ai_score)
             print(f"✅ AI 매칭 분석 완료: {user1['name']} ↔ {user2['name']} (최종 점수: {final_score})")
             return final_score, final_reason
         else:
             # AI 분석 실패 시 룰 기반 결과 사용
             print(f"⚠️ AI 분석 결과 파싱 실패, 룰 기반 결과 사용")
-            return quick_score, f"{user1['mbti']}와 {user2['mbti']}는 성격적으로 조화를 이루며, 사주상 기운의 흐름도 긍정적입니다. 서로의 특성이 잘 어울려 좋은 파트너십을 형성할 수 있는 인연이에요."
+            return quick_score, fallback_reason
 
     except Exception as e:
         error_msg = str(e).lower()
         if "quota" in error_msg or "limit" in error_msg:
             print(f"⚠️ AI API 할당량 초과, 룰 기반 결과 사용")
-        elif "timeout" in error_msg:
+        elif isinstance(e, TimeoutError) or "timeout" in error_msg:
             print(f"⚠️ AI API 타임아웃, 룰 기반 결과 사용")
         else:
             print(f"❌ AI 매칭 분석 오류: {e}")
         return quick_score, "사주의 기운과 성격을 살펴보니 기본적인 조화는 이루고 있는 인연입니다"
 
-# 캐시 초기화
-# 캐시를 강제로 빈 상태로 시작 (구 형식 문제 해결)
-saju_analysis_cache = {}
-# saju_analysis_cache = load_saju_cache()  # 임시로 비활성화
-matching_cache = load_matching_cache()
-
-def calculate_saju_pillars(year, month, day, hour):
-    # 캐시 키 생성
-    cache_key = (year, month, day, hour)
-
-    # 캐시 확인 (이미 계산된 결과가 있으면 즉시 반환)
-    if cache_key in saju_cache:
-        return saju_cache[cache_key]
-    # 천간과 지지 상수 (최적화된 배열)
-    cheon_gan = ["갑", "을", "병", "정", "무", "기", "경", "신", "임", "계"]
-    ji_ji = ["자", "축", "인", "묘", "진", "사", "오", "미", "신", "유", "술", "해"]
-
-    # 연주 계산 (수학적 계산으로 즉시 완료)
-    year_gan_index = (year - 4) % 10
-    year_ji_index = (year - 4) % 12
-    year_pillar = cheon_gan[year_gan_index] + ji_ji[year_ji_index]
-
-    # 월주 계산 (lookup table로 즉시 완료)
-    month_starts = [4, 5, 6, 7, 8, 9, 10, 11, 12, 1, 2, 3]
-    month_index = month_starts.index(month)
-    month_gan_key = cheon_gan[year_gan_index]
-
-    # 초고속 간지 오프셋 매핑
-    gan_offset_map = {
-        "갑": 0, "기": 0,
-        "을": 2, "경": 2,
-        "병": 4, "신": 4,
-        "정": 6, "임": 6,
-        "무": 8, "계": 8
-    }
-    gan_offset = gan_offset_map.get(month_gan_key, 8)
-
-    # 월주 lookup table (미리 계산된 값들)
-    month_pillars = [
-        "병인", "정묘", "무진", "기사", "경오", "신미", "임신", "계유", "갑술", "을해", "병자", "정축",
-        "무인", "기묘", "경진", "신사", "임오", "계미", "갑신", "을유", "병술", "정해", "무자", "기축",
-        "경인", "신묘", "임진", "계사", "갑오", "을미", "병신", "정유", "무술", "기해", "경자", "신축",
-        "임인", "계묘", "갑진", "을사", "병오", "정미", "무신", "기유", "경술", "신해", "임자", "계축",
-        "갑인", "을묘", "병진", "정사", "무오", "기미", "경신", "신유", "임술", "계해", "갑자", "을축"
-    ]
+def perform_batch_ai_matching_analysis(pairs, model):
+    """여러 쌍을 하나의 배치 프롬프트로 분석 → 입력 순서대로 [(final_score, reason), ...]
+
+    pairs: [(user1, user2, quick_score), ...]
+    캐시에 있는 쌍은 바로 반환하고, 나머지 MBTI 쌍들을 JSON 배열 프롬프트 한 번으로 요청.
+    파서가 검증하지 못한 쌍은 기존 쌍별 요청 경로로 폴백.
+    """
+    results = [None] * len(pairs)
+    uncached = {}  # 캐시 키 -> 해당 키를 가진 쌍 인덱스 목록
+    for pair_index, (user1, user2, quick_score) in enumerate(pairs):
+        cached = get_cached_ai_response(user1['mbti'], user2['mbti'])
+        if cached:
+            results[pair_index] = (combine_matching_scores(quick_score, cached[0]), cached[1])
+        else:
+            uncached.setdefault(get_ai_response_cache_key(user1['mbti'], user2['mbti']), []).append(pair_index)
 
-    # 월주 인덱스 계산 및 lookup
-    month_pillar_index = (year_gan_index * 12 + month_index) % 60
-    month_pillar = month_pillars[month_pillar_index]
+    keys = list(uncached)
+    parsed = {}
+    if len(keys) > 1:
+        mbti_pairs = [tuple(key.split('|')) for key in keys]
+        pair_lines = "\n".join(f"{i + 1}. {mbti_a}와 {mbti_b}" for i, (mbti_a, mbti_b) in enumerate(mbti_pairs))
+        prompt = AI_BATCH_MATCHING_PROMPT_TEMPLATE.format(count=len(keys), pair_lines=pair_lines)
 
-    # 일주 계산 (수학적 공식으로 즉시 계산 - 초고속)
-    # 2000년 1월 1일 (토요일) 기준으로 총 일수 계산
-    base_year = 2000
-    base_month = 1
-    base_day = 1
+        try:
+            print(f"🤖 AI 배치 분석 시작: {len(keys)}쌍")
+            ai_start_time = time.time()
+            response = gemini_executor.generate_content(
+                model,
+                prompt,
+                generation_config=genai.types.GenerationConfig(
+                    temperature=0.3,
+                    max_output_tokens=200 * len(keys) + 200,
+                    response_mime_type='application/json',
+                ),
+                timeout=GEMINI_BATCH_CALL_TIMEOUT
+            )
+            parsed = parse_ai_batch_matching_response(response.text.strip(), mbti_pairs)
+            print(f"🤖 AI 배치 응답 완료: {time.time() - ai_start_time:.2f}초, 유효 {len(parsed)}/{len(keys)}쌍")
+        except Exception as e:
+            print(f"⚠️ AI 배치 분석 실패, 쌍별 분석으로 폴백: {e}")
+
+    for key_index, key in enumerate(keys):
+        pair_indices = uncached[key]
+        if key_index in parsed:
+            ai_score, ai_reason = parsed[key_index]
+            first_user1, first_user2, _ = pairs[pair_indices[0]]
+            save_ai_response_to_cache(first_user1['mbti'], first_user2['mbti'], ai_score, ai_reason)
+            for pair_index in pair_indices:
+                results[pair_index] = (combine_matching_scores(pairs[pair_index][2], ai_score), ai_reason)
+        else:
+            # 검증 실패 쌍은 기존 쌍별 경로로 요청 (같은 키의 나머지 쌍은 캐시 사용)
+            for n, pair_index in enumerate(pair_indices):
+                user1, user2, quick_score = pairs[pair_index]
+                if n == 0:
+                    results[pair_index] = request_ai_matching_analysis(user1, user2, quick_score, model)
+                else:
+                    results[pair_index] = perform_ai_matching_analysis(user1, user2, quick_score, model)
+
+    return results
+
+# 사주 분석 결과 캐시 (MBTI별, 요청 경로에서는 메모리에만 쓰고 SQLite 저장은 백그라운드에서 일괄 처리)
+SAJU_ANALYSIS_CACHE_MAX_ENTRIES = int(os.getenv('SAJU_ANALYSIS_CACHE_MAX_ENTRIES', '1000'))
+SAJU_ANALYSIS_FLUSH_INTERVAL = float(os.getenv('SAJU_ANALYSIS_FLUSH_INTERVAL', '2'))
+SAJU_ANALYSIS_FLUSH_BATCH = int(os.getenv('SAJU_ANALYSIS_FLUSH_BATCH', '64'))
+saju_analysis_cache = WriteBehindCache(
+    SqliteCache(CACHE_DB_FILE, 'saju_analyses', max_entries=SAJU_ANALYSIS_CACHE_MAX_ENTRIES),
+    flush_interval=SAJU_ANALYSIS_FLUSH_INTERVAL,
+    batch_size=SAJU_ANALYSIS_FLUSH_BATCH
+)
+atexit.register(saju_analysis_cache.flush)  # 종료 시 남은 대기열 저장
+
+# 천간/지지와 60갑자 (간지 번호 c의 천간은 c % 10, 지지는 c % 12)
+CHEON_GAN = ("갑", "을", "병", "정", "무", "기", "경", "신", "임", "계")
+JI_JI = ("자", "축", "인", "묘", "진", "사", "오", "미", "신", "유", "술", "해")
+SEXAGENARY_CYCLE = tuple(CHEON_GAN[i % 10] + JI_JI[i % 12] for i in range(60))
+SEXAGENARY_CYCLE_ARRAY = np.array(SEXAGENARY_CYCLE)
+
+# 월별 누적 일수 (평년 기준)
+CUMULATIVE_DAYS = (0, 31, 59, 90, 120, 151, 181, 212, 243, 273, 304, 334)
+CUMULATIVE_DAYS_ARRAY = np.array(CUMULATIVE_DAYS, dtype=np.int64)
+
+# 시간(0~23시)별 지지 번호 (자시부터 2시간 단위)
+HOUR_BRANCH_INDICES = tuple(hour // 2 for hour in range(24))
+HOUR_BRANCH_INDICES_ARRAY = np.array(HOUR_BRANCH_INDICES, dtype=np.int64)
+
+# 월주는 인월(입춘~경칩)을 첫 달로 세고, 60갑자에서 병인(2번)부터 연간 × 12개월씩 진행
+MONTH_PILLAR_CYCLE_OFFSET = 2
+SAJU_PILLAR_DAY_BASE_YEAR = 2000  # 일주 계산 기준 연도 (2000년 1월 1일)
+
+SAJU_PILLAR_CACHE_SIZE = int(os.getenv('SAJU_PILLAR_CACHE_SIZE', '4096'))
+
+# 절기(節) 시각 테이블 (build_solar_terms.py로 생성)
+# 1900-01-01 00:00 KST 기준 경과 분, 1899년 대설 + 1900~2100년 연도별 12절(소한, 입춘, ... 대설) 순서
+SOLAR_TERMS_FILE = os.path.join(os.path.dirname(__file__), 'solar_terms.bin')
+SOLAR_TERMS_START_YEAR = 1900
+SOLAR_TERMS_END_YEAR = 2100
+# 테이블을 읽지 못했을 때 쓰는 12절의 평균 날짜 (월, 일)
+SOLAR_TERM_APPROX_DATES = ((1, 6), (2, 4), (3, 6), (4, 5), (5, 6), (6, 6), (7, 7), (8, 8), (9, 8), (10, 8), (11, 7), (12, 7))
+TROPICAL_YEAR_MINUTES = 365.24219 * 1440  # 테이블 범위 밖의 연도는 회귀년 단위로 옮겨서 조회
+SAJU_BIRTH_MINUTE = 30  # 생시는 시 단위로만 받으므로 해당 시의 가운데(30분)로 간주
+
+def sexagenary_index(stem_index, branch_index):
+    """천간/지지 번호 → 60갑자 번호"""
+    return (6 * stem_index - 5 * branch_index) % 60
+
+def days_from_civil(year, month, day):
+    """그레고리력 날짜 → 1900-01-01 기준 경과 일수 (정수와 NumPy 배열 모두 지원)"""
+    year = year - (month <= 2)
+    era = year // 400
+    year_of_era = year - era * 400
+    day_of_year = (153 * ((month + 9) % 12) + 2) // 5 + day - 1
+    day_of_era = year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year
+    return era * 146097 + day_of_era - 693901
+
+def load_solar_terms():
+    """절기 시각 테이블 로드 (파일이 없거나 손상되었으면 평균 날짜로 만든 근사 테이블 반환)"""
+    expected_count = 1 + 12 * (SOLAR_TERMS_END_YEAR - SOLAR_TERMS_START_YEAR + 1)
+    try:
+        table = np.fromfile(SOLAR_TERMS_FILE, dtype='<i4').astype(np.int64)
+        if len(table) == expected_count and np.all(np.diff(table) > 0):
+            return table
+        print(f"⚠️ 절기 테이블 형식 오류 ({len(table)}개, 기대값 {expected_count}개) - 평균 날짜로 대체")
+    except Exception as e:
+        print(f"⚠️ 절기 테이블 로드 실패: {e} - 평균 날짜로 대체")
+
+    years = np.repeat(np.arange(SOLAR_TERMS_START_YEAR, SOLAR_TERMS_END_YEAR + 1), 12)
+    months = np.tile([month for month, _ in SOLAR_TERM_APPROX_DATES], len(years) // 12)
+    days = np.tile([day for _, day in SOLAR_TERM_APPROX_DATES], len(years) // 12)
+    first_term = days_from_civil(SOLAR_TERMS_START_YEAR - 1, 12, 7)
+    return np.concatenate([[first_term], days_from_civil(years, months, days)]) * 1440
+
+SOLAR_TERM_MINUTES = load_solar_terms()
+SOLAR_TERM_MINUTE_LIST = SOLAR_TERM_MINUTES.tolist()  # 단건 조회용 (bisect)
+
+def solar_term_to_saju_month(position, year_shift):
+    """절기 테이블 위치 → (사주 연도, 월 번호 0=인월 ~ 11=축월)
+
+    위치 0은 시작 전년도 대설, 이후는 (연도, 절 번호 0=소한 ~ 11=대설) 순서.
+    소한~입춘 전은 전년도에 속함.
+    """
+    position = position + 11
+    term_year = SOLAR_TERMS_START_YEAR - 1 + position // 12
+    term_index = position % 12
+    return term_year - (term_index == 0) + year_shift, (term_index - 1) % 12
+
+def calculate_solar_month(year, month, day, hour):
+    """생년월일시 → (사주 연도, 월 번호): 연도는 입춘, 월은 12절 기준 (절기 테이블 이진 탐색, O(log n))"""
+    minutes = days_from_civil(year, month, day) * 1440 + hour * 60 + SAJU_BIRTH_MINUTE
+    year_shift = year - min(max(year, SOLAR_TERMS_START_YEAR), SOLAR_TERMS_END_YEAR)
+    minutes -= round(year_shift * TROPICAL_YEAR_MINUTES)
+    position = max(bisect_right(SOLAR_TERM_MINUTE_LIST, minutes) - 1, 0)
+    return solar_term_to_saju_month(position, year_shift)
+
+def calculate_solar_month_batch(years, months, days, hours):
+    """calculate_solar_month의 NumPy 배열 버전"""
+    minutes = days_from_civil(years, months, days) * 1440 + hours * 60 + SAJU_BIRTH_MINUTE
+    year_shift = years - np.clip(years, SOLAR_TERMS_START_YEAR, SOLAR_TERMS_END_YEAR)
+    minutes = minutes - np.rint(year_shift * TROPICAL_YEAR_MINUTES).astype(np.int64)
+    positions = np.maximum(np.searchsorted(SOLAR_TERM_MINUTES, minutes, side='right') - 1, 0)
+    return solar_term_to_saju_month(positions, year_shift)
+
+def calculate_saju_pillar_indices(year, month, day, hour):
+    """생년월일시 → (연주, 월주, 일주, 시주)의 60갑자 번호"""
+    if not 1 <= month <= 12:
+        raise ValueError(f"{month} is not a valid month")
+
+    # 연주 계산 (입춘 기준)
+    saju_year, month_index = calculate_solar_month(year, month, day, hour)
+    year_gan_index = (saju_year - 4) % 10
+    year_index = sexagenary_index(year_gan_index, (saju_year - 4) % 12)
+
+    # 월주 계산 (절입 기준)
+    month_pillar_index = ((year_gan_index * 12 + month_index) % 60 + MONTH_PILLAR_CYCLE_OFFSET) % 60
+
+    # 일주 계산 (2000년 1월 1일 기준 경과 일수)
+    years = year - SAJU_PILLAR_DAY_BASE_YEAR
+    total_days = years * 365 + years // 4 - years // 100 + years // 400
+    leap_year_adjust = 1 if ((year % 4 == 0 and year % 100 != 0) or year % 400 == 0) and month > 2 else 0
+    total_days += CUMULATIVE_DAYS[month - 1] + leap_year_adjust + (day - 1)
+    day_gan_index = (total_days + 6) % 10  # 갑자일 기준
+    day_index = sexagenary_index(day_gan_index, (total_days + 8) % 12)
 
-    # 연도별 일수 계산 (윤년 고려)
-    total_days = (year - base_year) * 365 + (year - base_year) // 4 - (year - base_year) // 100 + (year - base_year) // 400
+    # 시주 계산 (일간에 따라 갑/기 → 갑자시, 을/경 → 병자시 ... 순으로 시작)
+    time_ji_index = HOUR_BRANCH_INDICES[hour]
+    time_gan_index = ((day_gan_index % 5) * 2 + time_ji_index) % 10
+    time_index = sexagenary_index(time_gan_index, time_ji_index)
 
-    # 월별 누적 일수 (미리 계산된 값 사용)
-    cumulative_days = [0, 31, 59, 90, 120, 151, 181, 212, 243, 273, 304, 334]
+    return year_index, month_pillar_index, day_index, time_index
 
-    # 윤년 보정
-    leap_year_adjust = 1 if ((year % 4 == 0 and year % 100 != 0) or year % 400 == 0) and month > 2 else 0
+@lru_cache(maxsize=SAJU_PILLAR_CACHE_SIZE)
+def calculate_saju_pillars(year, month, day, hour):
+    """생년월일시 → (연주, 월주, 일주, 시주) 문자열 (최근 계산 결과는 LRU 캐시에서 반환)"""
+    return tuple(SEXAGENARY_CYCLE[index] for index in calculate_saju_pillar_indices(year, month, day, hour))
 
-    total_days += cumulative_days[month - 1] + leap_year_adjust + (day - 1)
+def calculate_saju_pillars_batch(years, months, days, hours):
+    """여러 사람의 생년월일시 배열 → (N, 4) 60갑자 번호 배열 (열 순서: 연주, 월주, 일주, 시주)
 
-    # 간지 계산 (수학적 공식)
-    day_gan_index = (total_days + 6) % 10  # 갑자일 기준
-    day_ji_index = (total_days + 8) % 12   # 자일 기준
+    calculate_saju_pillar_indices와 같은 계산을 NumPy로 한 번에 수행.
+    문자열이 필요하면 SEXAGENARY_CYCLE_ARRAY[결과]로 변환.
+    """
+    years = np.asarray(years, dtype=np.int64)
+    months = np.asarray(months, dtype=np.int64)
+    days = np.asarray(days, dtype=np.int64)
+    hours = np.asarray(hours, dtype=np.int64)
+    if np.any((months < 1) | (months > 12)):
+        raise ValueError("month must be in 1..12")
 
-    day_pillar = cheon_gan[day_gan_index] + ji_ji[day_ji_index]
+    saju_years, month_indices = calculate_solar_month_batch(years, months, days, hours)
+    year_gan_index = (saju_years - 4) % 10
+    year_index = (6 * year_gan_index - 5 * ((saju_years - 4) % 12)) % 60
 
-    # 시주 계산 (lookup table로 즉시 완료)
-    # 시간별 지지 매핑 (더욱 효율적인 버전)
-    time_ji_indices = [0, 0, 1, 1, 2, 2, 3, 3, 4, 4, 5, 5, 6, 6, 7, 7, 8, 8, 9, 9, 10, 10, 11, 11]
-    time_ji_index = time_ji_indices[hour]
+    month_pillar_index = ((year_gan_index * 12 + month_indices) % 60 + MONTH_PILLAR_CYCLE_OFFSET) % 60
 
-    # 시주 간지 오프셋
-    day_gan_key = cheon_gan[day_gan_index]
-    time_gan_offset = gan_offset_map.get(day_gan_key, 8)
-    time_gan_index = (time_gan_offset + time_ji_index) % 10
+    elapsed_years = years - SAJU_PILLAR_DAY_BASE_YEAR
+    total_days = elapsed_years * 365 + elapsed_years // 4 - elapsed_years // 100 + elapsed_years // 400
+    is_leap = ((years % 4 == 0) & (years % 100 != 0)) | (years % 400 == 0)
+    total_days += CUMULATIVE_DAYS_ARRAY[months - 1] + (is_leap & (months > 2)) + (days - 1)
+    day_gan_index = (total_days + 6) % 10
+    day_index = (6 * day_gan_index - 5 * ((total_days + 8) % 12)) % 60
 
-    time_pillar = cheon_gan[time_gan_index] + ji_ji[time_ji_index]
+    time_ji_index = HOUR_BRANCH_INDICES_ARRAY[hours]
+    time_gan_index = ((day_gan_index % 5) * 2 + time_ji_index) % 10
+    time_index = (6 * time_gan_index - 5 * time_ji_index) % 60
 
-    # 계산 결과 캐시에 저장 (다음 호출 시 즉시 반환)
-    result = (year_pillar, month_pillar, day_pillar, time_pillar)
-    saju_cache[cache_key] = result
+    return np.stack([year_index, month_pillar_index, day_index, time_index], axis=1).astype(np.int8)
 
-    return result
 # --- [사주 계산 함수 부분 끝] ---
 
 # 프로젝트 루트 경로 계산 (api 폴더에서 한 단계 위로)
@@ -630,24 +1579,39 @@ VAPID_PUBLIC_KEY = os.getenv('VAPID_PUBLIC_KEY')
 VAPID_EMAIL = os.getenv('VAPID_EMAIL')
 APP_URL = os.getenv('APP_URL', 'http://localhost:5000')
 
-print(f"🔧 환경변수 확인:")
-print(f"   SUPABASE_URL: {'설정됨' if SUPABASE_URL else '없음'}")
-print(f"   SUPABASE_ANON_KEY: {'설정됨' if SUPABASE_ANON_KEY else '없음'}")
-print(f"   GOOGLE_API_KEY: {'설정됨' if os.getenv('GOOGLE_API_KEY') else '없음'}")
-print(f"   VAPID_PRIVATE_KEY: {'설정됨' if VAPID_PRIVATE_KEY else '없음'}")
-print(f"   VAPID_PUBLIC_KEY: {'설정됨' if VAPID_PUBLIC_KEY else '없음'}")
-print(f"   VAPID_EMAIL: {'설정됨' if VAPID_EMAIL else '없음'}")
-
-if not SUPABASE_URL or not SUPABASE_ANON_KEY:
-    raise ValueError("SUPABASE_URL과 SUPABASE_ANON_KEY 환경변수가 설정되지 않았습니다.")
-
-# Supabase 클라이언트 생성
-try:
-    supabase: Client = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
-    print("✅ Supabase 클라이언트 생성 성공")
-except Exception as e:
-    print(f"❌ Supabase 클라이언트 생성 실패: {e}")
-    raise
+def print_env_summary():
+    """환경변수 설정 여부 출력 (로컬 서버 시작 시)"""
+    print(f"🔧 환경변수 확인:")
+    print(f"   SUPABASE_URL: {'설정됨' if SUPABASE_URL else '없음'}")
+    print(f"   SUPABASE_ANON_KEY: {'설정됨' if SUPABASE_ANON_KEY else '없음'}")
+    print(f"   GOOGLE_API_KEY: {'설정됨' if GOOGLE_API_KEY else '없음'}")
+    print(f"   VAPID_PRIVATE_KEY: {'설정됨' if VAPID_PRIVATE_KEY else '없음'}")
+    print(f"   VAPID_PUBLIC_KEY: {'설정됨' if VAPID_PUBLIC_KEY else '없음'}")
+    print(f"   VAPID_EMAIL: {'설정됨' if VAPID_EMAIL else '없음'}")
+
+    if not GOOGLE_API_KEY:
+        print("⚠️  GOOGLE_API_KEY가 설정되지 않았습니다.")
+        print("   🔑 Google AI Studio에서 새 API 키를 발급받으세요:")
+        print("      https://makersuite.google.com/app/apikey")
+        print("   📝 발급받은 키를 아래 방법 중 하나로 설정하세요:")
+        print("      1. 환경변수: export GOOGLE_API_KEY='your-api-key'")
+        print("      2. 코드에서: GOOGLE_API_KEY = 'your-api-key'")
+
+def create_supabase_client():
+    """Supabase 클라이언트 생성 (첫 DB 접근 시 호출)"""
+    if not SUPABASE_URL or not SUPABASE_ANON_KEY:
+        raise ValueError("SUPABASE_URL과 SUPABASE_ANON_KEY 환경변수가 설정되지 않았습니다.")
+
+    from supabase import create_client
+    try:
+        client = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
+        print("✅ Supabase 클라이언트 생성 성공")
+        return client
+    except Exception as e:
+        print(f"❌ Supabase 클라이언트 생성 실패: {e}")
+        raise
+
+supabase = LazyProxy(create_supabase_client)
 
 def init_supabase_tables():
     """Supabase 테이블 초기화 (SQL 에디터에서 수동으로 실행)"""
@@ -674,9 +1638,12 @@ CREATE TABLE IF NOT EXISTS matches (
     user2_id INTEGER NOT NULL REFERENCES results(id) ON DELETE CASCADE,
     compatibility_score INTEGER NOT NULL,
     matching_reason TEXT NOT NULL,
+    is_provisional BOOLEAN NOT NULL DEFAULT FALSE,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     UNIQUE(user1_id, user2_id)
 );
+-- 등록 즉시 매칭의 임시(룰 기반) 결과 표시 (기존 테이블에는 컬럼 추가)
+ALTER TABLE matches ADD COLUMN IF NOT EXISTS is_provisional BOOLEAN NOT NULL DEFAULT FALSE;
 
 -- push_subscriptions 테이블 생성 (푸시 알림용)
 CREATE TABLE IF NOT EXISTS push_subscriptions (
@@ -712,6 +1679,19 @@ CREATE INDEX IF NOT EXISTS idx_push_subscriptions_device_token ON push_subscript
 CREATE INDEX IF NOT EXISTS idx_push_subscriptions_user_id ON push_subscriptions(user_id);
 CREATE INDEX IF NOT EXISTS idx_user_notifications_device_token ON user_notifications(device_token);
 
+-- matching_checkpoints 테이블 생성 (여러 호출에 나눠 실행하는 매칭의 진행 상태)
+CREATE TABLE IF NOT EXISTS matching_checkpoints (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL DEFAULT 'checkpoint',
+    state JSONB NOT NULL DEFAULT '{}',
+    status TEXT NOT NULL DEFAULT 'running',
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+-- 매칭 작업(kind = 'job')도 같은 테이블에 저장 (기존 테이블에는 kind 컬럼 추가)
+ALTER TABLE matching_checkpoints ADD COLUMN IF NOT EXISTS kind TEXT NOT NULL DEFAULT 'checkpoint';
+CREATE INDEX IF NOT EXISTS idx_matching_checkpoints_kind ON matching_checkpoints(kind, status, created_at DESC);
+
 -- 시퀀스 재설정 (중복 ID 문제 해결)
 SELECT setval('results_id_seq', (SELECT COALESCE(MAX(id), 0) + 1 FROM results), false);
 SELECT setval('matches_id_seq', (SELECT COALESCE(MAX(id), 0) + 1 FROM matches), false);
@@ -722,27 +1702,23 @@ SELECT setval('user_notifications_id_seq', (SELECT COALESCE(MAX(id), 0) + 1 FROM
 
 # Gemini API 키 설정
 GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY')
-
-if GOOGLE_API_KEY == 'YOUR_NEW_API_KEY_HERE' or not GOOGLE_API_KEY:
-    print("⚠️  GOOGLE_API_KEY가 설정되지 않았습니다.")
-    print("   🔑 Google AI Studio에서 새 API 키를 발급받으세요:")
-    print("      https://makersuite.google.com/app/apikey")
-    print("   📝 발급받은 키를 아래 방법 중 하나로 설정하세요:")
-    print("      1. 환경변수: export GOOGLE_API_KEY='your-api-key'")
-    print("      2. 코드에서: GOOGLE_API_KEY = 'your-api-key'")
+if GOOGLE_API_KEY == 'YOUR_NEW_API_KEY_HERE':
     GOOGLE_API_KEY = None
 
-# Supabase 테이블 초기화 안내 (실제 초기화는 Supabase 대시보드에서 수동으로 실행)
-print("🚀 Supabase 데이터베이스 설정:")
-init_supabase_tables()
+def load_genai():
+    """google.generativeai 로드 및 API 키 설정 (첫 Gemini 호출 시 실행)"""
+    global GOOGLE_API_KEY
+    module = importlib.import_module('google.generativeai')
+    if GOOGLE_API_KEY:
+        try:
+            module.configure(api_key=GOOGLE_API_KEY)
+            print("✅ Google AI API 설정 완료")
+        except Exception as e:
+            print(f"❌ Google AI API 설정 실패: {e}")
+            GOOGLE_API_KEY = None
+    return module
 
-if GOOGLE_API_KEY:
-    try:
-        genai.configure(api_key=GOOGLE_API_KEY)
-        print("✅ Google AI API 설정 완료")
-    except Exception as e:
-        print(f"❌ Google AI API 설정 실패: {e}")
-        GOOGLE_API_KEY = None
+genai = LazyProxy(load_genai)
 
 # API 키 유효성 확인 함수
 def test_api_key():
@@ -789,180 +1765,325 @@ def generate_device_token():
     """고유한 디바이스 토큰 생성"""
     return str(uuid.uuid4())
 
-def get_saju_element_analysis(year_p, month_p, day_p, time_p):
-    """사주 원소 분석 및 해석"""
-    
-    # 천간과 지지의 오행 분석
-    def get_heavenly_stem_element(stem):
-        elements = {
-            '갑': '목', '을': '목',
-            '병': '화', '정': '화', 
-            '무': '토', '기': '토',
-            '경': '금', '신': '금',
-            '임': '수', '계': '수'
-        }
-        return elements.get(stem, '토')
-    
-    def get_earthly_branch_element(branch):
-        elements = {
-            '자': '수', '축': '토', '인': '목', '묘': '목',
-            '진': '토', '사': '화', '오': '화', '미': '토',
-            '신': '금', '유': '금', '술': '토', '해': '수'
-        }
-        return elements.get(branch, '토')
-    
-    # 각 주의 천간과 지지 분리
-    year_stem, year_branch = year_p[0], year_p[1]
-    month_stem, month_branch = month_p[0], month_p[1]
-    day_stem, day_branch = day_p[0], day_p[1]
-    time_stem, time_branch = time_p[0], time_p[1]
-    
-    # 오행 분석
-    elements = [
-        get_heavenly_stem_element(year_stem), get_earthly_branch_element(year_branch),
-        get_heavenly_stem_element(month_stem), get_earthly_branch_element(month_branch),
-        get_heavenly_stem_element(day_stem), get_earthly_branch_element(day_branch),
-        get_heavenly_stem_element(time_stem), get_earthly_branch_element(time_branch)
-    ]
-    
-    # 오행별 개수 계산
-    element_count = {'목': 0, '화': 0, '토': 0, '금': 0, '수': 0}
-    for element in elements:
-        element_count[element] += 1
-    
-    # 가장 강한 오행과 부족한 오행 찾기
+# --- [사주 오행 분석] ---
+# 분석 문구는 (일간, 월지, 오행 개수, 일간과 같은 천간 위치)만으로 결정되므로
+# 사주 4주 단위로 LRU 캐시 (문구 생성이 수 µs라 미리 만든 테이블을 읽는 것보다 빠름)
+HEAVENLY_STEM_ELEMENTS = {
+    '갑': '목', '을': '목',
+    '병': '화', '정': '화',
+    '무': '토', '기': '토',
+    '경': '금', '신': '금',
+    '임': '수', '계': '수'
+}
+EARTHLY_BRANCH_ELEMENTS = {
+    '자': '수', '축': '토', '인': '목', '묘': '목',
+    '진': '토', '사': '화', '오': '화', '미': '토',
+    '신': '금', '유': '금', '술': '토', '해': '수'
+}
+
+# 성향 분석
+ELEMENT_TRAITS = {
+    '목': '성장지향적이고 창의적이며, 유연성과 포용력이 뛰어남',
+    '화': '열정적이고 활동적이며, 리더십과 추진력이 강함',
+    '토': '안정적이고 신뢰할 수 있으며, 포용력과 인내심이 뛰어남',
+    '금': '의지가 강하고 정의로우며, 결단력과 실행력이 뛰어남',
+    '수': '지혜롭고 유연하며, 적응력과 통찰력이 뛰어남'
+}
+
+# 궁합 분석
+ELEMENT_COMPATIBILITY = {
+    '목': '화(상생), 수(상생) 기운과 조화로움',
+    '화': '토(상생), 목(상생) 기운과 조화로움',
+    '토': '금(상생), 화(상생) 기운과 조화로움',
+    '금': '수(상생), 토(상생) 기운과 조화로움',
+    '수': '목(상생), 금(상생) 기운과 조화로움'
+}
+
+# 계절 영향 분석 (월지 기준)
+MONTH_BRANCH_SEASONS = {
+    '인': '봄 기운 - 새로운 시작과 성장의 에너지',
+    '묘': '봄 기운 - 창의성과 활력이 넘치는 성향',
+    '진': '늦봄 기운 - 안정적이면서도 변화를 추구',
+    '사': '여름 기운 - 열정적이고 활발한 성격',
+    '오': '여름 기운 - 리더십과 카리스마가 뛰어남',
+    '미': '늦여름 기운 - 따뜻하고 포용력이 있음',
+    '신': '가을 기운 - 차분하고 분석적인 성향',
+    '유': '가을 기운 - 완벽주의적이고 섬세함',
+    '술': '늦가을 기운 - 신중하고 계획적인 성격',
+    '자': '겨울 기운 - 깊이 있고 지혜로운 성향',
+    '축': '겨울 기운 - 인내심이 강하고 현실적',
+    '해': '늦겨울 기운 - 유연하고 적응력이 뛰어남'
+}
+
+# 특별한 조합 (연간/월간/시간이 일간과 같을 때)
+SPECIAL_COMBINATION_LABELS = (
+    "연일 비견 - 자주성이 강하고 독립적인 성향",
+    "월일 비견 - 사회성이 뛰어나고 활동적",
+    "일시 비견 - 목표 달성 능력이 뛰어남"
+)
+
+SAJU_ELEMENT_ANALYSIS_TEMPLATE = """📊 사주 오행 분석
+• 일간(본성): {day_stem}({day_element}) - {day_trait}
+• 월지 기운: {month_branch} - {season_info}
+• 강한 기운: {strongest}({strongest_count}개) - 이 기운의 특성이 두드러짐
+• 보완할 기운: {weakest}({weakest_count}개) - {weakest_trait} 특성을 기르면 좋음{special_info}
+• 궁합 기운: {compatibility}"""
+
+SAJU_ELEMENT_ANALYSIS_CACHE_SIZE = int(os.getenv('SAJU_ELEMENT_ANALYSIS_CACHE_SIZE', '4096'))
+
+def get_saju_element_analysis_key(year_p, month_p, day_p, time_p):
+    """사주 4주 → 분석 문구 키 '일간|월지|목화토금수 개수|연월시 비견 여부' (예: '갑|인|21311|100')"""
+    stems = (year_p[0], month_p[0], day_p[0], time_p[0])
+    counts = dict.fromkeys(SAJU_ELEMENTS, 0)
+    for stem in stems:
+        counts[HEAVENLY_STEM_ELEMENTS.get(stem, '토')] += 1
+    for pillar in (year_p, month_p, day_p, time_p):
+        counts[EARTHLY_BRANCH_ELEMENTS.get(pillar[1], '토')] += 1
+
+    histogram = ''.join(str(counts[element]) for element in SAJU_ELEMENTS)
+    special = ''.join('1' if stem == day_p[0] else '0' for stem in (stems[0], stems[1], stems[3]))
+    return f"{day_p[0]}|{month_p[1]}|{histogram}|{special}"
+
+def render_saju_element_analysis(key):
+    """분석 문구 키 → 사주 오행 분석 문구"""
+    day_stem, month_branch, histogram, special = key.split('|')
+    element_count = dict(zip(SAJU_ELEMENTS, map(int, histogram)))
+
+    # 가장 강한 오행과 부족한 오행 (동률이면 목화토금수 순서로 앞의 것)
     strongest_element = max(element_count, key=element_count.get)
     weakest_element = min(element_count, key=element_count.get)
-    
+
     # 일간(본인의 기본 성향) 분석
-    day_element = get_heavenly_stem_element(day_stem)
-    
-    # 성향 분석
-    element_traits = {
-        '목': '성장지향적이고 창의적이며, 유연성과 포용력이 뛰어남',
-        '화': '열정적이고 활동적이며, 리더십과 추진력이 강함',
-        '토': '안정적이고 신뢰할 수 있으며, 포용력과 인내심이 뛰어남',
-        '금': '의지가 강하고 정의로우며, 결단력과 실행력이 뛰어남',
-        '수': '지혜롭고 유연하며, 적응력과 통찰력이 뛰어남'
-    }
-    
-    # 궁합 분석
-    element_compatibility = {
-        '목': '화(상생), 수(상생) 기운과 조화로움',
-        '화': '토(상생), 목(상생) 기운과 조화로움',
-        '토': '금(상생), 화(상생) 기운과 조화로움',
-        '금': '수(상생), 토(상생) 기운과 조화로움',
-        '수': '목(상생), 금(상생) 기운과 조화로움'
-    }
-    
-    # 계절 영향 분석 (월지 기준)
-    season_analysis = {
-        '인': '봄 기운 - 새로운 시작과 성장의 에너지',
-        '묘': '봄 기운 - 창의성과 활력이 넘치는 성향',
-        '진': '늦봄 기운 - 안정적이면서도 변화를 추구',
-        '사': '여름 기운 - 열정적이고 활발한 성격',
-        '오': '여름 기운 - 리더십과 카리스마가 뛰어남',
-        '미': '늦여름 기운 - 따뜻하고 포용력이 있음',
-        '신': '가을 기운 - 차분하고 분석적인 성향',
-        '유': '가을 기운 - 완벽주의적이고 섬세함',
-        '술': '늦가을 기운 - 신중하고 계획적인 성격',
-        '자': '겨울 기운 - 깊이 있고 지혜로운 성향',
-        '축': '겨울 기운 - 인내심이 강하고 현실적',
-        '해': '늦겨울 기운 - 유연하고 적응력이 뛰어남'
-    }
-    
-    season_info = season_analysis.get(month_branch, '균형 잡힌 기운')
-    
-    # 특별한 조합 분석
-    special_combinations = []
-    if year_stem == day_stem:
-        special_combinations.append("연일 비견 - 자주성이 강하고 독립적인 성향")
-    if month_stem == day_stem:
-        special_combinations.append("월일 비견 - 사회성이 뛰어나고 활동적")
-    if time_stem == day_stem:
-        special_combinations.append("일시 비견 - 목표 달성 능력이 뛰어남")
-    
+    day_element = HEAVENLY_STEM_ELEMENTS.get(day_stem, '토')
+
+    special_combinations = [label for label, flag in zip(SPECIAL_COMBINATION_LABELS, special) if flag == '1']
     special_info = "\n• 특별한 조합: " + ", ".join(special_combinations) if special_combinations else ""
-    
-    analysis = f"""📊 사주 오행 분석
-• 일간(본성): {day_stem}({day_element}) - {element_traits[day_element]}
-• 월지 기운: {month_branch} - {season_info}
-• 강한 기운: {strongest_element}({element_count[strongest_element]}개) - 이 기운의 특성이 두드러짐
-• 보완할 기운: {weakest_element}({element_count[weakest_element]}개) - {element_traits[weakest_element]} 특성을 기르면 좋음{special_info}
-• 궁합 기운: {element_compatibility[day_element]}"""
-    
-    return analysis
 
-def send_push_notification(subscription_info, title, body, data=None):
-    """푸시 알림 전송 - Python pywebpush 라이브러리 사용"""
-    try:
-        print(f"🔔 푸시 알림 전송 시도: {title}")
-        print(f"📄 Body: {body}")
-        
-        # 환경변수에서 VAPID 키 가져오기
-        VAPID_EMAIL = os.getenv('VAPID_EMAIL')
-        VAPID_PUBLIC_KEY = os.getenv('VAPID_PUBLIC_KEY')
-        VAPID_PRIVATE_KEY = os.getenv('VAPID_PRIVATE_KEY')
-        APP_URL = os.getenv('APP_URL', 'https://love-code-eta.vercel.app/')
-        
-        if not all([VAPID_EMAIL, VAPID_PUBLIC_KEY, VAPID_PRIVATE_KEY]):
-            print("❌ VAPID 키가 설정되지 않았습니다.")
-            print(f"Email: {bool(VAPID_EMAIL)}, Public: {bool(VAPID_PUBLIC_KEY)}, Private: {bool(VAPID_PRIVATE_KEY)}")
-            return False
-        
-        print(f"🔑 VAPID 이메일: {VAPID_EMAIL}")
-        print(f"🔑 VAPID 공개키: {VAPID_PUBLIC_KEY[:20]}...")
-        
-        # 구독 정보 검증
-        endpoint = subscription_info.get('endpoint', '')
-        p256dh = subscription_info.get('keys', {}).get('p256dh', '')
-        auth = subscription_info.get('keys', {}).get('auth', '')
-
-        if not all([endpoint, p256dh, auth]):
-            print("❌ 구독 정보가 불완전합니다")
-            print(f"Endpoint: {bool(endpoint)}, p256dh: {bool(p256dh)}, auth: {bool(auth)}")
-            return False
+    return SAJU_ELEMENT_ANALYSIS_TEMPLATE.format(
+        day_stem=day_stem,
+        day_element=day_element,
+        day_trait=ELEMENT_TRAITS[day_element],
+        month_branch=month_branch,
+        season_info=MONTH_BRANCH_SEASONS.get(month_branch, '균형 잡힌 기운'),
+        strongest=strongest_element,
+        strongest_count=element_count[strongest_element],
+        weakest=weakest_element,
+        weakest_count=element_count[weakest_element],
+        weakest_trait=ELEMENT_TRAITS[weakest_element],
+        special_info=special_info,
+        compatibility=ELEMENT_COMPATIBILITY[day_element]
+    )
+
+@lru_cache(maxsize=SAJU_ELEMENT_ANALYSIS_CACHE_SIZE)
+def get_saju_element_analysis(year_p, month_p, day_p, time_p):
+    """사주 원소 분석 및 해석 (사주 4주 단위 LRU 캐시)"""
+    return render_saju_element_analysis(get_saju_element_analysis_key(year_p, month_p, day_p, time_p))
+
+def get_saju_element_analysis_stats():
+    """사주 오행 분석 캐시 통계 (LRU 적중률)"""
+    info = get_saju_element_analysis.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        'hits': info.hits,
+        'misses': info.misses,
+        'hit_rate': round(info.hits / lookups, 4) if lookups else 0.0,
+        'size': info.currsize,
+        'max_size': info.maxsize
+    }
 
-        print(f"📤 푸시 알림 전송 시도: {endpoint[:50]}...")
-        
-        # 알림 페이로드 생성
-        payload = json.dumps({
-            "title": title,
-            "body": body,
-            "icon": f"{APP_URL}/static/img/LOVECODE_ICON.png",
-            "badge": f"{APP_URL}/static/img/LOVECODE_ICON.png",
-            "data": data or {},
-            "requireInteraction": True,
-            "tag": "match-notification"
-        })
-        
-        # VAPID 클레임 설정
-        vapid_claims = {
-            "sub": f"mailto:{VAPID_EMAIL}" if not VAPID_EMAIL.startswith('mailto:') else VAPID_EMAIL
-        }
-        
-        print("📤 Python pywebpush로 푸시 알림 전송 시도...")
-        print(f"📝 Payload: {payload}")
-        
-        # 푸시 알림 전송
-        response = webpush(
-            subscription_info=subscription_info,
-            data=payload,
-            vapid_private_key=VAPID_PRIVATE_KEY,
-            vapid_claims=vapid_claims,
-            ttl=43200  # 12시간
+# 푸시 전송 설정
+PUSH_TTL = 43200  # 12시간
+PUSH_REQUEST_TIMEOUT = float(os.getenv('PUSH_REQUEST_TIMEOUT', '10'))
+VAPID_TOKEN_LIFETIME = 12 * 60 * 60  # VAPID JWT 유효 기간 (초)
+VAPID_TOKEN_REFRESH_MARGIN = 10 * 60  # 만료 이 시간 전에 새로 서명
+# 전송 결과 분류: sent / gone (404·410, 구독 삭제) / rate_limited (429) / transient (5xx·네트워크 오류) / failed
+PUSH_DELIVERY_STATUSES = ('sent', 'gone', 'rate_limited', 'transient', 'failed')
+
+class PushClient:
+    """Web Push 전송 클라이언트
+
+    VAPID 키는 한 번만 파싱하고, 서명된 VAPID 헤더는 푸시 서비스 origin별로 만료 직전까지 재사용한다.
+    HTTP 연결은 엔드포인트 호스트별 keep-alive 세션 풀로 재사용한다.
+    페이로드 암호화(aes128gcm)는 RFC 8291에 따라 메시지마다 새 임시 ECDH 키를 쓴다.
+    """
+
+    def __init__(self, vapid_private_key, vapid_email, pool_size=None):
+        from py_vapid import Vapid
+        self.vapid = Vapid.from_string(private_key=vapid_private_key)
+        self.vapid_sub = vapid_email if vapid_email.startswith('mailto:') else f"mailto:{vapid_email}"
+        self.pool_size = pool_size or PUSH_MAX_CONCURRENCY
+        self.lock = threading.Lock()
+        self.vapid_headers = {}  # origin -> (만료 시각, 헤더)
+        self.sessions = {}  # host -> requests.Session
+        self.stats = {'sent': 0, 'vapid_signed': 0, 'vapid_reused': 0}
+        self.host_stats = {}  # host -> {전송 결과 상태: 건수}
+
+    def _get_vapid_headers(self, origin):
+        """origin별 VAPID 헤더 (만료가 가까우면 새로 서명)"""
+        now = time.time()
+        with self.lock:
+            cached = self.vapid_headers.get(origin)
+            if cached and cached[0] - VAPID_TOKEN_REFRESH_MARGIN > now:
+                self.stats['vapid_reused'] += 1
+                return cached[1]
+
+        expires_at = int(now) + VAPID_TOKEN_LIFETIME
+        headers = self.vapid.sign({'sub': self.vapid_sub, 'aud': origin, 'exp': expires_at})
+        with self.lock:
+            self.vapid_headers[origin] = (expires_at, headers)
+            self.stats['vapid_signed'] += 1
+        return headers
+
+    def _get_session(self, host):
+        """호스트별 keep-alive 세션 (연결 풀 크기는 푸시 동시성에 맞춤)"""
+        with self.lock:
+            session = self.sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                self.sessions[host] = session
+            return session
+
+    def send(self, subscription_info, payload, ttl=PUSH_TTL, timeout=PUSH_REQUEST_TIMEOUT):
+        """푸시 메시지 전송 → requests.Response (202 초과 응답은 WebPushException)"""
+        from pywebpush import WebPusher, WebPushException
+        url = urlparse(subscription_info['endpoint'])
+        origin = f"{url.scheme}://{url.netloc}"
+
+        response = WebPusher(
+            subscription_info, requests_session=self._get_session(url.netloc)
+        ).send(
+            payload,
+            headers=dict(self._get_vapid_headers(origin)),
+            ttl=ttl,
+            timeout=timeout
         )
-        
-        print(f"✅ 푸시 알림 전송 성공! 응답 코드: {response.status_code}")
-        return True
-        
+        if response.status_code > 202:
+            raise WebPushException(
+                f"Push failed: {response.status_code} {response.reason}\nResponse body:{response.text}",
+                response=response
+            )
+        with self.lock:
+            self.stats['sent'] += 1
+        return response
+
+    def record(self, endpoint, status):
+        """엔드포인트 호스트별 전송 결과 집계"""
+        host = urlparse(endpoint).netloc
+        with self.lock:
+            counts = self.host_stats.setdefault(host, {status: 0 for status in PUSH_DELIVERY_STATUSES})
+            counts[status] += 1
+
+    def host_stats_snapshot(self):
+        with self.lock:
+            return {host: dict(counts) for host, counts in self.host_stats.items()}
+
+_push_client = None
+_push_client_lock = threading.Lock()
+
+def get_push_client():
+    """환경변수의 VAPID 키로 만든 공용 PushClient (키가 없으면 None, 키가 바뀌면 새로 생성)"""
+    global _push_client
+    vapid_email = os.getenv('VAPID_EMAIL')
+    vapid_public_key = os.getenv('VAPID_PUBLIC_KEY')
+    vapid_private_key = os.getenv('VAPID_PRIVATE_KEY')
+    if not all([vapid_email, vapid_public_key, vapid_private_key]):
+        return None
+
+    with _push_client_lock:
+        key = (vapid_private_key, vapid_email)
+        if _push_client is None or _push_client[0] != key:
+            _push_client = (key, PushClient(vapid_private_key, vapid_email))
+        return _push_client[1]
+
+def parse_retry_after(value):
+    """Retry-After 헤더 (초 또는 HTTP 날짜) → 대기 초 (해석 불가 시 None)"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max(0.0, retry_at.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def classify_push_error(error):
+    """푸시 전송 예외 분류 → (상태, 재시도 대기 초)"""
+    response = getattr(error, 'response', None)
+    if response is None:
+        # 응답 없이 실패한 네트워크 오류는 일시적 오류로 보고 재시도
+        if isinstance(error, requests.RequestException):
+            return 'transient', None
+        return 'failed', None
+
+    status_code = response.status_code
+    if status_code in (404, 410):
+        return 'gone', None
+    if status_code == 429:
+        return 'rate_limited', parse_retry_after(response.headers.get('Retry-After'))
+    if status_code >= 500:
+        return 'transient', parse_retry_after(response.headers.get('Retry-After'))
+    return 'failed', None
+
+def build_push_payload(title, body, data=None):
+    """알림 페이로드(JSON 문자열) 생성"""
+    APP_URL = os.getenv('APP_URL', 'https://love-code-eta.vercel.app/')
+    return json.dumps({
+        "title": title,
+        "body": body,
+        "icon": f"{APP_URL}/static/img/LOVECODE_ICON.png",
+        "badge": f"{APP_URL}/static/img/LOVECODE_ICON.png",
+        "data": data or {},
+        "requireInteraction": True,
+        "tag": "match-notification"
+    })
+
+def deliver_push_notification(subscription_info, payload):
+    """푸시 1건 전송 후 결과 분류 → (상태, 재시도 대기 초)"""
+    push_client = get_push_client()
+    if push_client is None:
+        return 'failed', None
+
+    try:
+        push_client.send(subscription_info, payload)
+        status, retry_after = 'sent', None
     except Exception as e:
-        print(f"❌ 푸시 알림 전송 중 오류: {e}")
-        print(f"오류 타입: {type(e).__name__}")
-        import traceback
-        traceback.print_exc()
+        status, retry_after = classify_push_error(e)
+        print(f"⚠️ 푸시 전송 실패 ({status}): {subscription_info.get('endpoint', '')[:50]}... {str(e).splitlines()[0]}")
+    push_client.record(subscription_info.get('endpoint', ''), status)
+    return status, retry_after
+
+def send_push_notification(subscription_info, title, body, data=None):
+    """푸시 알림 전송 - Python pywebpush 라이브러리 사용"""
+    print(f"🔔 푸시 알림 전송 시도: {title}")
+    print(f"📄 Body: {body}")
+
+    if get_push_client() is None:
+        print("❌ VAPID 키가 설정되지 않았습니다.")
+        print(f"Email: {bool(os.getenv('VAPID_EMAIL'))}, Public: {bool(os.getenv('VAPID_PUBLIC_KEY'))}, Private: {bool(os.getenv('VAPID_PRIVATE_KEY'))}")
         return False
 
+    # 구독 정보 검증
+    endpoint = subscription_info.get('endpoint', '')
+    p256dh = subscription_info.get('keys', {}).get('p256dh', '')
+    auth = subscription_info.get('keys', {}).get('auth', '')
+
+    if not all([endpoint, p256dh, auth]):
+        print("❌ 구독 정보가 불완전합니다")
+        print(f"Endpoint: {bool(endpoint)}, p256dh: {bool(p256dh)}, auth: {bool(auth)}")
+        return False
+
+    print(f"📤 푸시 알림 전송 시도: {endpoint[:50]}...")
+    status, _ = deliver_push_notification(subscription_info, build_push_payload(title, body, data))
+    if status == 'sent':
+        print("✅ 푸시 알림 전송 성공!")
+    return status == 'sent'
+
 def save_push_subscription(device_token, subscription_data, user_id=None):
     """푸시 구독 정보 저장"""
     try:
@@ -987,107 +2108,595 @@ def get_push_subscription(device_token):
         print(f"❌ 푸시 구독 조회 실패: {e}")
         return None
 
-def send_matching_notification(user_id):
-    """매칭 완료 알림 전송"""
-    try:
-        print(f"🔔 사용자 {user_id}에게 매칭 알림 전송 시도")
+# 한 번의 in_ 조회에 포함할 최대 ID 수 (URL 길이 제한)
+SUPABASE_IN_FILTER_CHUNK = 300
 
-        # 사용자의 푸시 구독 정보 조회
-        subscriptions = supabase.table('push_subscriptions').select('*').eq('user_id', user_id).execute()
-        print(f"📊 조회된 구독 정보: {len(subscriptions.data) if subscriptions.data else 0}개")
+def delete_push_subscriptions(device_tokens):
+    """만료된(404/410) 푸시 구독을 in_ 필터로 일괄 삭제 → 삭제 요청한 수"""
+    device_tokens = list(dict.fromkeys(device_tokens))
+    deleted_count = 0
+    for start in range(0, len(device_tokens), SUPABASE_IN_FILTER_CHUNK):
+        chunk = device_tokens[start:start + SUPABASE_IN_FILTER_CHUNK]
+        try:
+            supabase.table('push_subscriptions').delete().in_('device_token', chunk).execute()
+            deleted_count += len(chunk)
+        except Exception as e:
+            print(f"⚠️ 만료된 푸시 구독 삭제 실패 ({len(chunk)}개): {e}")
+    if deleted_count:
+        print(f"🧹 만료된 푸시 구독 {deleted_count}개 삭제")
+    return deleted_count
+
+def fetch_users_by_ids(user_ids, columns='id, name, mbti, instagram_id'):
+    """여러 사용자 정보를 in_ 필터로 일괄 조회 → {id: row}"""
+    user_ids = list(user_ids)
+    users_by_id = {}
+    for start in range(0, len(user_ids), SUPABASE_IN_FILTER_CHUNK):
+        chunk = user_ids[start:start + SUPABASE_IN_FILTER_CHUNK]
+        response = supabase.table('results').select(columns).in_('id', chunk).execute()
+        users_by_id.update((row['id'], row) for row in response.data or [])
+    return users_by_id
+
+# 매칭 결과 일괄 저장 시 한 번의 upsert 요청에 담을 최대 행 수
+MATCHES_UPSERT_CHUNK = int(os.getenv('MATCHES_UPSERT_CHUNK', '500'))
+
+def upsert_matches_bulk(match_rows):
+    """매칭 결과를 청크 단위로 일괄 upsert → (저장된 행 수, 실패한 청크 목록)
+
+    is_provisional을 지정하지 않은 행은 확정 매칭으로 저장 (같은 쌍의 임시 매칭을 덮어씀)
+    """
+    saved_count = 0
+    failed_chunks = []
+    for start in range(0, len(match_rows), MATCHES_UPSERT_CHUNK):
+        chunk = [{'is_provisional': False, **row} for row in match_rows[start:start + MATCHES_UPSERT_CHUNK]]
+        try:
+            supabase.table('matches').upsert(chunk, on_conflict='user1_id,user2_id').execute()
+            saved_count += len(chunk)
+        except Exception as e:
+            print(f"⚠️ 매칭 저장 실패 (청크 {start}~{start + len(chunk) - 1}, {len(chunk)}개): {e}")
+            failed_chunks.append({
+                'offset': start,
+                'size': len(chunk),
+                'pairs': [[row['user1_id'], row['user2_id']] for row in chunk],
+                'error': str(e)
+            })
+    return saved_count, failed_chunks
+
+def mark_users_matched(user_ids):
+    """여러 사용자의 is_matched를 in_ 필터로 한 번에 TRUE로 변경 → (변경된 수, 실패한 ID 목록)"""
+    user_ids = list(user_ids)
+    updated_count = 0
+    failed_ids = []
+    for start in range(0, len(user_ids), SUPABASE_IN_FILTER_CHUNK):
+        chunk = user_ids[start:start + SUPABASE_IN_FILTER_CHUNK]
+        try:
+            supabase.table('results').update({'is_matched': True}).in_('id', chunk).execute()
+            updated_count += len(chunk)
+        except Exception as e:
+            print(f"⚠️ is_matched 업데이트 실패 ({len(chunk)}명): {e}")
+            failed_ids.extend(chunk)
+    return updated_count, failed_ids
+
+# 한 번의 조회로 가져올 최대 행 수 (PostgREST 기본 max-rows)
+SUPABASE_PAGE_SIZE = 1000
+# 푸시 전송 동시성 및 알림 기록 일괄 insert 크기
+PUSH_MAX_CONCURRENCY = int(os.getenv('PUSH_MAX_CONCURRENCY', '16'))
+NOTIFICATION_INSERT_CHUNK = 500
+
+push_executor = ThreadPoolExecutor(max_workers=PUSH_MAX_CONCURRENCY, thread_name_prefix='push')
+
+# 429/5xx 푸시 재시도 설정
+PUSH_RETRY_MAX_ATTEMPTS = int(os.getenv('PUSH_RETRY_MAX_ATTEMPTS', '5'))
+PUSH_RETRY_BASE_DELAY = float(os.getenv('PUSH_RETRY_BASE_DELAY', '30'))  # 초, 시도마다 2배
+PUSH_RETRY_MAX_DELAY = 3600.0
+PUSH_RETRY_BATCH = 200  # 한 번에 꺼내 재전송할 최대 건수
+PUSH_RETRY_LEASE = 300.0  # 꺼낸 항목이 처리 중 유실되면 이 시간 뒤 다시 꺼냄
+
+class PushRetryQueue:
+    """SQLite에 저장되는 푸시 재시도 큐 (프로세스가 재시작되어도 유지)"""
+
+    def __init__(self, db_path, table='push_retries'):
+        self.db_path = db_path
+        self.table = table
+        self.local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = open_sqlite_connection(self.db_path)
+            conn.execute(f'''
+                CREATE TABLE IF NOT EXISTS {self.table} (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    job TEXT NOT NULL,
+                    attempts INTEGER NOT NULL,
+                    next_attempt_at REAL NOT NULL
+                )
+            ''')
+            conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{self.table}_next_attempt_at ON {self.table}(next_attempt_at)')
+            self.local.conn = conn
+        return conn
+
+    def push_many(self, entries):
+        """[(작업, 시도 횟수, 대기 초), ...] 일괄 추가"""
+        if not entries:
+            return
+        now = time.time()
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany(
+                f'INSERT INTO {self.table} (job, attempts, next_attempt_at) VALUES (?, ?, ?)',
+                [(json.dumps(job, ensure_ascii=False), attempts, now + delay) for job, attempts, delay in entries]
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def claim_due(self, limit):
+        """재시도 시각이 된 항목을 임대(lease)하여 꺼냄 → [(id, 작업, 시도 횟수), ...]"""
+        now = time.time()
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            rows = conn.execute(
+                f'SELECT id, job, attempts FROM {self.table} WHERE next_attempt_at <= ? ORDER BY next_attempt_at LIMIT ?',
+                (now, limit)
+            ).fetchall()
+            conn.executemany(
+                f'UPDATE {self.table} SET next_attempt_at = ? WHERE id = ?',
+                [(now + PUSH_RETRY_LEASE, row_id) for row_id, _, _ in rows]
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return [(row_id, json.loads(job), attempts) for row_id, job, attempts in rows]
+
+    def complete(self, ids):
+        """처리가 끝난 항목 삭제"""
+        ids = list(ids)
+        conn = self._connection()
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            conn.execute(f'DELETE FROM {self.table} WHERE id IN ({",".join("?" * len(chunk))})', chunk)
+
+    def next_due_at(self):
+        """가장 빠른 재시도 시각 (비어 있으면 None)"""
+        return self._connection().execute(f'SELECT MIN(next_attempt_at) FROM {self.table}').fetchone()[0]
+
+    def __len__(self):
+        try:
+            return self._connection().execute(f'SELECT COUNT(*) FROM {self.table}').fetchone()[0]
+        except Exception:
+            return 0
+
+push_retry_queue = PushRetryQueue(CACHE_DB_FILE)
+
+def get_push_retry_delay(attempts, retry_after=None):
+    """재시도 대기 시간 (Retry-After 우선, 없으면 지수 백오프)"""
+    backoff = min(PUSH_RETRY_BASE_DELAY * (2 ** attempts), PUSH_RETRY_MAX_DELAY)
+    return max(retry_after, 1.0) if retry_after is not None else backoff
+
+def deliver_push_jobs(jobs):
+    """푸시 작업들을 동시에 전송하고 결과에 따라 후처리 → 작업별 상태 목록
+
+    작업은 {'user_id', 'device_token', 'subscription', 'payload', 'history', 'attempts'} 형태이고,
+    만료된 구독은 일괄 삭제, 429/5xx는 재시도 큐에 저장, 성공한 알림의 기록(history)은 일괄 insert한다.
+    """
+    futures = [
+        push_executor.submit(deliver_push_notification, job['subscription'], job['payload'])
+        for job in jobs
+    ]
 
-        if not subscriptions.data:
-            print(f"⚠️ 사용자 {user_id}의 푸시 구독 정보가 없습니다.")
-            return False
+    statuses = []
+    gone_tokens = []
+    retry_entries = []
+    notification_rows = []
+    for job, future in zip(jobs, futures):
+        try:
+            status, retry_after = future.result()
+        except Exception as e:
+            print(f"❌ 사용자 {job['user_id']} 알림 전송 중 오류: {e}")
+            status, retry_after = 'failed', None
+        statuses.append(status)
+
+        if status == 'sent':
+            if job.get('history'):
+                notification_rows.append(job['history'])
+        elif status == 'gone':
+            gone_tokens.append(job['device_token'])
+        elif status in ('rate_limited', 'transient'):
+            attempts = job.get('attempts', 0)
+            if attempts + 1 < PUSH_RETRY_MAX_ATTEMPTS:
+                retry_entries.append((dict(job, attempts=attempts + 1), attempts + 1, get_push_retry_delay(attempts, retry_after)))
+            else:
+                print(f"⚠️ 재시도 한도 초과로 알림 포기: 사용자 {job['user_id']}")
 
-        # 매칭 결과 조회
-        matches = supabase.table('matches').select('*').or_(
-            f'user1_id.eq.{user_id},user2_id.eq.{user_id}'
-        ).order('compatibility_score', desc=True).limit(5).execute()
-        print(f"📊 매칭 결과: {len(matches.data) if matches.data else 0}개")
+    if gone_tokens:
+        delete_push_subscriptions(gone_tokens)
 
-        if not matches.data:
-            print(f"⚠️ 사용자 {user_id}의 매칭 결과가 없습니다. 대기 알림을 전송합니다.")
-            
-            # 매칭 결과가 없을 때는 대기 알림 전송
-            title = "⏳ 매칭 진행 중입니다"
-            body = "아직 매칭이 완료되지 않았어요. 조금 더 기다려주세요!"
-            
-            success_count = 0
-            for i, subscription in enumerate(subscriptions.data):
-                subscription_info = {
-                    'endpoint': subscription['endpoint'],
-                    'keys': {
-                        'p256dh': subscription['p256dh'],
-                        'auth': subscription['auth']
-                    }
-                }
-                
-                try:
-                    result = send_push_notification(
-                        subscription_info,
-                        title,
-                        body,
-                        data={'action': 'view_home', 'user_id': user_id}
-                    )
-                    
-                    if result:
-                        success_count += 1
-                        print(f"✅ 대기 알림 {i+1}번 전송 성공")
-                except Exception as sub_error:
-                    print(f"❌ 대기 알림 {i+1}번 전송 중 오류: {sub_error}")
-            
-            return success_count > 0
+    if retry_entries:
+        try:
+            push_retry_queue.push_many(retry_entries)
+            print(f"🔁 푸시 재시도 예약: {len(retry_entries)}건")
+            ensure_push_retry_worker()
+        except Exception as e:
+            print(f"⚠️ 푸시 재시도 큐 저장 실패: {e}")
 
-        # 알림 전송
-        title = "🎉 사주 매칭이 완료되었습니다!"
-        body = f"총 {len(matches.data)}명의 매칭 상대를 찾았어요. 확인해보세요!"
+    # 알림 기록 일괄 저장
+    for start in range(0, len(notification_rows), NOTIFICATION_INSERT_CHUNK):
+        chunk = notification_rows[start:start + NOTIFICATION_INSERT_CHUNK]
+        try:
+            supabase.table('user_notifications').insert(chunk).execute()
+        except Exception as e:
+            print(f"⚠️ 알림 기록 저장 실패 ({len(chunk)}건): {e}")
 
-        success_count = 0
-        for i, subscription in enumerate(subscriptions.data):
-            print(f"📤 구독 {i+1}번 전송 시도: {subscription['device_token'][:8]}...")
+    return statuses
 
-            subscription_info = {
-                'endpoint': subscription['endpoint'],
-                'keys': {
-                    'p256dh': subscription['p256dh'],
-                    'auth': subscription['auth']
-                }
-            }
+def process_push_retries(limit=PUSH_RETRY_BATCH):
+    """재시도 시각이 된 푸시를 다시 전송 → 처리한 건수"""
+    claimed = push_retry_queue.claim_due(limit)
+    if not claimed:
+        return 0
 
-            try:
-                result = send_push_notification(
-                    subscription_info,
-                    title,
-                    body,
-                    data={'action': 'view_matches', 'user_id': user_id}
-                )
+    print(f"🔁 푸시 재시도 {len(claimed)}건 전송")
+    # 다시 실패한 작업은 deliver_push_jobs가 새 항목으로 다시 넣으므로 꺼낸 항목은 모두 삭제
+    deliver_push_jobs([job for _, job, _ in claimed])
+    push_retry_queue.complete(row_id for row_id, _, _ in claimed)
+    return len(claimed)
+
+_push_retry_worker = None
+_push_retry_worker_lock = threading.Lock()
+
+def _push_retry_worker_loop():
+    """재시도 큐가 빌 때까지 재시도 시각에 맞춰 처리"""
+    while True:
+        try:
+            process_push_retries()
+            next_due_at = push_retry_queue.next_due_at()
+        except Exception as e:
+            print(f"⚠️ 푸시 재시도 처리 오류: {e}")
+            next_due_at = time.time() + PUSH_RETRY_BASE_DELAY
+        if next_due_at is None:
+            return
+        time.sleep(min(max(next_due_at - time.time(), 0.5), PUSH_RETRY_BASE_DELAY))
+
+def ensure_push_retry_worker():
+    """재시도 워커 스레드가 없으면 시작"""
+    global _push_retry_worker
+    with _push_retry_worker_lock:
+        if _push_retry_worker is None or not _push_retry_worker.is_alive():
+            _push_retry_worker = threading.Thread(target=_push_retry_worker_loop, name='push-retry', daemon=True)
+            _push_retry_worker.start()
+
+def fetch_push_subscriptions(user_ids):
+    """여러 사용자의 푸시 구독 정보를 in_ 필터로 일괄 조회 → {user_id: [구독, ...]}"""
+    user_ids = list(user_ids)
+    subscriptions_by_user = {}
+    for start in range(0, len(user_ids), SUPABASE_IN_FILTER_CHUNK):
+        chunk = user_ids[start:start + SUPABASE_IN_FILTER_CHUNK]
+        response = supabase.table('push_subscriptions').select('*').in_('user_id', chunk).execute()
+        for subscription in response.data or []:
+            subscriptions_by_user.setdefault(subscription['user_id'], []).append(subscription)
+    return subscriptions_by_user
+
+def fetch_match_counts(user_ids):
+    """여러 사용자의 매칭 수를 한 번에 집계 → {user_id: 매칭 수}"""
+    user_ids = list(user_ids)
+    match_counts = {user_id: 0 for user_id in user_ids}
+    for start in range(0, len(user_ids), SUPABASE_IN_FILTER_CHUNK):
+        chunk = user_ids[start:start + SUPABASE_IN_FILTER_CHUNK]
+        chunk_ids = set(chunk)
+        id_list = ','.join(str(user_id) for user_id in chunk)
+        offset = 0
+        while True:
+            response = supabase.table('matches').select('id, user1_id, user2_id').or_(
+                f'user1_id.in.({id_list}),user2_id.in.({id_list})'
+            ).order('id').range(offset, offset + SUPABASE_PAGE_SIZE - 1).execute()
+            rows = response.data or []
+            for match in rows:
+                # 다른 청크의 사용자는 그 청크 조회에서 집계 (중복 집계 방지)
+                for user_id in (match['user1_id'], match['user2_id']):
+                    if user_id in chunk_ids:
+                        match_counts[user_id] += 1
+            if len(rows) < SUPABASE_PAGE_SIZE:
+                break
+            offset += SUPABASE_PAGE_SIZE
+    return match_counts
+
+def send_matching_notifications_bulk(user_ids):
+    """여러 사용자에게 매칭 완료 알림 일괄 전송 → {user_id: 성공 여부}
 
-                if result:
-                    success_count += 1
-                    print(f"✅ 구독 {i+1}번 전송 성공")
+    구독 정보와 매칭 수를 한꺼번에 조회하고, 푸시는 push_executor로 동시에 보낸 뒤
+    알림 기록은 한 번의 insert로 저장한다.
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    results = {user_id: False for user_id in user_ids}
+    if not user_ids:
+        return results
 
-                    # 알림 기록 저장
-                    supabase.table('user_notifications').insert({
+    try:
+        print(f"🔔 사용자 {len(user_ids)}명에게 매칭 알림 일괄 전송 시도")
+
+        subscriptions_by_user = fetch_push_subscriptions(user_ids)
+        subscribed_ids = [user_id for user_id in user_ids if user_id in subscriptions_by_user]
+        print(f"📊 구독 정보가 있는 사용자: {len(subscribed_ids)}/{len(user_ids)}명")
+        if not subscribed_ids:
+            return results
+
+        match_counts = fetch_match_counts(subscribed_ids)
+
+        # 구독 단위로 전송 작업 구성
+        jobs = []
+        for user_id in subscribed_ids:
+            # 기존 단건 알림과 같이 점수 상위 5명까지만 안내
+            match_count = min(match_counts.get(user_id, 0), 5)
+            if match_count:
+                title = "🎉 사주 매칭이 완료되었습니다!"
+                body = f"총 {match_count}명의 매칭 상대를 찾았어요. 확인해보세요!"
+                data = {'action': 'view_matches', 'user_id': user_id}
+            else:
+                # 매칭 결과가 없을 때는 대기 알림 전송
+                title = "⏳ 매칭 진행 중입니다"
+                body = "아직 매칭이 완료되지 않았어요. 조금 더 기다려주세요!"
+                data = {'action': 'view_home', 'user_id': user_id}
+            payload = build_push_payload(title, body, data)
+
+            for subscription in subscriptions_by_user[user_id]:
+                jobs.append({
+                    'user_id': user_id,
+                    'device_token': subscription['device_token'],
+                    'subscription': {
+                        'endpoint': subscription['endpoint'],
+                        'keys': {
+                            'p256dh': subscription['p256dh'],
+                            'auth': subscription['auth']
+                        }
+                    },
+                    'payload': payload,
+                    # 매칭 완료 알림만 기록 저장
+                    'history': {
                         'device_token': subscription['device_token'],
                         'title': title,
                         'body': body,
-                        'data': json.dumps({'action': 'view_matches', 'user_id': user_id})
-                    }).execute()
-                else:
-                    print(f"❌ 구독 {i+1}번 전송 실패")
+                        'data': json.dumps(data)
+                    } if match_count else None,
+                    'attempts': 0
+                })
 
-            except Exception as sub_error:
-                print(f"❌ 구독 {i+1}번 전송 중 오류: {sub_error}")
+        statuses = deliver_push_jobs(jobs)
+        sent_count = 0
+        for job, status in zip(jobs, statuses):
+            if status == 'sent':
+                sent_count += 1
+                results[job['user_id']] = True
 
-        print(f"🎯 최종 결과: 사용자 {user_id}에게 {success_count}/{len(subscriptions.data)}개의 푸시 알림 전송 성공")
-        return success_count > 0
+        print(f"🎯 최종 결과: {sent_count}/{len(jobs)}개의 푸시 알림 전송 성공 "
+              f"(사용자 {sum(results.values())}/{len(user_ids)}명)")
+        return results
 
     except Exception as e:
-        print(f"❌ 매칭 알림 전송 실패: {e}")
+        print(f"❌ 매칭 알림 일괄 전송 실패: {e}")
         import traceback
         print(f"❌ 상세 오류: {traceback.format_exc()}")
-        return False
+        return results
+
+def send_matching_notification(user_id):
+    """매칭 완료 알림 전송 (단일 사용자)"""
+    return send_matching_notifications_bulk([user_id])[user_id]
+
+# 매칭 알림 백그라운드 전송 설정
+NOTIFICATION_WORKERS = int(os.getenv('NOTIFICATION_WORKERS', '2'))
+NOTIFICATION_BATCH_SIZE = int(os.getenv('NOTIFICATION_BATCH_SIZE', '100'))  # 워커가 한 번에 처리할 사용자 수
+NOTIFICATION_THROUGHPUT_WINDOW = 60  # 처리량 계산 구간 (초)
+# 아웃박스 항목 임대 시간 (초). 이 시간 안에 전송 결과가 기록되지 않으면 프로세스가 죽은 것으로 보고 다시 큐에 넣음
+NOTIFICATION_OUTBOX_LEASE = float(os.getenv('NOTIFICATION_OUTBOX_LEASE', '600'))
+
+class NotificationOutbox:
+    """SQLite에 저장되는 전송 대기 알림 목록 (메모리 큐에 넣기 전에 기록하고 전송 결과가 나온 뒤 삭제)"""
+
+    def __init__(self, db_path, table='notification_outbox'):
+        self.db_path = db_path
+        self.table = table
+        self.local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = open_sqlite_connection(self.db_path)
+            conn.execute(f'''
+                CREATE TABLE IF NOT EXISTS {self.table} (
+                    user_id TEXT PRIMARY KEY,
+                    claimed_until REAL NOT NULL
+                )
+            ''')
+            conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{self.table}_claimed_until ON {self.table}(claimed_until)')
+            self.local.conn = conn
+        return conn
+
+    def add_many(self, user_ids):
+        """사용자들을 전송 대기로 기록 (이미 있으면 임대만 갱신)"""
+        claimed_until = time.time() + NOTIFICATION_OUTBOX_LEASE
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany(
+                f'INSERT OR REPLACE INTO {self.table} (user_id, claimed_until) VALUES (?, ?)',
+                [(json.dumps(user_id), claimed_until) for user_id in user_ids]
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def claim_expired(self, limit=1000):
+        """임대가 끝난(전송 결과 없이 남은) 사용자를 다시 임대하여 꺼냄 → [user_id, ...]"""
+        now = time.time()
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            rows = conn.execute(
+                f'SELECT user_id FROM {self.table} WHERE claimed_until <= ? ORDER BY claimed_until LIMIT ?',
+                (now, limit)
+            ).fetchall()
+            conn.executemany(
+                f'UPDATE {self.table} SET claimed_until = ? WHERE user_id = ?',
+                [(now + NOTIFICATION_OUTBOX_LEASE, user_id) for user_id, in rows]
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return [json.loads(user_id) for user_id, in rows]
+
+    def complete(self, user_ids):
+        """전송 결과가 나온 사용자 삭제"""
+        keys = [json.dumps(user_id) for user_id in user_ids]
+        conn = self._connection()
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            conn.execute(f'DELETE FROM {self.table} WHERE user_id IN ({",".join("?" * len(chunk))})', chunk)
+
+    def __len__(self):
+        try:
+            return self._connection().execute(f'SELECT COUNT(*) FROM {self.table}').fetchone()[0]
+        except Exception:
+            return 0
+
+notification_outbox = NotificationOutbox(CACHE_DB_FILE)
+
+class NotificationDispatcher:
+    """매칭 알림 큐 + 푸시 워커 풀 (매칭 요청은 큐에 넣기만 하고 즉시 반환)
+
+    워커는 큐에서 최대 batch_size명씩 꺼내 send_fn(user_ids) → {user_id: 성공 여부}로 일괄 전송한다.
+    큐에 넣기 전에 outbox에 기록하고 send_fn이 결과를 돌려준 뒤에만 지우므로,
+    전송 전에 프로세스가 죽어도 recover()가 임대가 끝난 항목을 다시 큐에 넣는다.
+    """
+
+    def __init__(self, max_workers, batch_size, send_fn, outbox):
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self.send_fn = send_fn
+        self.outbox = outbox
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.pending = set()  # 큐에 있거나 전송 중인 사용자 (중복 알림 방지)
+        self.workers = []
+        self.in_flight = 0
+        self.completed_at = deque()  # 최근 처리 완료 시각 (처리량 계산용)
+        self.stats = {'enqueued': 0, 'sent': 0, 'failed': 0, 'skipped_duplicates': 0, 'recovered': 0}
+
+    def _ensure_workers(self):
+        """워커 스레드를 처음 사용할 때 시작 (죽은 워커는 다시 띄움)"""
+        self.workers = [worker for worker in self.workers if worker.is_alive()]
+        while len(self.workers) < self.max_workers:
+            worker = threading.Thread(
+                target=self._worker_loop,
+                name=f'notification-{len(self.workers)}',
+                daemon=True
+            )
+            worker.start()
+            self.workers.append(worker)
+
+    def enqueue(self, user_ids):
+        """사용자들의 매칭 알림을 outbox에 기록한 뒤 큐에 추가 → 새로 추가된 수
+
+        outbox 기록에 실패하면 예외를 그대로 올려 호출한 쪽이 전송 완료로 표시하지 않게 한다.
+        """
+        with self.lock:
+            new_ids = []
+            for user_id in dict.fromkeys(user_ids):
+                if user_id in self.pending:
+                    self.stats['skipped_duplicates'] += 1
+                    continue
+                new_ids.append(user_id)
+            if new_ids:
+                self.outbox.add_many(new_ids)
+            added = self._put(new_ids)
+            self.stats['enqueued'] += added
+        # 이전 프로세스에서 남은 알림과 재시도 항목도 함께 처리
+        if added:
+            self.recover()
+            if len(push_retry_queue):
+                ensure_push_retry_worker()
+        return added
+
+    def _put(self, user_ids):
+        """(lock 안에서) 메모리 큐에 추가하고 워커 시작 → 추가한 수"""
+        for user_id in user_ids:
+            self.pending.add(user_id)
+            self.queue.put(user_id)
+        if user_ids:
+            self._ensure_workers()
+        return len(user_ids)
+
+    def recover(self):
+        """outbox에서 임대가 끝난(이전 프로세스가 전송하지 못한) 알림을 다시 큐에 넣음 → 다시 넣은 수"""
+        try:
+            user_ids = self.outbox.claim_expired()
+        except Exception as e:
+            print(f"⚠️ 알림 아웃박스 조회 실패: {e}")
+            return 0
+        with self.lock:
+            recovered = self._put([user_id for user_id in user_ids if user_id not in self.pending])
+            self.stats['recovered'] += recovered
+        if recovered:
+            print(f"🔁 전송되지 않은 매칭 알림 {recovered}건 다시 대기열에 추가")
+        return recovered
+
+    def _next_batch(self):
+        """큐에서 한 명은 기다려서, 나머지는 기다리지 않고 batch_size명까지 꺼냄"""
+        batch = [self.queue.get()]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _worker_loop(self):
+        while True:
+            batch = self._next_batch()
+            with self.lock:
+                self.in_flight += len(batch)
+            try:
+                results = self.send_fn(batch)
+            except Exception as e:
+                # outbox에 남겨 두어 임대가 끝난 뒤 recover()가 다시 전송
+                print(f"❌ 알림 워커 오류 ({len(batch)}명): {e}")
+                results = None
+            else:
+                try:
+                    self.outbox.complete(batch)
+                except Exception as e:
+                    print(f"⚠️ 알림 아웃박스 정리 실패 ({len(batch)}명): {e}")
+            results = results or {}
+            with self.lock:
+                self.in_flight -= len(batch)
+                now = time.time()
+                for user_id in batch:
+                    self.pending.discard(user_id)
+                    self.stats['sent' if results.get(user_id) else 'failed'] += 1
+                    self.completed_at.append(now)
+            for _ in batch:
+                self.queue.task_done()
+
+    def snapshot(self):
+        """큐 깊이와 처리량 등 현재 상태"""
+        with self.lock:
+            cutoff = time.time() - NOTIFICATION_THROUGHPUT_WINDOW
+            while self.completed_at and self.completed_at[0] < cutoff:
+                self.completed_at.popleft()
+            return {
+                'queue_depth': self.queue.qsize(),
+                'in_flight': self.in_flight,
+                'workers': sum(1 for worker in self.workers if worker.is_alive()),
+                'throughput_per_minute': len(self.completed_at) * 60 / NOTIFICATION_THROUGHPUT_WINDOW,
+                'outbox': len(self.outbox),
+                **self.stats
+            }
+
+notification_dispatcher = NotificationDispatcher(NOTIFICATION_WORKERS, NOTIFICATION_BATCH_SIZE, send_matching_notifications_bulk, notification_outbox)
 
 @app.route('/')
 def index():
@@ -1244,6 +2853,23 @@ def check_api_quota():
             'message': '할당량 확인 중 오류가 발생했습니다.'
         }), 500
 
+@app.route('/admin/notifications/status')
+def notification_status():
+    """매칭 알림 전송 큐 상태 (대기 중인 알림 수, 처리량)"""
+    if not session.get('logged_in'):
+        return jsonify({'error': '로그인이 필요합니다'}), 401
+
+    push_client = get_push_client()
+    return jsonify({
+        'success': True,
+        **notification_dispatcher.snapshot(),
+        'push_retry_queue': len(push_retry_queue),
+        'push_hosts': push_client.host_stats_snapshot() if push_client else {},
+        'candidate_index': candidate_index.snapshot(),
+        'saju_element_analysis': get_saju_element_analysis_stats(),
+        'saju_analysis_cache': saju_analysis_cache.snapshot()
+    })
+
 @app.route('/admin/result/<int:result_id>')
 def get_result_detail(result_id):
     if not session.get('logged_in'):
@@ -1271,6 +2897,13 @@ def delete_result(result_id):
         response = supabase.table('results').delete().eq('id', result_id).execute()
         deleted_count = len(response.data)
 
+        # 삭제된 사용자와 매칭된 모든 사용자의 페이지가 바뀌므로 전체 무효화
+        invalidate_match_page_cache()
+        try:
+            candidate_index.remove([result_id])
+        except Exception as e:
+            print(f"⚠️ 매칭 후보 인덱스에서 삭제 실패 ({result_id}): {e}")
+
         if deleted_count > 0:
             return jsonify({'message': '결과가 성공적으로 삭제되었습니다'})
         else:
@@ -1278,170 +2911,614 @@ def delete_result(result_id):
     except Exception as e:
         return jsonify({'error': f'삭제 중 오류 발생: {e}'}), 500
 
-def perform_batch_matching(user_group_1, user_group_2, model, batch_name="", timeout_callback=None):
-    """상위 3명 제한 최적화 매칭 (룰 기반 → 상위 3명 선별 → AI 심층 분석)"""
+# --- [매칭 후보 인덱스] ---
+# 매칭 실행마다 is_matched=TRUE 사용자 전체를 Supabase에서 다시 읽지 않도록
+# 후보 프로필을 성별 및 MBTI/오행 클래스별로 SQLite에 유지하고 /saju 등록과 매칭 저장 시점에 증분 갱신
+# (Supabase의 매칭 완료 인원 수와 다르거나 동기화 주기가 지나면 전체 재동기화)
+CANDIDATE_INDEX_RESYNC_INTERVAL = float(os.getenv('CANDIDATE_INDEX_RESYNC_INTERVAL', str(24 * 3600)))  # 초
+CANDIDATE_PROFILE_COLUMNS = 'id, name, mbti, saju_result, gender'  # 매칭 계산에 필요한 컬럼만
+
+def normalize_candidate_gender(gender):
+    """인덱스 성별 키 (매칭 분류와 같이 FEMALE이 아니면 MALE로 취급)"""
+    return 'FEMALE' if isinstance(gender, str) and gender.strip() == 'FEMALE' else 'MALE'
+
+def get_candidate_class_key(user):
+    """MBTI/오행 클래스 키 (build_feature_classes와 같은 기준)"""
+    mbti = user.get('mbti')
+    mbti = mbti if isinstance(mbti, str) else repr(mbti)
+    return f"{mbti}:{encode_saju_elements(user.get('saju_result'))}"
+
+def fetch_matched_user_profiles():
+    """is_matched=TRUE 사용자 프로필 전체를 페이지 단위로 조회 (id 순)"""
+    profiles = []
+    offset = 0
+    while True:
+        response = supabase.table('results').select(CANDIDATE_PROFILE_COLUMNS).eq('is_matched', True) \
+            .order('id').range(offset, offset + SUPABASE_PAGE_SIZE - 1).execute()
+        rows = response.data or []
+        profiles.extend(rows)
+        if len(rows) < SUPABASE_PAGE_SIZE:
+            return profiles
+        offset += SUPABASE_PAGE_SIZE
+
+class CandidateIndex:
+    """SQLite에 저장되는 매칭 후보 인덱스 (사용자별 성별, 클래스 키, 매칭 여부, 프로필)"""
+
+    def __init__(self, db_path, table='candidate_index'):
+        self.db_path = db_path
+        self.table = table
+        self.local = threading.local()
+        self.sync_lock = threading.Lock()
+        self.version = 0  # 이 프로세스에서 인덱스가 바뀔 때마다 증가 (메모리 후보 풀 갱신 판단용)
+
+    def _connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = open_sqlite_connection(self.db_path)
+            conn.execute(f'''
+                CREATE TABLE IF NOT EXISTS {self.table} (
+                    user_id TEXT PRIMARY KEY,
+                    gender TEXT NOT NULL,
+                    class_key TEXT NOT NULL,
+                    is_matched INTEGER NOT NULL,
+                    profile TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            ''')
+            conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{self.table}_group ON {self.table}(is_matched, gender, class_key)')
+            conn.execute(f'CREATE TABLE IF NOT EXISTS {self.table}_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+            self.local.conn = conn
+        return conn
+
+    def _rows(self, users, is_matched, now):
+        for user in users:
+            profile = {column: user.get(column) for column in ('id', 'name', 'mbti', 'saju_result', 'gender')}
+            yield (str(user['id']), normalize_candidate_gender(user.get('gender')), get_candidate_class_key(user),
+                   int(bool(is_matched)), json.dumps(profile, ensure_ascii=False), now)
+
+    def upsert_users(self, users, is_matched):
+        """사용자 프로필을 추가/갱신 (/saju 등록 시 is_matched=False, 매칭 저장 후 True)"""
+        users = list(users)
+        if not users:
+            return
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany(
+                f'''INSERT INTO {self.table} (user_id, gender, class_key, is_matched, profile, updated_at) VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(user_id) DO UPDATE SET gender = excluded.gender, class_key = excluded.class_key,
+                        is_matched = excluded.is_matched, profile = excluded.profile, updated_at = excluded.updated_at''',
+                list(self._rows(users, is_matched, time.time()))
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        self.version += 1
+
+    def remove(self, user_ids):
+        """삭제된 사용자 제거"""
+        user_ids = [str(user_id) for user_id in user_ids]
+        conn = self._connection()
+        for start in range(0, len(user_ids), 500):
+            chunk = user_ids[start:start + 500]
+            conn.execute(f'DELETE FROM {self.table} WHERE user_id IN ({",".join("?" * len(chunk))})', chunk)
+        self.version += 1
+
+    def load_group(self, gender):
+        """성별 하나의 매칭 완료 후보 프로필 목록 (등록 순)"""
+        rows = self._connection().execute(
+            f'SELECT profile FROM {self.table} WHERE is_matched = 1 AND gender = ? ORDER BY rowid',
+            (gender,)
+        ).fetchall()
+        return [json.loads(profile) for profile, in rows]
+
+    def get_profiles(self, user_ids):
+        """ID로 매칭 완료 후보 프로필 조회 → {id: 프로필}"""
+        user_ids = [str(user_id) for user_id in user_ids]
+        conn = self._connection()
+        profiles = {}
+        for start in range(0, len(user_ids), 500):
+            chunk = user_ids[start:start + 500]
+            rows = conn.execute(
+                f'SELECT profile FROM {self.table} WHERE is_matched = 1 AND user_id IN ({",".join("?" * len(chunk))})',
+                chunk
+            ).fetchall()
+            for profile, in rows:
+                profile = json.loads(profile)
+                profiles[profile['id']] = profile
+        return profiles
+
+    def matched_count(self):
+        return self._connection().execute(f'SELECT COUNT(*) FROM {self.table} WHERE is_matched = 1').fetchone()[0]
+
+    def class_counts(self):
+        """{성별: {클래스 키: 인원}} (매칭 완료 후보만)"""
+        counts = {}
+        rows = self._connection().execute(
+            f'SELECT gender, class_key, COUNT(*) FROM {self.table} WHERE is_matched = 1 GROUP BY gender, class_key'
+        ).fetchall()
+        for gender, class_key, count in rows:
+            counts.setdefault(gender, {})[class_key] = count
+        return counts
+
+    def _get_meta(self, key):
+        row = self._connection().execute(f'SELECT value FROM {self.table}_meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        self._connection().execute(
+            f'INSERT INTO {self.table}_meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value',
+            (key, str(value))
+        )
+
+    def resync(self):
+        """Supabase의 매칭 완료 사용자 전체로 인덱스 재구성 → 후보 수"""
+        profiles = fetch_matched_user_profiles()
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute(f'DELETE FROM {self.table} WHERE is_matched = 1')
+            conn.executemany(
+                f'''INSERT INTO {self.table} (user_id, gender, class_key, is_matched, profile, updated_at) VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(user_id) DO UPDATE SET gender = excluded.gender, class_key = excluded.class_key,
+                        is_matched = excluded.is_matched, profile = excluded.profile, updated_at = excluded.updated_at''',
+                list(self._rows(profiles, True, time.time()))
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        self._set_meta('synced_at', time.time())
+        self.version += 1
+        print(f"🗂️ 매칭 후보 인덱스 재동기화: {len(profiles)}명")
+        return len(profiles)
+
+    def ensure_fresh(self):
+        """인덱스를 매칭에 써도 되는지 확인하고 필요하면 재동기화 → 'index' 또는 'resync'
+
+        Supabase에는 매칭 완료 인원 수만 묻고 (count 조회 1회), 로컬 인원 수와 다르거나
+        마지막 동기화가 CANDIDATE_INDEX_RESYNC_INTERVAL보다 오래되었으면 전체를 다시 읽는다.
+        """
+        with self.sync_lock:
+            synced_at = self._get_meta('synced_at')
+            if synced_at is None or time.time() - float(synced_at) > CANDIDATE_INDEX_RESYNC_INTERVAL:
+                self.resync()
+                return 'resync'
+            response = supabase.table('results').select('id', count='exact').eq('is_matched', True).limit(1).execute()
+            if response.count is not None and response.count != self.matched_count():
+                print(f"⚠️ 매칭 후보 인덱스 불일치 (Supabase {response.count}명, 인덱스 {self.matched_count()}명)")
+                self.resync()
+                return 'resync'
+            return 'index'
+
+    def snapshot(self):
+        try:
+            counts = self.class_counts()
+            synced_at = self._get_meta('synced_at')
+            return {
+                'candidates': {gender: sum(classes.values()) for gender, classes in counts.items()},
+                'classes': sum(len(classes) for classes in counts.values()),
+                'synced_at': datetime.fromtimestamp(float(synced_at)).isoformat() if synced_at else None
+            }
+        except Exception as e:
+            return {'error': str(e)}
+
+candidate_index = CandidateIndex(CACHE_DB_FILE)
+
+# --- [매칭 체크포인트] ---
+# 실행 상태(대상 사용자, 1단계 후보, 완료된 AI 분석 결과, 저장/알림 단계)를 Supabase에 저장하여
+# 시간 예산을 넘긴 실행을 이어받기 토큰으로 여러 번의 짧은 호출에 나눠 이어서 실행
+MATCHING_TIME_BUDGET = float(os.getenv('MATCHING_TIME_BUDGET', '600'))  # 호출 1회당 시간 예산 (초)
+MATCHING_CHECKPOINT_SAVE_INTERVAL = float(os.getenv('MATCHING_CHECKPOINT_SAVE_INTERVAL', '20'))  # 2단계 중간 저장 간격 (초)
+MATCHING_TIMEOUT_GRACE = float(os.getenv('MATCHING_TIMEOUT_GRACE', '3'))  # 시간 예산 초과 후 실행 중인 AI 분석을 기다리는 시간 (초)
+
+class MatchingCheckpoint:
+    """matching_checkpoints 테이블의 한 행으로 저장되는 매칭 실행 상태 (id가 이어받기 토큰)"""
+
+    def __init__(self, token=None, state=None, status='running'):
+        self.token = token or uuid.uuid4().hex
+        self.state = state or {'batches': {}}
+        self.status = status
+        self.last_saved_at = 0.0
+        self.lock = threading.RLock()  # 여러 배치가 동시에 상태를 갱신/저장하므로 보호
+
+    @classmethod
+    def load(cls, token):
+        """이어받기 토큰으로 체크포인트 조회 (없으면 None)"""
+        response = supabase.table('matching_checkpoints').select('*').eq('id', token).execute()
+        if not response.data:
+            return None
+        row = response.data[0]
+        state = row['state'] if isinstance(row['state'], dict) else json.loads(row['state'])
+        return cls(row['id'], state, row.get('status', 'running'))
+
+    def record_ai_responses(self, user_pairs):
+        """분석이 끝난 쌍들의 MBTI 쌍 AI 응답을 함께 저장 (다른 인스턴스에서 이어받아도 재사용)"""
+        with self.lock:
+            ai_responses = self.state.setdefault('ai_responses', {})
+            for user1, user2 in user_pairs:
+                key = get_ai_response_cache_key(user1['mbti'], user2['mbti'])
+                if key in ai_responses:
+                    continue
+                entry = ai_response_cache.get(_versioned_ai_response_key(user1['mbti'], user2['mbti']), touch=False)
+                if entry:
+                    ai_responses[key] = [entry['score'], entry['reason']]
+
+    def restore_ai_responses(self):
+        """저장된 AI 응답을 응답 캐시에 채움 (같은 프롬프트 버전일 때만)"""
+        if self.state.get('ai_prompt_version') != AI_PROMPT_VERSION:
+            return
+        for key, (ai_score, reason) in self.state.get('ai_responses', {}).items():
+            mbti1, mbti2 = key.split('|')
+            if not has_cached_ai_response(mbti1, mbti2):
+                save_ai_response_to_cache(mbti1, mbti2, ai_score, reason)
+
+    def batch(self, batch_name):
+        """배치별 상태 {'candidates': [[user1_id, user2_id, 룰 점수], ...], 'results': {쌍 번호: [점수, 이유]}}"""
+        with self.lock:
+            return self.state['batches'].setdefault(batch_name, {})
+
+    def save(self):
+        with self.lock:
+            state = json.loads(json.dumps(self.state))  # 저장하는 동안 다른 배치가 바꾸지 않도록 복사본 사용
+        try:
+            supabase.table('matching_checkpoints').upsert({
+                'id': self.token,
+                'state': state,
+                'status': self.status,
+                'updated_at': datetime.now().isoformat()
+            }, on_conflict='id').execute()
+            self.last_saved_at = time.time()
+        except Exception as e:
+            print(f"⚠️ 매칭 체크포인트 저장 실패 ({self.token}): {e}")
+
+    def maybe_save(self):
+        """마지막 저장 후 저장 간격이 지났으면 저장"""
+        if time.time() - self.last_saved_at >= MATCHING_CHECKPOINT_SAVE_INTERVAL:
+            self.save()
+
+    def complete(self):
+        self.status = 'completed'
+        self.save()
+
+def perform_batch_matching(user_group_1, user_group_2, model, batch_name="", timeout_callback=None, progress_callback=None, checkpoint=None):
+    """상위 3명 제한 최적화 매칭 (룰 기반 → 상위 3명 선별 → AI 심층 분석)
+
+    progress_callback(stage, **data)가 주어지면 1단계/2단계 진행 상황을 보고한다.
+    checkpoint(MatchingCheckpoint)가 주어지면 1단계 후보와 완료된 분석 결과를 저장하고,
+    이미 저장된 배치는 저장된 후보/결과에서 이어서 진행한다.
+    """
+    batch_state = checkpoint.batch(batch_name) if checkpoint else {}
+
+    def report(stage, **data):
+        if progress_callback:
+            progress_callback(stage, batch=batch_name, **data)
+
     print(f"🚀 {batch_name} 매칭 시작: {len(user_group_1)}명 × {len(user_group_2)}명")
     print("📊 전략: 전체 룰 기반 계산 → 인당 상위 3명 선별 → AI 심층 분석")
     
-    last_progress_time = time.time()
-    
-    # 1단계: 각 사용자에 대해 모든 상대방과의 룰 기반 점수 계산
-    print(f"📊 1단계: 룰 기반 점수 계산 중...")
+    # 1단계: 전체 룰 기반 점수 행렬을 한 번에 계산하고 인당 상위 3명 선별
+    print(f"📊 1단계: 룰 기반 점수 계산 중 (벡터화)...")
     user_candidates = {}  # user1_id -> [(user2, score, reason), ...]
+    stale_pair_count = 0  # 체크포인트 복원 시 사용자가 사라져 제외한 쌍 수
+
+    if 'candidates' in batch_state:
+        # 체크포인트에 저장된 후보 복원 (이유 문구는 점수로부터 다시 생성)
+        # 그사이 삭제되었거나 조회되지 않은 사용자의 쌍은 건너뜀
+        users_1 = {user['id']: user for user in user_group_1}
+        users_2 = {user['id']: user for user in user_group_2}
+        for user1_id, user2_id, score in batch_state['candidates']:
+            user1, user2 = users_1.get(user1_id), users_2.get(user2_id)
+            if user1 is None or user2 is None:
+                stale_pair_count += 1
+                continue
+            user_candidates.setdefault(user1_id, []).append(
+                (user2, score, render_rule_based_reason(user1['mbti'], user2['mbti'], score))
+            )
+        print(f"♻️ 체크포인트에서 {batch_name} 1단계 후보 {len(batch_state['candidates']) - stale_pair_count}쌍 복원")
+        if stale_pair_count:
+            print(f"⚠️ {batch_name} 체크포인트 후보 중 사용자를 찾을 수 없는 {stale_pair_count}쌍 제외")
+    elif timeout_callback and timeout_callback(time.time()):
+        print(f"⏰ 타임아웃 감지: {batch_name} 1단계 중단")
+    else:
+        stage1_start_time = time.time()
+        if MATCHING_ASSIGNMENT == 'flow':
+            user_candidates = select_assigned_rule_candidates(user_group_1, user_group_2, top_k=3, min_score=70)
+        else:
+            user_candidates = select_top_rule_candidates(user_group_1, user_group_2, top_k=3, min_score=70)
+        print(f"⚡ 룰 기반 계산 완료: {len(user_group_1)}×{len(user_group_2)}쌍 ({time.time() - stage1_start_time:.3f}초)")
 
-    for i, user1 in enumerate(user_group_1):
-        current_time = time.time()
-        
-        # 타임아웃 확인
-        if timeout_callback and timeout_callback(current_time):
-            print(f"⏰ 타임아웃 감지: {batch_name} 1단계 중단")
-            break
-        
-        # 무응답 감지 (7초로 단축)
-        if current_time - last_progress_time > 7:
-            print(f"⚠️ 무응답 감지: {batch_name} 1단계 7초 동안 진행 없음")
-            print(f"🔄 현재 시간: {current_time:.2f}, 마지막 진행: {last_progress_time:.2f}")
-            break
-        
-        # 진행률 표시 (10개마다)
-        if i % 10 == 0:
-            progress = (i / len(user_group_1)) * 100
-            print(f"📊 룰 기반 계산 진행률: {progress:.1f}% ({i}/{len(user_group_1)})")
-            last_progress_time = current_time
-        
-        candidates = []
-        
-        for user2 in user_group_2:
-            if user1['id'] == user2['id']:
-                continue  # 자기 자신 제외
-            
-            # 캐시 없이 바로 룰 기반 계산 (최대 속도)
-            score, reason = calculate_rule_based_matching(user1, user2)
-            print(f"⚡ 룰 기반 계산: {user1['name']} ↔ {user2['name']} (점수: {score})")
-            
-            # 70점 이상만 후보에 추가
-            if score >= 70:
-                candidates.append((user2, score, reason))
-        
-        # 점수 높은 순으로 정렬하여 상위 3명 선택
-        candidates.sort(key=lambda x: x[1], reverse=True)
-        top_3_candidates = candidates[:3]
-        
-        user_candidates[user1['id']] = top_3_candidates
-        
-        if top_3_candidates:
-            print(f"🎯 {user1['name']} 상위 3명 선별: {[(c[0]['name'], c[1]) for c in top_3_candidates]}")
-        
-        # 진행 시간 업데이트
-        last_progress_time = time.time()
-    
-    # 2단계: 선별된 상위 3명에 대해서만 AI 심층 분석
+        for user1 in user_group_1:
+            top_3_candidates = user_candidates.get(user1['id'], [])
+            if top_3_candidates:
+                print(f"🎯 {user1['name']} 상위 3명 선별: {[(c[0]['name'], c[1]) for c in top_3_candidates]}")
+
+    # 2단계: 선별된 상위 3명에 대해서만 AI 심층 분석 (모든 후보 쌍을 한 번에 제출)
     print(f"📊 2단계: 선별된 후보들 AI 심층 분석...")
-    
-    matches = []
-    ai_analysis_count = 0
-    
-    total_users = len(user_group_1)
-    processed_users = 0
-    
+
+    candidate_pairs = []
     for user1 in user_group_1:
-        processed_users += 1
-        current_time = time.time()
-        
-        print(f"👤 사용자 {processed_users}/{total_users} 처리 중: {user1['name']} ({(processed_users/total_users)*100:.1f}%)")
-        
-        # 타임아웃 확인
-        if timeout_callback and timeout_callback(current_time):
-            print(f"⏰ 타임아웃 감지: {batch_name} AI 분석 중단")
-            break
-        
-        candidates = user_candidates.get(user1['id'], [])
-        
-        for user2, rule_score, rule_reason in candidates:
-            print(f"🤖 AI 심층 분석: {user1['name']} ↔ {user2['name']} (룰 기반: {rule_score}점)")
-            ai_analysis_count += 1
-            
-            # AI 호출 간격 조절 (메모리 및 API 안정성)
-            if ai_analysis_count % 5 == 0:  # 5번마다로 빈도 증가
-                time.sleep(1.0)  # 더 긴 휴식으로 안정성 확보
-                gc.collect()  # 가비지 컬렉션으로 메모리 정리
-                print(f"⏸️ AI 분석 휴식: {ai_analysis_count}회 완료 (메모리 정리)")
-                
-                # 매 10회마다 상태 로그만 출력
-                if ai_analysis_count % 10 == 0:
-                    print(f"📊 AI 분석 진행: {ai_analysis_count}회 완료")
-            
-            # 매 AI 호출마다 진행 상황 출력 (무한 대기 방지)
-            print(f"🤖 AI 호출 준비: {user1['name']} ↔ {user2['name']} ({ai_analysis_count}번째)")
-            
+        for user2, rule_score, rule_reason in user_candidates.get(user1['id'], []):
+            candidate_pairs.append((user1, user2, rule_score, rule_reason))
+    report('stage1', pairs=len(user_group_1) * len(user_group_2), candidates=len(candidate_pairs))
+    if checkpoint and 'candidates' not in batch_state and user_candidates:
+        with checkpoint.lock:
+            batch_state['candidates'] = [[user1['id'], user2['id'], score] for user1, user2, score, _ in candidate_pairs]
+            batch_state['results'] = {}
+        checkpoint.save()
+    elif checkpoint and stale_pair_count:
+        # 제외한 쌍을 뺀 후보 순서로 저장된 분석 결과의 쌍 번호를 다시 매김
+        pair_numbers = {(user1['id'], user2['id']): pair_index for pair_index, (user1, user2, _, _) in enumerate(candidate_pairs)}
+        with checkpoint.lock:
+            saved_pairs = batch_state['candidates']
+            renumbered = {}
+            for pair_index, result in batch_state.get('results', {}).items():
+                user1_id, user2_id, _ = saved_pairs[int(pair_index)]
+                if (user1_id, user2_id) in pair_numbers:
+                    renumbered[str(pair_numbers[(user1_id, user2_id)])] = result
+            batch_state['candidates'] = [[user1['id'], user2['id'], score] for user1, user2, score, _ in candidate_pairs]
+            batch_state['results'] = renumbered
+        checkpoint.save()
+
+    def analyze_pairs(pair_indices):
+        outcomes = {}
+        ai_pair_indices = []
+        for pair_index in pair_indices:
+            user1, user2, rule_score, rule_reason = candidate_pairs[pair_index]
             # AI 심층 분석 조건 확인 후 수행
             if should_use_ai_matching(user1, user2, rule_score):
-                final_score, final_reason = perform_ai_matching_analysis(user1, user2, rule_score, model)
+                ai_pair_indices.append(pair_index)
             else:
                 # 룰 기반 결과 사용
-                final_score, final_reason = rule_score, rule_reason
-            
-            # 캐시 저장 완전 제거 - 속도 최우선
-            
-            # 매칭 결과에 추가
-            matches.append({
-                    'user1_id': user1['id'],
-                    'user2_id': user2['id'],
-                    'user1_name': user1['name'],
-                    'user2_name': user2['name'],
-                'compatibility_score': final_score,
-                'matching_reason': final_reason
-            })
-            print(f"✅ {batch_name}: {user1['name']} ↔ {user2['name']} (최종 점수: {final_score})")
-            
-            # 진행 시간 업데이트
-            last_progress_time = time.time()
-    
-    print(f"🏁 {batch_name} 매칭 완료: {len(matches)}개 결과 (AI 분석: {ai_analysis_count}회)")
+                outcomes[pair_index] = (rule_score, rule_reason)
+        if ai_pair_indices:
+            ai_results = perform_batch_ai_matching_analysis(
+                [candidate_pairs[pair_index][:3] for pair_index in ai_pair_indices], model
+            )
+            outcomes.update(zip(ai_pair_indices, ai_results))
+        return outcomes
+
+    # 이전 실행에서 이미 분석된 사용자 쌍은 캐시 결과를 그대로 사용
+    results = get_cached_matching_results([pair[:2] for pair in candidate_pairs])
+    if results:
+        print(f"⚡ 매칭 결과 캐시 사용: {len(results)}/{len(candidate_pairs)}쌍")
+    if checkpoint:
+        with checkpoint.lock:
+            checkpoint_results = batch_state.setdefault('results', {})
+    else:
+        checkpoint_results = {}
+    if checkpoint_results:
+        results.update((int(pair_index), tuple(result)) for pair_index, result in checkpoint_results.items())
+        print(f"♻️ 체크포인트에서 {batch_name} 분석 결과 {len(checkpoint_results)}쌍 복원")
+    report('stage2', done=len(results), total=len(candidate_pairs))
+
+    # 같은 MBTI 쌍은 첫 요청(리더)이 끝난 뒤 나머지를 제출해 캐시를 재사용
+    leaders = {}
+    followers = {}
+    for pair_index, (user1, user2, _, _) in enumerate(candidate_pairs):
+        if pair_index in results:
+            continue
+        key = get_ai_response_cache_key(user1['mbti'], user2['mbti'])
+        if key in leaders:
+            followers.setdefault(key, []).append(pair_index)
+        else:
+            leaders[key] = pair_index
+
+    # 리더 쌍들은 GEMINI_BATCH_SIZE개씩 묶어 배치 프롬프트 하나로 요청
+    cached_pair_indices = set(results)
+    pending = {}
+    leader_items = list(leaders.items())
+    batch_size = max(1, GEMINI_BATCH_SIZE)
+    for start in range(0, len(leader_items), batch_size):
+        chunk = leader_items[start:start + batch_size]
+        pending[gemini_executor.submit(analyze_pairs, [pair_index for _, pair_index in chunk])] = chunk
+    print(f"🤖 AI 분석 제출: {len(candidate_pairs)}쌍 (MBTI 쌍 {len(leaders)}종, 요청 {len(pending)}건, 동시 실행 {GEMINI_MAX_CONCURRENCY}개)")
+
+    timed_out = False
+    while pending:
+        # 타임아웃 확인
+        if timeout_callback and timeout_callback(time.time()):
+            print(f"⏰ 타임아웃 감지: {batch_name} AI 분석 중단")
+            timed_out = True
+            break
+
+        done, _ = wait(list(pending), timeout=1.0, return_when=FIRST_COMPLETED)
+        for future in done:
+            chunk = pending.pop(future)
+            chunk_indices = [pair_index for _, pair_index in chunk]
+            try:
+                outcomes = future.result()
+            except Exception as e:
+                print(f"❌ AI 분석 작업 오류: {e}")
+                outcomes = {pair_index: tuple(candidate_pairs[pair_index][2:]) for pair_index in chunk_indices}
+            results.update(outcomes)
+
+            for pair_index in chunk_indices:
+                user1, user2 = candidate_pairs[pair_index][:2]
+                print(f"✅ {batch_name}: {user1['name']} ↔ {user2['name']} (최종 점수: {results[pair_index][0]}) [{len(results)}/{len(candidate_pairs)}]")
+
+            report('stage2', done=len(results), total=len(candidate_pairs))
+            if checkpoint:
+                with checkpoint.lock:
+                    checkpoint_results.update((str(pair_index), list(results[pair_index])) for pair_index in chunk_indices)
+                checkpoint.record_ai_responses(candidate_pairs[pair_index][:2] for pair_index in chunk_indices)
+                checkpoint.maybe_save()
+
+            # 리더가 끝난 MBTI 쌍의 나머지 쌍들은 캐시를 사용하므로 한 작업으로 제출
+            follower_indices = [i for key, _ in chunk if key is not None for i in followers.pop(key, [])]
+            if follower_indices:
+                pending[gemini_executor.submit(analyze_pairs, follower_indices)] = [(None, i) for i in follower_indices]
+
+    if timed_out:
+        # 아직 시작하지 않은 작업은 취소하고, 실행 중인 작업은 짧은 유예 시간 안에 끝난 것만 결과를 보존
+        # (배치 호출 + 쌍별 폴백은 수 분이 걸릴 수 있어 끝까지 기다리면 시간 예산을 넘김.
+        #  늦게 끝나는 작업의 응답도 AI 응답 캐시에 저장되므로 다음 조각에서 재사용됨)
+        running = [future for future in pending if not future.cancel()]
+        finished, unfinished = wait(running, timeout=MATCHING_TIMEOUT_GRACE) if running else (set(), set())
+        if unfinished:
+            print(f"⏰ {batch_name} 실행 중인 AI 분석 {len(unfinished)}건은 다음 조각에서 이어서 처리")
+        for future in finished:
+            chunk_indices = [pair_index for _, pair_index in pending.pop(future)]
+            try:
+                outcomes = future.result()
+            except Exception as e:
+                print(f"❌ AI 분석 작업 오류: {e}")
+                continue
+            results.update(outcomes)
+            if checkpoint:
+                with checkpoint.lock:
+                    checkpoint_results.update((str(pair_index), list(results[pair_index])) for pair_index in chunk_indices)
+                checkpoint.record_ai_responses(candidate_pairs[pair_index][:2] for pair_index in chunk_indices)
+
+    # AI 분석으로 얻은 결과만 사용자 쌍 캐시에 일괄 저장 (폴백 결과는 저장하지 않음)
+    save_matching_results_to_cache([
+        (candidate_pairs[pair_index][0], candidate_pairs[pair_index][1]) + tuple(results[pair_index])
+        for pair_index in results
+        if pair_index not in cached_pair_indices
+        and has_cached_ai_response(candidate_pairs[pair_index][0]['mbti'], candidate_pairs[pair_index][1]['mbti'])
+    ])
+
+    # 입력 순서대로 결과를 정렬하여 매칭 목록 구성
+    matches = []
+    for pair_index in sorted(results):
+        user1, user2 = candidate_pairs[pair_index][:2]
+        final_score, final_reason = results[pair_index]
+        matches.append({
+            'user1_id': user1['id'],
+            'user2_id': user2['id'],
+            'user1_name': user1['name'],
+            'user2_name': user2['name'],
+            'compatibility_score': final_score,
+            'matching_reason': final_reason
+        })
+
+    print(f"🏁 {batch_name} 매칭 완료: {len(matches)}개 결과 (AI 분석: {len(results)}/{len(candidate_pairs)}쌍, 실행기 통계: {gemini_executor.get_stats()})")
     return matches
 
-@app.route('/admin/matching', methods=['POST'])
-def perform_matching():
-    # 로컬 개발 환경에서 세션 체크 우회 (디버깅용)
-    import os
-    if os.getenv('FLASK_ENV') == 'development':
-        print("🔧 개발 환경에서 세션 체크 우회")
-    elif not session.get('logged_in'):
-        return jsonify({'error': '로그인이 필요합니다'}), 401
+# 세 성별 배치를 동시에 실행하는 스레드 풀
+matching_batch_executor = ThreadPoolExecutor(max_workers=3, thread_name_prefix='matching-batch')
+
+def select_matching_model():
+    """매칭 분석에 사용할 Gemini 모델 선택 (모두 실패하면 None)"""
+    # Vercel 환경 최적화: 간단한 모델만 사용
+    model_names = ['gemini-2.0-flash', 'gemini-1.5-flash-latest', 'gemini-pro']  # 2.0-Flash 우선 (안정성 검증됨)
+    for model_name in model_names:
+        try:
+            print(f"🔄 {model_name} 모델 테스트 중...")
+            model = genai.GenerativeModel(model_name)
+            # 간단한 테스트로만 확인 (Vercel 타임아웃 방지)
+            print(f"✅ {model_name} 모델 선택됨")
+            return model
+        except Exception as e:
+            print(f"❌ {model_name} 모델 실패: {e}")
+            continue
+    return None
+
+def run_matching(progress_callback=None, continuation_token=None, time_budget=None):
+    """전체 매칭 실행 → (응답 데이터, HTTP 상태 코드)
+
+    progress_callback(stage, **data)로 load / stage1 / stage2 / persist / notify 단계 진행 상황을 보고한다.
+    진행 상태는 체크포인트에 저장되며, 시간 예산(time_budget)을 넘기면 202와 continuation_token을 반환하고
+    그 토큰으로 다시 호출하면 저장된 지점부터 이어서 실행한다.
+    """
+    def report(stage, **data):
+        if progress_callback:
+            progress_callback(stage, **data)
 
     # 매칭 시작 시간 기록 및 타임아웃 감지
     matching_start_time = time.time()
-    max_matching_time = 600  # 10분 타임아웃
+    max_matching_time = time_budget or MATCHING_TIME_BUDGET
     last_activity_time = matching_start_time
+    checkpoint = None
 
     try:
-        # Supabase에서 데이터 조회
-        print("🔍 Supabase에서 사용자 데이터 조회 중...")
-        try:
-            # 새로운 사용자들 (is_matched = FALSE)
-            print("   📡 새로운 사용자 조회 시도...")
-            new_users_response = supabase.table('results').select('id, name, mbti, saju_result, ai_analysis, gender').eq('is_matched', False).execute()
-            new_users = new_users_response.data if new_users_response.data else []
-            print(f"✅ 새로운 사용자 {len(new_users)}명 조회 완료")
-        except Exception as db_error:
-            print(f"❌ 새로운 사용자 조회 실패: {db_error}")
-            raise Exception(f"새로운 사용자 데이터 조회 실패: {db_error}")
+        if continuation_token:
+            checkpoint = MatchingCheckpoint.load(continuation_token)
+            if checkpoint is None:
+                return {'error': '이어서 실행할 매칭을 찾을 수 없습니다', 'continuation_token': continuation_token}, 404
+            if checkpoint.status == 'completed':
+                return {
+                    'success': True,
+                    'completed': True,
+                    'continuation_token': checkpoint.token,
+                    'message': '이미 완료된 매칭 실행입니다.'
+                }, 200
+            print(f"♻️ 매칭 체크포인트 {checkpoint.token}에서 이어서 실행")
+            checkpoint.restore_ai_responses()
 
-        try:
-            # 기존 매칭된 사용자들 (is_matched = TRUE)
-            print("   📡 기존 매칭된 사용자 조회 시도...")
-            existing_users_response = supabase.table('results').select('id, name, mbti, saju_result, ai_analysis, gender').eq('is_matched', True).execute()
-            existing_users = existing_users_response.data if existing_users_response.data else []
-            print(f"✅ 기존 매칭된 사용자 {len(existing_users)}명 조회 완료")
-        except Exception as db_error:
-            print(f"❌ 기존 사용자 조회 실패: {db_error}")
-            raise Exception(f"기존 사용자 데이터 조회 실패: {db_error}")
+    except Exception as e:
+        print(f"❌ 매칭 체크포인트 조회 실패: {e}")
+        return {'success': False, 'error': f'매칭 체크포인트 조회 실패: {e}'}, 500
+
+    try:
+        candidate_source = 'supabase'
+        if checkpoint is not None:
+            # 첫 호출 때 고정한 대상 사용자들을 그대로 다시 조회 (중간에 가입한 사용자는 다음 실행에서 처리)
+            # 기존 사용자는 후보 인덱스에서 먼저 찾고 없는 사용자만 Supabase에서 조회
+            print("🔍 체크포인트의 매칭 대상 사용자 조회 중...")
+            existing_user_ids = checkpoint.state['existing_user_ids']
+            try:
+                existing_by_id = candidate_index.get_profiles(existing_user_ids)
+                candidate_source = 'index'
+            except Exception as e:
+                print(f"⚠️ 매칭 후보 인덱스 조회 실패, Supabase에서 조회: {e}")
+                existing_by_id = {}
+            missing_ids = [user_id for user_id in existing_user_ids if user_id not in existing_by_id]
+            users_by_id = fetch_users_by_ids(checkpoint.state['new_user_ids'] + missing_ids, CANDIDATE_PROFILE_COLUMNS)
+            users_by_id.update(existing_by_id)
+            new_users = [users_by_id[user_id] for user_id in checkpoint.state['new_user_ids'] if user_id in users_by_id]
+            existing_users = [users_by_id[user_id] for user_id in existing_user_ids if user_id in users_by_id]
+            print(f"✅ 새로운 사용자 {len(new_users)}명, 기존 사용자 {len(existing_users)}명 조회 완료")
+        else:
+            # Supabase에서 데이터 조회
+            print("🔍 Supabase에서 사용자 데이터 조회 중...")
+            try:
+                # 새로운 사용자들 (is_matched = FALSE)
+                print("   📡 새로운 사용자 조회 시도...")
+                new_users_response = supabase.table('results').select(CANDIDATE_PROFILE_COLUMNS).eq('is_matched', False).execute()
+                new_users = new_users_response.data if new_users_response.data else []
+                print(f"✅ 새로운 사용자 {len(new_users)}명 조회 완료")
+            except Exception as db_error:
+                print(f"❌ 새로운 사용자 조회 실패: {db_error}")
+                raise Exception(f"새로운 사용자 데이터 조회 실패: {db_error}")
+
+            try:
+                # 기존 매칭된 사용자들은 후보 인덱스에서 성별별로 로드 (Supabase에는 인원 수만 확인)
+                print("   🗂️ 매칭 후보 인덱스에서 기존 사용자 로드...")
+                candidate_source = candidate_index.ensure_fresh()
+                existing_users = candidate_index.load_group('MALE') + candidate_index.load_group('FEMALE')
+                print(f"✅ 기존 매칭된 사용자 {len(existing_users)}명 로드 완료 (출처: {candidate_source})")
+            except Exception as index_error:
+                print(f"⚠️ 매칭 후보 인덱스 사용 실패, Supabase에서 직접 조회: {index_error}")
+                candidate_source = 'supabase'
+                try:
+                    # 기존 매칭된 사용자들 (is_matched = TRUE)
+                    print("   📡 기존 매칭된 사용자 조회 시도...")
+                    existing_users = fetch_matched_user_profiles()
+                    print(f"✅ 기존 매칭된 사용자 {len(existing_users)}명 조회 완료")
+                except Exception as db_error:
+                    print(f"❌ 기존 사용자 조회 실패: {db_error}")
+                    raise Exception(f"기존 사용자 데이터 조회 실패: {db_error}")
+
+        report('load', new_users=len(new_users), existing_users=len(existing_users))
 
         if len(new_users) == 0:
-            return jsonify({'error': '매칭할 새로운 사용자가 없습니다'}), 400
+            return {'error': '매칭할 새로운 사용자가 없습니다'}, 400
 
         if len(existing_users) == 0 and len(new_users) < 2:
-                return jsonify({'error': '매칭을 위해 최소 2명의 사용자가 필요합니다'}), 400
+                return {'error': '매칭을 위해 최소 2명의 사용자가 필요합니다'}, 400
+
+        # 새 실행이면 대상 사용자를 고정한 체크포인트 생성 (이후 호출은 같은 사용자들로 이어서 진행)
+        if checkpoint is None:
+            checkpoint = MatchingCheckpoint(state={
+                'new_user_ids': [user['id'] for user in new_users],
+                'existing_user_ids': [user['id'] for user in existing_users],
+                'ai_prompt_version': AI_PROMPT_VERSION,
+                'batches': {}
+            })
+            checkpoint.save()
+            print(f"💾 매칭 체크포인트 생성: {checkpoint.token}")
 
         # 대규모 매칭 지원을 위한 사용자 수 제한 해제
         total_users = len(new_users) + len(existing_users)
@@ -1487,7 +3564,7 @@ def perform_matching():
 
         # 데이터 구조 검증
         print("🔍 데이터 구조 검증 중...")
-        required_keys = ['id', 'name', 'mbti', 'saju_result', 'ai_analysis', 'gender']
+        required_keys = ['id', 'name', 'mbti', 'saju_result', 'gender']
         for i, user in enumerate(new_users + existing_users):
             print(f"사용자 {i} 데이터: 타입={type(user)}, 키={list(user.keys()) if isinstance(user, dict) else 'N/A'}")
 
@@ -1511,28 +3588,17 @@ def perform_matching():
         print("🤖 AI 매칭 분석 시작...")
         # API 키 확인
         if not GOOGLE_API_KEY:
-            return jsonify({'error': 'Google AI API 키가 설정되지 않아 매칭을 수행할 수 없습니다. 관리자에게 문의해주세요.'}), 500
-
-        # Vercel 환경 최적화: 간단한 모델만 사용
-        model_names = ['gemini-2.0-flash', 'gemini-1.5-flash-latest', 'gemini-pro']  # 2.0-Flash 우선 (안정성 검증됨)
-        model = None
-        for model_name in model_names:
-            try:
-                print(f"🔄 {model_name} 모델 테스트 중...")
-                model = genai.GenerativeModel(model_name)
-                # 간단한 테스트로만 확인 (Vercel 타임아웃 방지)
-                print(f"✅ {model_name} 모델 선택됨")
-                break
-            except Exception as e:
-                print(f"❌ {model_name} 모델 실패: {e}")
-                continue
+            return {'error': 'Google AI API 키가 설정되지 않아 매칭을 수행할 수 없습니다. 관리자에게 문의해주세요.'}, 500
 
+        model = select_matching_model()
         if model is None:
-            return jsonify({'error': '사용 가능한 AI 모델을 찾을 수 없습니다. API 키와 모델 설정을 확인해주세요.'}), 500
+            return {'error': '사용 가능한 AI 모델을 찾을 수 없습니다. API 키와 모델 설정을 확인해주세요.'}, 500
 
         # 1. 최적화된 배치 매칭 분석 수행
         print("💑 최적화된 매칭 분석 시작...")
         all_matches = []
+        ai_cache_stats_start = dict(ai_response_cache_stats)
+        rule_pruning_stats_start = dict(rule_pruning_stats)
 
         # 타임아웃 체크 함수 정의
         def check_timeout(current_time):
@@ -1542,37 +3608,47 @@ def perform_matching():
                 return True
             return False
 
-        # 새로운 남자 × 기존 여자 매칭
-        if new_males and existing_females:
-            print(f"🚀 남자↔여자 매칭 시작... ({len(new_males)}×{len(existing_females)})")
-            male_female_matches = perform_batch_matching(
-                new_males, existing_females, model, "남자↔여자", check_timeout
-            )
-            all_matches.extend(male_female_matches)
-            
-            # 중간 타임아웃 체크
-            if check_timeout(time.time()):
-                raise TimeoutError("매칭 처리 시간이 초과되었습니다")
-
-        # 새로운 여자 × 기존 남자 매칭  
-        if new_females and existing_males:
-            print(f"🚀 여자↔남자 매칭 시작... ({len(new_females)}×{len(existing_males)})")
-            female_male_matches = perform_batch_matching(
-                new_females, existing_males, model, "여자↔남자", check_timeout
-            )
-            all_matches.extend(female_male_matches)
-            
-            # 중간 타임아웃 체크
-            if check_timeout(time.time()):
-                raise TimeoutError("매칭 처리 시간이 초과되었습니다")
-
-        # 새로운 사용자들끼리 매칭
-        if new_males and new_females:
-            print(f"🚀 새로운사용자내 매칭 시작... ({len(new_males)}×{len(new_females)})")
-            internal_matches = perform_batch_matching(
-                new_males, new_females, model, "새로운사용자내", check_timeout
-            )
-            all_matches.extend(internal_matches)
+        # 세 배치(새로운 남자 × 기존 여자, 새로운 여자 × 기존 남자, 새로운 사용자끼리)는 서로 독립이므로 동시에 실행
+        # (2단계 AI 호출은 모두 gemini_executor의 동시성/속도 제한을 함께 사용)
+        batches = [
+            ("남자↔여자", new_males, existing_females),
+            ("여자↔남자", new_females, existing_males),
+            ("새로운사용자내", new_males, new_females),
+        ]
+        batches = [(batch_name, group1, group2) for batch_name, group1, group2 in batches if group1 and group2]
+
+        # 배치별 진행 상황을 합쳐서 보고 (동시에 진행되므로 단계별 합계로 표시)
+        batch_progress = {}
+        batch_progress_lock = threading.Lock()
+
+        def report_batch(stage, batch=None, **data):
+            with batch_progress_lock:
+                batch_progress.setdefault(stage, {})[batch] = data
+                stage_progress = batch_progress[stage]
+                totals = {key: sum(item.get(key, 0) for item in stage_progress.values()) for key in data}
+                batch_label = '·'.join(name for name, _, _ in batches if name in stage_progress)
+            report(stage, batch=batch_label, **totals)
+
+        batch_futures = []
+        for batch_name, group1, group2 in batches:
+            print(f"🚀 {batch_name} 매칭 시작... ({len(group1)}×{len(group2)})")
+            batch_futures.append(matching_batch_executor.submit(
+                perform_batch_matching, group1, group2, model, batch_name, check_timeout, report_batch, checkpoint
+            ))
+        # 배치 순서대로 결과를 합쳐 실행마다 같은 순서 유지
+        for future in batch_futures:
+            all_matches.extend(future.result())
+
+        # 모든 배치가 시간 예산 안에 끝났는지 확인 (중단된 결과를 저장하지 않도록)
+        if check_timeout(time.time()):
+            raise TimeoutError("매칭 처리 시간이 초과되었습니다")
+
+        # 이번 실행의 AI 응답 캐시 적중 통계 계산
+        ai_cache_hits = ai_response_cache_stats['hits'] - ai_cache_stats_start['hits']
+        ai_cache_misses = ai_response_cache_stats['misses'] - ai_cache_stats_start['misses']
+        print(f"📊 AI 응답 캐시: 적중 {ai_cache_hits}회, 미적중 {ai_cache_misses}회")
+        rule_pruning = {key: rule_pruning_stats[key] - rule_pruning_stats_start[key] for key in rule_pruning_stats}
+        print(f"📊 1단계 상한 가지치기: {rule_pruning['pruned_pairs']}쌍 제외, {rule_pruning['evaluated_pairs']}쌍 계산")
 
         # 모든 매칭 결과를 all_pair_scores 형식으로 변환
         all_pair_scores = []
@@ -1615,48 +3691,74 @@ def perform_matching():
 
         print(f"🎯 최종 선정된 매칭 수: {len(unique_matches)}개")
 
-        # 3. 선정된 매칭 결과들을 Supabase에 저장 (upsert로 중복 방지)
-        inserted_count = 0
-        for match in unique_matches:
+        # 3. 선정된 매칭 결과들을 Supabase에 청크 단위로 일괄 저장 (upsert로 중복 방지)
+        # (체크포인트에 완료로 기록된 단계는 이어받을 때 다시 실행하지 않음)
+        if 'persisted' not in checkpoint.state:
+            inserted_count, failed_match_chunks = upsert_matches_bulk(unique_matches)
+            # 즉시 매칭이 남긴 임시 매칭 중 이번 결과에 없는 쌍 정리
             try:
-                result = supabase.table('matches').upsert({
-                    'user1_id': match['user1_id'],
-                    'user2_id': match['user2_id'],
-                    'compatibility_score': match['compatibility_score'],
-                    'matching_reason': match['matching_reason']
-                }).execute()
-                inserted_count += 1
-                print(f"✅ 매칭 저장: {match['user1_id']} ↔ {match['user2_id']} (점수: {match['compatibility_score']})")
+                provisional_deleted = delete_stale_provisional_matches([user['id'] for user in new_users], seen_pairs)
             except Exception as e:
-                print(f"⚠️ 매칭 저장 실패 {match['user1_id']} ↔ {match['user2_id']}: {e}")
-                continue
-
-        print(f"📊 매칭 저장 완료: {inserted_count}/{len(unique_matches)}개 성공")
+                print(f"⚠️ 임시 매칭 정리 실패: {e}")
+                provisional_deleted = 0
+            checkpoint.state['persisted'] = {
+                'saved': inserted_count,
+                'failed_match_chunks': failed_match_chunks,
+                'provisional_deleted': provisional_deleted
+            }
+            checkpoint.save()
+        inserted_count = checkpoint.state['persisted']['saved']
+        failed_match_chunks = checkpoint.state['persisted']['failed_match_chunks']
+        print(f"📊 매칭 저장 완료: {inserted_count}/{len(unique_matches)}개 성공 (실패 청크 {len(failed_match_chunks)}개)")
+        report('persist', saved=inserted_count, total=len(unique_matches), failed_chunks=len(failed_match_chunks))
+
+        # 새 매칭이 저장된 사용자들의 매칭 결과 페이지 캐시 무효화
+        invalidate_match_page_cache(
+            {match['user1_id'] for match in unique_matches} | {match['user2_id'] for match in unique_matches}
+        )
 
         # 매칭 결과를 응답용으로도 저장
         # 모든 사용자들에서 이름 찾기
-        all_users_for_lookup = new_users + existing_users
+        user_names = {u['id']: u['name'] for u in new_users + existing_users}
         for match in unique_matches:
             matches.append({
-                'user1': {'id': match['user1_id'], 'name': next(u['name'] for u in all_users_for_lookup if u['id'] == match['user1_id'])},
-                'user2': {'id': match['user2_id'], 'name': next(u['name'] for u in all_users_for_lookup if u['id'] == match['user2_id'])},
+                'user1': {'id': match['user1_id'], 'name': user_names[match['user1_id']]},
+                'user2': {'id': match['user2_id'], 'name': user_names[match['user2_id']]},
                 'compatibility_score': match['compatibility_score'],
                 'reason': match['matching_reason']
             })
 
-        # 매칭 분석에 참여한 새로운 사용자들의 is_matched를 TRUE로 업데이트
+        # 매칭 분석에 참여한 새로운 사용자들의 is_matched를 한 번에 TRUE로 업데이트
         # (새로운 사용자만 매칭 분석에 참여했으므로 새로운 사용자들의 상태만 변경)
-        new_user_ids = set()
-        for user in new_users:  # 새로운 사용자들
-            new_user_ids.add(user['id'])
-
-        if new_user_ids:
-            # 새로운 사용자들의 is_matched를 TRUE로 업데이트
-            for user_id in new_user_ids:
-                supabase.table('results').update({'is_matched': True}).eq('id', user_id).execute()
-
-                # 매칭 완료 푸시 알림 전송
-                send_matching_notification(user_id)
+        new_user_ids = {user['id'] for user in new_users}
+        if 'marked' not in checkpoint.state:
+            updated_count, failed_user_ids = mark_users_matched(new_user_ids)
+            checkpoint.state['marked'] = {'updated': updated_count, 'failed_user_ids': failed_user_ids}
+            # 매칭 완료로 바뀐 사용자들을 다음 실행의 기존 후보로 인덱스에 추가
+            try:
+                failed_user_id_set = set(failed_user_ids)
+                candidate_index.upsert_users([user for user in new_users if user['id'] not in failed_user_id_set], is_matched=True)
+            except Exception as e:
+                print(f"⚠️ 매칭 후보 인덱스 갱신 실패 (다음 실행에서 재동기화): {e}")
+            checkpoint.save()
+        updated_count = checkpoint.state['marked']['updated']
+        failed_user_ids = checkpoint.state['marked']['failed_user_ids']
+        print(f"📊 is_matched 업데이트: {updated_count}/{len(new_user_ids)}명 성공")
+
+        # 매칭 완료 푸시 알림은 백그라운드 워커가 전송 (응답을 기다리게 하지 않음)
+        # outbox에 기록된 뒤에만 완료로 표시하므로 기록에 실패하면 이어받기 실행에서 다시 시도
+        if 'notified' not in checkpoint.state:
+            try:
+                checkpoint.state['notified'] = notification_dispatcher.enqueue(new_user_ids)
+            except Exception as e:
+                print(f"⚠️ 매칭 알림 대기열 저장 실패: {e}")
+        notifications_queued = checkpoint.state.get('notified', 0)
+        if 'notified' in checkpoint.state:
+            checkpoint.complete()
+        else:
+            checkpoint.save()
+        print(f"🔔 매칭 알림 {notifications_queued}건 전송 대기열에 추가")
+        report('notify', queued=notifications_queued)
 
         # 최종 실행 시간 계산
         total_time = time.time() - matching_start_time
@@ -1664,24 +3766,54 @@ def perform_matching():
         # 응답 객체 구성 (JSON 직렬화 안전)
         response_data = {
             'success': True,
+            'completed': True,
+            'continuation_token': checkpoint.token,
             'message': f'매칭이 완료되었습니다. 70점 이상인 매칭 결과만 선정하여 총 {len(matches)}개의 매칭 결과를 생성했습니다.',
             'matches_count': len(matches),
             'execution_time': round(total_time, 2),
+            'ai_cache': {
+                'hits': ai_cache_hits,
+                'misses': ai_cache_misses,
+                'prompt_version': AI_PROMPT_VERSION
+            },
+            'persistence': {
+                'saved_matches': inserted_count,
+                'failed_match_chunks': failed_match_chunks,
+                'matched_users_updated': updated_count,
+                'failed_user_ids': failed_user_ids,
+                'provisional_deleted': checkpoint.state['persisted'].get('provisional_deleted', 0)
+            },
+            'notifications_queued': notifications_queued,
+            'candidate_source': candidate_source,
+            'rule_pruning': rule_pruning,
             'matches': matches
         }
         
         print(f"✅ 매칭 완료: {len(matches)}개 결과, 실행시간: {total_time:.2f}초")
         
-        return jsonify(response_data)
+        return response_data, 200
 
     except TimeoutError as e:
         print(f"⏰ 매칭 타임아웃 발생: {str(e)}")
-        return jsonify({
-            'success': False,
-            'error': '매칭 처리 시간이 초과되었습니다',
-            'message': '처리 시간이 10분을 초과했습니다. 사용자 수를 줄여서 다시 시도해주세요.',
+        if checkpoint is None:
+            return {
+                'success': False,
+                'error': '매칭 처리 시간이 초과되었습니다',
+                'message': '처리 시간이 10분을 초과했습니다. 사용자 수를 줄여서 다시 시도해주세요.',
+                'timeout': True
+            }, 408
+
+        # 완료된 분석까지 저장하고 이어받기 토큰 반환
+        checkpoint.save()
+        print(f"💾 매칭 체크포인트 저장: {checkpoint.token}")
+        return {
+            'success': True,
+            'completed': False,
+            'continuation_token': checkpoint.token,
+            'message': '이번 호출의 처리 시간을 모두 사용했습니다. continuation_token으로 다시 요청하면 이어서 진행합니다.',
+            'execution_time': round(time.time() - matching_start_time, 2),
             'timeout': True
-        }), 408
+        }, 202
 
     except Exception as e:
         # 실행 시간 계산
@@ -1705,15 +3837,603 @@ def perform_matching():
         elif "json" in str(e).lower():
             error_message = '데이터 처리 중 오류가 발생했습니다. 다시 시도해주세요.'
 
-        return jsonify({
+        return {
             'success': False,
             'error': error_message,
             'error_type': type(e).__name__,
             'execution_time': round(elapsed_time, 2)
-        }), 500
+        }, 500
+
+# --- [등록 즉시 매칭] ---
+# INSTANT_MATCHING이 켜져 있으면 /saju 등록 직후 메모리 후보 풀에서 이성 상대의 룰 기반 상위 후보를 골라
+# 임시 매칭으로 바로 저장/응답하고, AI 심층 분석은 백그라운드에서 수행한 뒤 확정 결과를 푸시로 알림
+INSTANT_MATCHING = os.getenv('INSTANT_MATCHING', '').lower() in ('1', 'true', 'yes')
+INSTANT_MATCH_TOP_K = int(os.getenv('INSTANT_MATCH_TOP_K', '3'))
+INSTANT_MATCH_WORKERS = int(os.getenv('INSTANT_MATCH_WORKERS', '2'))
+INSTANT_MATCH_POOL_TTL = float(os.getenv('INSTANT_MATCH_POOL_TTL', '60'))  # 후보 풀을 백그라운드에서 Supabase와 대조해 다시 만드는 주기 (초)
+
+class InstantMatchPool:
+    """성별별 매칭 후보와 동치 클래스를 메모리에 유지 (백그라운드에서 갱신)
+
+    /saju 요청 안에서는 Supabase 동기화나 인덱스 전체 로드를 하지 않고 메모리의 풀만 사용한다.
+    풀이 없거나(콜드 인스턴스) TTL이 지났거나 로컬 인덱스가 바뀌었으면 백그라운드 갱신을 시작하며,
+    갱신 때 ensure_fresh()로 Supabase와 대조하여 다른 인스턴스에서 매칭 완료된 사용자까지 반영한다.
+    """
+
+    def __init__(self, index, ttl):
+        self.index = index
+        self.ttl = ttl
+        self.groups = {}  # 성별 -> (후보 목록, 동치 클래스)
+        self.version = None  # 풀을 만든 시점의 인덱스 버전
+        self.loaded_at = 0.0
+        self.refreshing = False
+        self.lock = threading.Lock()
+
+    def _refresh(self):
+        try:
+            try:
+                self.index.ensure_fresh()
+            except Exception as e:
+                # Supabase에 닿지 않으면 로컬 인덱스 그대로 사용
+                print(f"⚠️ 즉시 매칭 후보 인덱스 동기화 실패: {e}")
+            version = self.index.version
+            groups = {}
+            for gender in ('MALE', 'FEMALE'):
+                users = self.index.load_group(gender)
+                groups[gender] = (users, build_feature_classes(users))
+            with self.lock:
+                self.groups, self.version, self.loaded_at = groups, version, time.time()
+            print(f"🗂️ 즉시 매칭 후보 풀 갱신: {', '.join(f'{gender} {len(users)}명' for gender, (users, _) in groups.items())}")
+        except Exception as e:
+            print(f"⚠️ 즉시 매칭 후보 풀 갱신 실패: {e}")
+        finally:
+            with self.lock:
+                self.refreshing = False
+
+    def warm_up(self):
+        """백그라운드 갱신 시작 (이미 진행 중이면 무시)"""
+        with self.lock:
+            if self.refreshing:
+                return
+            self.refreshing = True
+        threading.Thread(target=self._refresh, name='instant-match-pool', daemon=True).start()
+
+    def group(self, gender):
+        """(후보 목록, build_feature_classes 결과) 또는 None (풀이 아직 준비되지 않음)"""
+        with self.lock:
+            stale = (not self.groups or self.version != self.index.version
+                     or time.time() - self.loaded_at >= self.ttl)
+            group = self.groups.get(gender)
+        if stale:
+            self.warm_up()
+        return group
+
+instant_match_pool = InstantMatchPool(candidate_index, INSTANT_MATCH_POOL_TTL)
+instant_match_executor = ThreadPoolExecutor(max_workers=INSTANT_MATCH_WORKERS, thread_name_prefix='instant-match')
+
+# 매칭 삭제 시 한 번의 or_ 필터에 담을 최대 쌍 수 (쌍마다 and(...) 조건이 붙어 URL이 길어짐)
+MATCHES_DELETE_CHUNK = 50
+
+def delete_matches(pairs):
+    """(user1_id, user2_id) 쌍의 매칭 행을 or_ 필터로 일괄 삭제 → 삭제 요청한 쌍 수"""
+    pairs = list(dict.fromkeys(pairs))
+    deleted_count = 0
+    for start in range(0, len(pairs), MATCHES_DELETE_CHUNK):
+        chunk = pairs[start:start + MATCHES_DELETE_CHUNK]
+        try:
+            supabase.table('matches').delete().or_(
+                ','.join(f'and(user1_id.eq.{user1_id},user2_id.eq.{user2_id})' for user1_id, user2_id in chunk)
+            ).execute()
+            deleted_count += len(chunk)
+        except Exception as e:
+            print(f"⚠️ 매칭 삭제 실패 ({len(chunk)}쌍): {e}")
+    return deleted_count
+
+def delete_stale_provisional_matches(user_ids, kept_pairs):
+    """user_ids의 임시 매칭 중 확정 결과(kept_pairs)에 없는 행 삭제 → 삭제 요청한 쌍 수
+
+    즉시 매칭의 백그라운드 AI 분석이 실행되지 못한 사용자를 관리자 매칭이 처리할 때,
+    AI 분석에서 70점 미만이 된 임시 매칭이 남지 않도록 정리한다.
+    """
+    user_ids = list(user_ids)
+    stale_pairs = []
+    for start in range(0, len(user_ids), SUPABASE_IN_FILTER_CHUNK):
+        chunk = user_ids[start:start + SUPABASE_IN_FILTER_CHUNK]
+        id_list = ','.join(str(user_id) for user_id in chunk)
+        # 사용자당 임시 매칭은 INSTANT_MATCH_TOP_K개 이하라 한 페이지로 충분
+        response = supabase.table('matches').select('user1_id, user2_id').eq('is_provisional', True).or_(
+            f'user1_id.in.({id_list}),user2_id.in.({id_list})'
+        ).execute()
+        stale_pairs.extend(
+            (row['user1_id'], row['user2_id']) for row in response.data or []
+            if (row['user1_id'], row['user2_id']) not in kept_pairs
+        )
+    if not stale_pairs:
+        return 0
+    deleted_count = delete_matches(stale_pairs)
+    invalidate_match_page_cache({user_id for pair in stale_pairs for user_id in pair})
+    print(f"🧹 AI 분석에서 제외된 임시 매칭 {deleted_count}쌍 삭제")
+    return deleted_count
+
+def start_instant_matching(user):
+    """새 사용자의 룰 기반 상위 후보를 임시 매칭으로 저장하고 AI 분석을 백그라운드에 제출 → 응답용 매칭 목록"""
+    start_time = time.time()
+    opposite_gender = 'MALE' if normalize_candidate_gender(user.get('gender')) == 'FEMALE' else 'FEMALE'
+    pool_group = instant_match_pool.group(opposite_gender)
+    if pool_group is None:
+        # 콜드 인스턴스: 후보 풀은 백그라운드에서 준비하고 이번 요청은 관리자 매칭에 맡김
+        print(f"⚡ 즉시 매칭 후보 풀 준비 중: {user['name']} (관리자 매칭에서 처리)")
+        return []
+    pool_users, pool_classes = pool_group
+    candidates = select_top_rule_candidates(
+        [user], pool_users, top_k=INSTANT_MATCH_TOP_K, min_score=70, classes2=pool_classes
+    )[user['id']]
+    if not candidates:
+        print(f"⚡ 즉시 매칭 후보 없음: {user['name']} (후보 풀 {len(pool_users)}명, 관리자 매칭에서 처리)")
+        return []
+
+    provisional_rows = [{
+        'user1_id': min(user['id'], partner['id']),
+        'user2_id': max(user['id'], partner['id']),
+        'compatibility_score': score,
+        'matching_reason': reason,
+        'is_provisional': True
+    } for partner, score, reason in candidates]
+    upsert_matches_bulk(provisional_rows)
+    invalidate_match_page_cache({user['id']} | {partner['id'] for partner, _, _ in candidates})
+    print(f"⚡ 즉시 매칭: {user['name']} → {len(candidates)}명 ({time.time() - start_time:.3f}초, 후보 풀 {len(pool_users)}명)")
+
+    instant_match_executor.submit(refine_instant_matches, user, [partner for partner, _, _ in candidates])
+    return [{
+        'user': {'id': partner['id'], 'name': partner['name']},
+        'compatibility_score': score,
+        'reason': reason,
+        'refined': False
+    } for partner, score, reason in candidates]
+
+def refine_instant_matches(user, partners):
+    """임시 매칭 상대들에 대해 AI 심층 분석 후 결과를 확정하고 매칭 완료 처리 및 알림 전송"""
+    try:
+        model = select_matching_model() if GOOGLE_API_KEY else None
+        if model is None:
+            # 확정하지 않고 남겨두면 다음 관리자 매칭 실행에서 다시 분석됨
+            print(f"⚠️ 즉시 매칭 AI 분석 불가: {user['name']} (관리자 매칭에서 처리)")
+            return
+
+        matches = perform_batch_matching([user], partners, model, "즉시매칭")
+        final_rows = [{
+            'user1_id': min(match['user1_id'], match['user2_id']),
+            'user2_id': max(match['user1_id'], match['user2_id']),
+            'compatibility_score': match['compatibility_score'],
+            'matching_reason': match['matching_reason']
+        } for match in matches]
+        kept_rows = [row for row in final_rows if row['compatibility_score'] >= 70]
+        upsert_matches_bulk(kept_rows)
+        # AI 분석 후 70점 미만이 된 임시 매칭은 삭제
+        delete_matches((row['user1_id'], row['user2_id']) for row in final_rows if row['compatibility_score'] < 70)
+        invalidate_match_page_cache({user['id']} | {partner['id'] for partner in partners})
+
+        updated_count, _ = mark_users_matched([user['id']])
+        if updated_count:
+            candidate_index.upsert_users([user], is_matched=True)
+        notification_dispatcher.enqueue([user['id']])
+        print(f"✅ 즉시 매칭 확정: {user['name']} → {len(kept_rows)}/{len(final_rows)}명")
+    except Exception as e:
+        print(f"❌ 즉시 매칭 AI 분석 오류 ({user.get('name')}): {e}")
+
+# --- [백그라운드 매칭 작업] ---
+# 매칭을 요청 하나에서 끝까지 기다리지 않고 작업 ID로 실행하여
+# 상태 조회(GET /admin/matching/jobs/<id>)와 SSE 진행 이벤트 스트림으로 확인
+# 작업 상태는 matching_checkpoints 테이블에 kind='job' 행으로 저장되므로 어느 인스턴스에서든 조회할 수 있고,
+# 진행은 요청(POST /admin/matching/jobs/<id>/advance) 또는 크론(/admin/matching/cron) 1회당 시간 예산 한 조각씩 한다.
+# 같은 프로세스의 스레드로 끝까지 실행하는 방식(thread)은 로컬 개발용으로만 남겨 둔다 (서버리스에서는 요청이 끝나면 스레드가 멈춤)
+MATCHING_JOB_RUNNER = os.getenv('MATCHING_JOB_RUNNER') or ('request' if os.getenv('VERCEL') else 'thread')
+MATCHING_JOB_HISTORY = 20  # 보관할 최근 작업 수
+MATCHING_JOB_EVENT_HISTORY = 200  # 작업 행에 보관할 최근 이벤트 수
+MATCHING_JOB_SSE_KEEPALIVE = 15  # SSE 연결 유지용 주석 전송 간격 (초)
+# 조각 하나의 시간 예산 (초). Vercel에서는 함수 최대 실행 시간(Hobby 기본 60초) 안에 저장까지 끝나도록 작게 잡음
+MATCHING_JOB_SLICE_BUDGET = float(os.getenv('MATCHING_JOB_SLICE_BUDGET') or ('40' if os.getenv('VERCEL') else str(MATCHING_TIME_BUDGET)))
+# SSE 연결 하나의 최대 유지 시간 (초, 끊기면 브라우저가 Last-Event-ID로 다시 연결)
+MATCHING_JOB_SSE_MAX_DURATION = float(os.getenv('MATCHING_JOB_SSE_MAX_DURATION') or ('25' if os.getenv('VERCEL') else '240'))
+MATCHING_JOB_POLL_INTERVAL = 1.0  # SSE/로컬 실행기가 작업 행을 다시 읽는 간격 (초)
+MATCHING_JOB_SAVE_INTERVAL = 2.0  # 진행 중 작업 상태 저장 간격 (초)
+MATCHING_JOB_LEASE_MARGIN_RATIO = 0.5  # 조각 실행 임대 시간 = 시간 예산 × (1 + 비율) + 유예 (인스턴스가 죽으면 이후 다른 요청이 이어받음)
+MATCHING_JOB_MAX_SLICES = int(os.getenv('MATCHING_JOB_MAX_SLICES', '10'))  # 작업 하나가 체크포인트로 이어서 실행할 최대 횟수
+
+class MatchingJob:
+    """matching_checkpoints 테이블의 kind='job' 행으로 저장되는 매칭 작업 (단계별 진행 상황을 순번이 붙은 이벤트로 기록)
+
+    advance()는 임대(lease)를 얻은 경우에만 run_matching을 한 번(시간 예산 한 조각) 실행하고,
+    시간 예산을 넘기면 이어받기 토큰을 저장해 다음 advance()가 그 지점부터 이어서 실행한다.
+    """
+
+    def __init__(self, job_id=None, state=None, updated_at=None):
+        self.id = job_id or uuid.uuid4().hex
+        self.state = state or {
+            'status': 'queued',  # queued → running → succeeded / failed
+            'stage': None,
+            'progress': {},  # 단계 -> 최근 진행 데이터
+            'events': [],  # [[순번, 이벤트 이름, 데이터], ...] (최근 MATCHING_JOB_EVENT_HISTORY개)
+            'last_seq': 0,
+            'result': None,
+            'status_code': None,
+            'created_at': time.time(),
+            'finished_at': None,
+            'continuation_token': None,
+            'time_budget': None,
+            'slices': 0,
+            'lease_until': 0
+        }
+        self.updated_at = updated_at  # 마지막으로 읽거나 쓴 행의 updated_at (임대 획득 시 낙관적 잠금에 사용)
+        self.last_saved_at = 0.0
+        self.lock = threading.RLock()
+
+    @classmethod
+    def _from_row(cls, row):
+        state = row['state'] if isinstance(row['state'], dict) else json.loads(row['state'])
+        return cls(row['id'], state, row.get('updated_at'))
+
+    @classmethod
+    def load(cls, job_id):
+        """작업 ID로 조회 (없으면 None)"""
+        response = supabase.table('matching_checkpoints').select('*').eq('id', job_id).eq('kind', 'job').execute()
+        return cls._from_row(response.data[0]) if response.data else None
+
+    @classmethod
+    def recent(cls, limit=MATCHING_JOB_HISTORY):
+        """최근 작업 목록 (최신순)"""
+        response = supabase.table('matching_checkpoints').select('*').eq('kind', 'job').order(
+            'created_at', desc=True
+        ).limit(limit).execute()
+        return [cls._from_row(row) for row in response.data or []]
+
+    @classmethod
+    def active(cls):
+        """끝나지 않은 가장 최근 작업 (없으면 None)"""
+        response = supabase.table('matching_checkpoints').select('*').eq('kind', 'job').in_(
+            'status', ['queued', 'running']
+        ).order('created_at', desc=True).limit(1).execute()
+        return cls._from_row(response.data[0]) if response.data else None
+
+    @classmethod
+    def prune(cls, keep=MATCHING_JOB_HISTORY):
+        """오래된 완료 작업 행 삭제"""
+        response = supabase.table('matching_checkpoints').select('id, status').eq('kind', 'job').order(
+            'created_at', desc=True
+        ).range(keep, keep + SUPABASE_PAGE_SIZE - 1).execute()
+        old_ids = [row['id'] for row in response.data or [] if row['status'] not in ('queued', 'running')]
+        for start in range(0, len(old_ids), SUPABASE_IN_FILTER_CHUNK):
+            supabase.table('matching_checkpoints').delete().in_('id', old_ids[start:start + SUPABASE_IN_FILTER_CHUNK]).execute()
+
+    @property
+    def status(self):
+        return self.state['status']
+
+    @property
+    def finished(self):
+        return self.status in ('succeeded', 'failed')
+
+    def _row(self, state, updated_at):
+        return {'state': state, 'status': state['status'], 'updated_at': updated_at}
+
+    def create(self):
+        updated_at = datetime.now().isoformat()
+        with self.lock:
+            row = self._row(json.loads(json.dumps(self.state)), updated_at)
+        supabase.table('matching_checkpoints').insert({
+            'id': self.id, 'kind': 'job', 'created_at': updated_at, **row
+        }).execute()
+        self.updated_at = updated_at
+        self.last_saved_at = time.time()
+
+    def save(self):
+        updated_at = datetime.now().isoformat()
+        with self.lock:
+            state = json.loads(json.dumps(self.state))  # 저장하는 동안 다른 배치가 바꾸지 않도록 복사본 사용
+        try:
+            supabase.table('matching_checkpoints').update(self._row(state, updated_at)).eq('id', self.id).execute()
+            self.updated_at = updated_at
+            self.last_saved_at = time.time()
+        except Exception as e:
+            print(f"⚠️ 매칭 작업 상태 저장 실패 ({self.id}): {e}")
+
+    def refresh(self):
+        """저장된 최신 상태 다시 읽기 → 작업이 아직 있으면 True"""
+        latest = MatchingJob.load(self.id)
+        if latest is None:
+            return False
+        with self.lock:
+            self.state, self.updated_at = latest.state, latest.updated_at
+        return True
+
+    def _emit(self, event, data):
+        with self.lock:
+            self.state['last_seq'] += 1
+            self.state['events'].append([self.state['last_seq'], event, data])
+            del self.state['events'][:-MATCHING_JOB_EVENT_HISTORY]
+
+    def report(self, stage, **data):
+        """run_matching의 progress_callback"""
+        with self.lock:
+            self.state['stage'] = stage
+            self.state['progress'][stage] = data
+        self._emit('progress', {'stage': stage, **data})
+        if time.time() - self.last_saved_at >= MATCHING_JOB_SAVE_INTERVAL:
+            self.save()
+
+    def _claim(self, time_budget):
+        """조각 실행 임대 획득 (다른 요청이 실행 중이거나 그사이 상태가 바뀌었으면 False)"""
+        now = time.time()
+        with self.lock:
+            if self.finished or self.state.get('lease_until', 0) > now:
+                return False
+            state = json.loads(json.dumps(self.state))
+        state['lease_until'] = now + time_budget * (1 + MATCHING_JOB_LEASE_MARGIN_RATIO) + MATCHING_TIMEOUT_GRACE
+        if state['status'] == 'queued':
+            state['status'] = 'running'
+        updated_at = datetime.now().isoformat()
+        # 읽은 뒤 아무도 행을 바꾸지 않았을 때만 갱신되도록 updated_at을 조건으로 사용
+        query = supabase.table('matching_checkpoints').update(self._row(state, updated_at)).eq('id', self.id)
+        if self.updated_at:
+            query = query.eq('updated_at', self.updated_at)
+        if not query.execute().data:
+            return False
+        with self.lock:
+            started = self.state['status'] == 'queued'
+            self.state = state
+        self.updated_at = updated_at
+        self.last_saved_at = time.time()
+        if started:
+            self._emit('status', {'status': 'running'})
+        return True
+
+    def advance(self):
+        """시간 예산 한 조각만큼 실행 → 이번 호출에서 실행했으면 True (이미 끝났거나 다른 요청이 실행 중이면 False)"""
+        # 요청에서 지정한 예산도 조각 예산을 넘지 않게 제한 (플랫폼 실행 시간 제한 안에서 체크포인트 저장)
+        time_budget = min(self.state.get('time_budget') or MATCHING_JOB_SLICE_BUDGET, MATCHING_JOB_SLICE_BUDGET)
+        try:
+            if not self._claim(time_budget):
+                return False
+        except Exception as e:
+            print(f"⚠️ 매칭 작업 {self.id} 임대 실패: {e}")
+            return False
+
+        try:
+            result, status_code = run_matching(self.report, self.state.get('continuation_token'), time_budget)
+        except Exception as e:
+            print(f"❌ 매칭 작업 {self.id} 실행 오류: {e}")
+            result, status_code = {'success': False, 'error': str(e), 'error_type': type(e).__name__}, 500
+
+        with self.lock:
+            self.state['slices'] += 1
+            slices = self.state['slices']
+        if status_code == 202 and slices < MATCHING_JOB_MAX_SLICES:
+            # 시간 예산을 넘김: 체크포인트 토큰을 저장하고 임대를 풀어 다음 요청이 이어서 실행
+            with self.lock:
+                self.state['continuation_token'] = result['continuation_token']
+                self.state['lease_until'] = 0
+            self.report('checkpoint', continuation_token=result['continuation_token'])
+            self.save()
+            print(f"⏸️ 매칭 작업 {self.id} 조각 {slices} 완료, 다음 호출에서 이어서 실행")
+        else:
+            self.finish(result, status_code)
+            print(f"🏁 매칭 작업 {self.id} 종료: {self.status}")
+        return True
+
+    def finish(self, result, status_code):
+        with self.lock:
+            self.state['result'] = result
+            self.state['status_code'] = status_code
+            self.state['status'] = 'succeeded' if status_code < 400 else 'failed'
+            self.state['finished_at'] = time.time()
+            self.state['lease_until'] = 0
+        self._emit('done', self.to_dict())
+        self.save()
+
+    def events_after(self, last_seq):
+        """last_seq 이후 이벤트 목록"""
+        with self.lock:
+            return [tuple(event) for event in self.state['events'] if event[0] > last_seq]
+
+    def to_dict(self):
+        with self.lock:
+            state = self.state
+            return {
+                'job_id': self.id,
+                'status': state['status'],
+                'stage': state['stage'],
+                'progress': dict(state['progress']),
+                'slices': state['slices'],
+                'created_at': datetime.fromtimestamp(state['created_at']).isoformat(),
+                'finished_at': datetime.fromtimestamp(state['finished_at']).isoformat() if state['finished_at'] else None,
+                'status_code': state['status_code'],
+                'result': state['result']
+            }
+
+def _run_matching_job_locally(job):
+    """로컬 개발용 실행기: 작업이 끝날 때까지 이 프로세스의 스레드에서 조각을 이어서 실행"""
+    try:
+        while not job.finished:
+            if not job.advance():
+                # 다른 요청이 조각을 실행 중이면 잠시 후 저장된 상태를 다시 확인
+                time.sleep(MATCHING_JOB_POLL_INTERVAL)
+                if not job.refresh():
+                    return
+    except Exception as e:
+        print(f"❌ 매칭 작업 {job.id} 로컬 실행 오류: {e}")
+
+def start_matching_job(continuation_token=None, time_budget=None):
+    """매칭 작업 생성 → (작업, 새로 시작했는지) (이미 진행 중이면 그 작업 반환)
+
+    MATCHING_JOB_RUNNER가 'thread'(로컬 개발 기본값)이면 바로 스레드에서 끝까지 실행하고,
+    'request'(Vercel 기본값)이면 advance 요청이나 크론 호출이 한 조각씩 진행한다.
+    """
+    active_job = MatchingJob.active()
+    if active_job is not None:
+        return active_job, False
+
+    job = MatchingJob()
+    job.state['continuation_token'] = continuation_token
+    job.state['time_budget'] = time_budget
+    job.create()
+    try:
+        MatchingJob.prune()
+    except Exception as e:
+        print(f"⚠️ 오래된 매칭 작업 정리 실패: {e}")
+
+    if MATCHING_JOB_RUNNER == 'thread':
+        threading.Thread(
+            target=_run_matching_job_locally,
+            args=(job,),
+            name=f'matching-{job.id[:8]}',
+            daemon=True
+        ).start()
+    return job, True
+
+@app.route('/admin/matching', methods=['POST'])
+def perform_matching():
+    # 로컬 개발 환경에서 세션 체크 우회 (디버깅용)
+    if os.getenv('FLASK_ENV') == 'development':
+        print("🔧 개발 환경에서 세션 체크 우회")
+    elif not session.get('logged_in'):
+        return jsonify({'error': '로그인이 필요합니다'}), 401
+
+    # 이어받기 토큰과 호출당 시간 예산 (쿼리 또는 JSON 본문)
+    body = request.get_json(silent=True) or {}
+    continuation_token = request.args.get('continuation_token') or body.get('continuation_token')
+    time_budget = request.args.get('time_budget', type=float) or body.get('time_budget')
+
+    # ?sync=1이면 요청 안에서 실행 (시간 예산을 넘기면 202 + continuation_token 반환)
+    if request.args.get('sync') == '1':
+        result, status_code = run_matching(continuation_token=continuation_token, time_budget=time_budget)
+        return jsonify(result), status_code
+
+    try:
+        job, created = start_matching_job(continuation_token, time_budget)
+    except Exception as e:
+        print(f"❌ 매칭 작업 생성 실패: {e}")
+        return jsonify({'success': False, 'error': f'매칭 작업 생성 실패: {e}'}), 500
+    response = {
+        'success': created,
+        'job_id': job.id,
+        'status': job.status,
+        'runner': MATCHING_JOB_RUNNER,
+        'status_url': url_for('get_matching_job', job_id=job.id),
+        'events_url': url_for('stream_matching_job_events', job_id=job.id),
+        'advance_url': url_for('advance_matching_job', job_id=job.id)
+    }
+    if not created:
+        response['error'] = '이미 진행 중인 매칭 작업이 있습니다'
+        return jsonify(response), 409
+    return jsonify(response), 202
+
+@app.route('/admin/matching/jobs')
+def list_matching_jobs():
+    """최근 매칭 작업 목록 (결과 본문 제외)"""
+    if not session.get('logged_in'):
+        return jsonify({'error': '로그인이 필요합니다'}), 401
+
+    summaries = []
+    for job in MatchingJob.recent():
+        summary = job.to_dict()
+        summary.pop('result')
+        summaries.append(summary)
+    return jsonify({'success': True, 'jobs': summaries})
+
+@app.route('/admin/matching/jobs/<job_id>')
+def get_matching_job(job_id):
+    """매칭 작업 상태 조회 (완료 시 결과 포함)"""
+    if not session.get('logged_in'):
+        return jsonify({'error': '로그인이 필요합니다'}), 401
+
+    job = MatchingJob.load(job_id)
+    if job is None:
+        return jsonify({'error': '매칭 작업을 찾을 수 없습니다'}), 404
+    return jsonify({'success': True, **job.to_dict()})
+
+@app.route('/admin/matching/jobs/<job_id>/advance', methods=['POST'])
+def advance_matching_job(job_id):
+    """매칭 작업을 시간 예산 한 조각만큼 진행 (다른 요청이 실행 중이면 advanced=false)"""
+    if not session.get('logged_in'):
+        return jsonify({'error': '로그인이 필요합니다'}), 401
+
+    job = MatchingJob.load(job_id)
+    if job is None:
+        return jsonify({'error': '매칭 작업을 찾을 수 없습니다'}), 404
+    advanced = job.advance()
+    return jsonify({'success': True, 'advanced': advanced, **job.to_dict()})
+
+@app.route('/admin/matching/cron', methods=['GET', 'POST'])
+def advance_matching_job_cron():
+    """크론용: 진행 중인 매칭 작업을 한 조각 진행 (CRON_SECRET이 있으면 Authorization: Bearer 확인)"""
+    cron_secret = os.getenv('CRON_SECRET')
+    if cron_secret:
+        if request.headers.get('Authorization') != f'Bearer {cron_secret}':
+            return jsonify({'error': '인증이 필요합니다'}), 401
+    elif not session.get('logged_in'):
+        return jsonify({'error': '로그인이 필요합니다'}), 401
+
+    # 이전 프로세스가 전송하지 못하고 남긴 매칭 알림도 함께 처리
+    notification_dispatcher.recover()
+
+    job = MatchingJob.active()
+    if job is None:
+        return jsonify({'success': True, 'job_id': None, 'advanced': False})
+    advanced = job.advance()
+    return jsonify({'success': True, 'job_id': job.id, 'advanced': advanced, 'status': job.status, 'stage': job.state['stage']})
+
+@app.route('/admin/matching/jobs/<job_id>/events')
+def stream_matching_job_events(job_id):
+    """매칭 작업 진행 이벤트 스트림 (Server-Sent Events, Last-Event-ID로 이어받기)
+
+    저장된 작업 행을 주기적으로 다시 읽어 새 이벤트를 보내므로 작업을 실행하는 인스턴스와 달라도 된다.
+    """
+    if not session.get('logged_in'):
+        return jsonify({'error': '로그인이 필요합니다'}), 401
+
+    job = MatchingJob.load(job_id)
+    if job is None:
+        return jsonify({'error': '매칭 작업을 찾을 수 없습니다'}), 404
+
+    try:
+        last_seq = int(request.headers.get('Last-Event-ID') or request.args.get('last_event_id') or 0)
+    except ValueError:
+        last_seq = 0
+
+    def generate(last_seq):
+        stream_started_at = last_sent_at = time.time()
+        while True:
+            for seq, event, data in job.events_after(last_seq):
+                yield f"id: {seq}\nevent: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+                last_seq = seq
+                last_sent_at = time.time()
+            if job.finished:
+                return
+            # 오래 열린 연결은 닫고 클라이언트가 Last-Event-ID로 다시 연결하게 함
+            if time.time() - stream_started_at > MATCHING_JOB_SSE_MAX_DURATION:
+                return
+            if time.time() - last_sent_at >= MATCHING_JOB_SSE_KEEPALIVE:
+                yield ': keepalive\n\n'
+                last_sent_at = time.time()
+            time.sleep(MATCHING_JOB_POLL_INTERVAL)
+            try:
+                if not job.refresh():
+                    return
+            except Exception as e:
+                print(f"⚠️ 매칭 작업 {job.id} 상태 조회 실패: {e}")
+
+    return Response(generate(last_seq), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+# 관리자 매칭 결과 조회 페이지 크기
+MATCHING_RESULTS_PAGE_SIZE = 500
+MATCHING_RESULTS_MAX_PAGE_SIZE = 1000
 
 @app.route('/admin/matching/results')
 def get_matching_results():
+    """매칭 결과 조회 (커서 기반 페이지네이션, 사용자 정보는 한 번에 일괄 조회)"""
     # 로컬 개발 환경에서 세션 체크 우회 (디버깅용)
     import os
     if os.getenv('FLASK_ENV') == 'development':
@@ -1721,52 +4441,64 @@ def get_matching_results():
     elif not session.get('logged_in'):
         return jsonify({'error': '로그인이 필요합니다'}), 401
 
+    # 페이지 크기와 커서 파싱 (커서: "점수:ID" - 마지막으로 받은 항목)
     try:
-        print("🔍 매칭 결과 조회 시작")
-        
-        # Supabase에서 매칭 결과 조회 (모든 결과 조회)
-        matches_response = supabase.table('matches').select('*').order('compatibility_score', desc=True).order('created_at', desc=True).execute()
-        
-        print(f"📊 조회된 매칭 결과: {len(matches_response.data)}개")
+        limit = max(1, min(int(request.args.get('limit', MATCHING_RESULTS_PAGE_SIZE)), MATCHING_RESULTS_MAX_PAGE_SIZE))
+        cursor = request.args.get('cursor')
+        cursor_score, cursor_id = (int(part) for part in cursor.split(':')) if cursor else (None, None)
+    except ValueError:
+        return jsonify({'error': '잘못된 페이지 요청입니다'}), 400
 
+    try:
+        print(f"🔍 매칭 결과 조회 시작 (limit={limit}, cursor={cursor})")
+        
+        # 1) 매칭 한 페이지 조회 (점수 내림차순, 같은 점수는 ID 내림차순)
+        # 전체 개수는 첫 페이지(커서 없음)에서만 집계 (이후 페이지마다 전체를 다시 세지 않도록)
+        query = supabase.table('matches').select('*', count=None if cursor else 'exact')
+        if cursor:
+            query = query.or_(f'compatibility_score.lt.{cursor_score},and(compatibility_score.eq.{cursor_score},id.lt.{cursor_id})')
+        matches_response = query.order('compatibility_score', desc=True).order('id', desc=True).limit(limit + 1).execute()
+
+        page = matches_response.data[:limit]
+        has_more = len(matches_response.data) > limit
+        print(f"📊 조회된 매칭 결과: {len(page)}개" + ('' if cursor else f" (전체 {matches_response.count}개)"))
+
+        # 2) 페이지에 등장하는 사용자 정보를 한 번에 조회하여 메모리에서 조인
+        user_ids = {match['user1_id'] for match in page} | {match['user2_id'] for match in page}
+        users_by_id = fetch_users_by_ids(user_ids, 'id, name, mbti, instagram_id')
+
+        unknown_user = {'name': 'Unknown', 'mbti': '', 'instagram_id': ''}
         results = []
-        for match in matches_response.data:
-            try:
-                # 각 사용자 정보를 개별적으로 조회
-                user1_response = supabase.table('results').select('name, mbti, instagram_id').eq('id', match['user1_id']).execute()
-                user2_response = supabase.table('results').select('name, mbti, instagram_id').eq('id', match['user2_id']).execute()
-
-                user1_data = user1_response.data[0] if user1_response.data else {'name': 'Unknown', 'mbti': '', 'instagram_id': ''}
-                user2_data = user2_response.data[0] if user2_response.data else {'name': 'Unknown', 'mbti': '', 'instagram_id': ''}
-
-                results.append({
-                    'id': match['id'],
-                    'compatibility_score': match['compatibility_score'],
-                    'matching_reason': match['matching_reason'] if match['matching_reason'] else '',
-                    'created_at': match['created_at'],
-                    'user1': {
-                        'name': user1_data.get('name', 'Unknown'),
-                        'mbti': user1_data.get('mbti', ''),
-                        'instagram': user1_data.get('instagram_id', '')
-                    },
-                    'user2': {
-                        'name': user2_data.get('name', 'Unknown'),
-                        'mbti': user2_data.get('mbti', ''),
-                        'instagram': user2_data.get('instagram_id', '')
-                    }
-                })
-            except Exception as item_error:
-                print(f"⚠️ 매칭 항목 처리 오류: {item_error}")
-                continue
+        for match in page:
+            user1_data = users_by_id.get(match['user1_id'], unknown_user)
+            user2_data = users_by_id.get(match['user2_id'], unknown_user)
+            results.append({
+                'id': match['id'],
+                'compatibility_score': match['compatibility_score'],
+                'matching_reason': match['matching_reason'] if match['matching_reason'] else '',
+                'created_at': match['created_at'],
+                'user1': {
+                    'name': user1_data.get('name', 'Unknown'),
+                    'mbti': user1_data.get('mbti', ''),
+                    'instagram': user1_data.get('instagram_id', '')
+                },
+                'user2': {
+                    'name': user2_data.get('name', 'Unknown'),
+                    'mbti': user2_data.get('mbti', ''),
+                    'instagram': user2_data.get('instagram_id', '')
+                }
+            })
+
+        next_cursor = f"{page[-1]['compatibility_score']}:{page[-1]['id']}" if has_more else None
 
         print(f"✅ 매칭 결과 처리 완료: {len(results)}개")
-        return jsonify({'matches': results})
+        return jsonify({'matches': results, 'next_cursor': next_cursor, 'total_count': matches_response.count})
 
     except Exception as e:
         print(f"❌ 매칭 결과 조회 오류: {e}")
         # 간단한 대체 조회 시도
         try:
-            matches_response = supabase.table('matches').select('*').execute()
+            matches_response = supabase.table('matches').select('*').order('id', desc=True).limit(limit).execute()
             simple_results = [{
                 'id': m['id'],
                 'compatibility_score': m['compatibility_score'],
@@ -1776,7 +4508,7 @@ def get_matching_results():
                 'user2': {'name': f"User {m['user2_id']}", 'mbti': '', 'instagram': ''}
             } for m in matches_response.data]
             print(f"🔄 대체 조회 성공: {len(simple_results)}개")
-            return jsonify({'matches': simple_results})
+            return jsonify({'matches': simple_results, 'next_cursor': None})
         except:
             return jsonify({'matches': [], 'error': '매칭 결과를 불러올 수 없습니다'}), 200
 
@@ -1863,36 +4595,68 @@ def link_device_to_user():
     except Exception as e:
         return jsonify({'error': f'디바이스 연결 중 오류 발생: {e}'}), 500
 
+# 매칭 결과 페이지용 인프로세스 캐시 (푸시 알림 직후 몰리는 조회 부하 완화)
+MATCH_PAGE_CACHE_TTL = float(os.getenv('MATCH_PAGE_CACHE_TTL', '30'))  # 초
+_match_page_cache = {}  # user_id -> (만료 시각, 매칭 상대 목록)
+_match_page_cache_lock = threading.Lock()
+
+def invalidate_match_page_cache(user_ids=None):
+    """매칭 결과 페이지 캐시 무효화 (user_ids가 없으면 전체)"""
+    with _match_page_cache_lock:
+        if user_ids is None:
+            _match_page_cache.clear()
+        else:
+            for user_id in user_ids:
+                _match_page_cache.pop(user_id, None)
+
+def get_matched_users(user_id):
+    """사용자의 매칭 상대 목록 조회 (상대방 정보는 한 번에 일괄 조회, 짧은 TTL 캐시)"""
+    now = time.time()
+    with _match_page_cache_lock:
+        cached = _match_page_cache.get(user_id)
+        if cached and cached[0] > now:
+            return cached[1]
+
+    # 사용자의 매칭 결과 조회
+    matches = supabase.table('matches').select('*').or_(
+        f'user1_id.eq.{user_id},user2_id.eq.{user_id}'
+    ).order('compatibility_score', desc=True).execute()
+
+    matches_data = matches.data or []
+    other_user_ids = {
+        match['user2_id'] if match['user1_id'] == user_id else match['user1_id']
+        for match in matches_data
+    }
+    users_by_id = fetch_users_by_ids(other_user_ids, 'id, name, mbti, instagram_id')
+
+    matched_users = []
+    for match in matches_data:
+        # 상대방 정보 찾기
+        other_user_id = match['user2_id'] if match['user1_id'] == user_id else match['user1_id']
+        user_data = users_by_id.get(other_user_id)
+        if user_data:
+            matched_users.append({
+                'id': other_user_id,
+                'name': user_data['name'],
+                'mbti': user_data['mbti'],
+                'instagram_id': user_data['instagram_id'],
+                'compatibility_score': match['compatibility_score'],
+                'matching_reason': match['matching_reason']
+            })
+
+    with _match_page_cache_lock:
+        _match_page_cache[user_id] = (now + MATCH_PAGE_CACHE_TTL, matched_users)
+    return matched_users
+
 @app.route('/matches/<int:user_id>')
 def view_matches(user_id):
     """매칭 결과 조회 페이지"""
     try:
-        # 사용자의 매칭 결과 조회
-        matches = supabase.table('matches').select('*').or_(
-            f'user1_id.eq.{user_id},user2_id.eq.{user_id}'
-        ).order('compatibility_score', desc=True).execute()
+        matched_users = get_matched_users(user_id)
 
-        if not matches.data:
+        if not matched_users:
             return render_template('no_matches.html', user_id=user_id)
 
-        # 매칭 상대 정보 조회
-        matched_users = []
-        for match in matches.data:
-            # 상대방 정보 찾기
-            other_user_id = match['user2_id'] if match['user1_id'] == user_id else match['user1_id']
-
-            user_info = supabase.table('results').select('name, mbti, instagram_id').eq('id', other_user_id).execute()
-            if user_info.data:
-                user_data = user_info.data[0]
-                matched_users.append({
-                    'id': other_user_id,
-                    'name': user_data['name'],
-                    'mbti': user_data['mbti'],
-                    'instagram_id': user_data['instagram_id'],
-                    'compatibility_score': match['compatibility_score'],
-                    'matching_reason': match['matching_reason']
-                })
-
         return render_template('matches.html',
                              user_id=user_id,
                              matches=matched_users)
@@ -2046,6 +4810,8 @@ def analyze_saju():
     except Exception as e:
         return jsonify({"error": f"사주를 계산하는 중 오류 발생: {e}"}), 500
 
+    instant_matches = None
+
     try:
         # 캐시 키 생성 (MBTI만 - 사주 정보는 동적으로 채움)
         analysis_cache_key = mbti
@@ -2090,11 +4856,9 @@ MBTI: {mbti}와 잘 맞는 {', '.join(get_compatible_mbti_examples(mbti)[:3])} 
 
 행복한 연애 하시길 바래요! 💕"""
 
-            # 캐시에 저장 및 파일에 저장
-            saju_analysis_cache[analysis_cache_key] = ai_response
-            print(f"💾 캐시 메모리 저장 완료 (크기: {len(saju_analysis_cache)})")
-            save_saju_cache(saju_analysis_cache)
-            print(f"💾 사주 분석 결과 파일에 저장: {name} (키: {analysis_cache_key})")
+            # 캐시에 저장 (SQLite 저장은 백그라운드에서 모아서 처리)
+            saju_analysis_cache.put(analysis_cache_key, ai_response)
+            print(f"💾 사주 분석 결과 캐시 저장 예약: {name} (키: {analysis_cache_key})")
 
         # 학번 중복 체크 및 데이터 저장
         try:
@@ -2147,6 +4911,20 @@ MBTI: {mbti}와 잘 맞는 {', '.join(get_compatible_mbti_examples(mbti)[:3])} 
             # 사용자 ID 저장 (푸시 알림 연결용)
             user_id = insert_response.data[0]['id'] if insert_response.data else None
 
+            # 매칭 후보 인덱스에 등록 (매칭 전이므로 is_matched=False, 매칭 저장 후 기존 후보가 됨)
+            if user_id is not None:
+                try:
+                    candidate_index.upsert_users([{**data_to_insert, 'id': user_id}], is_matched=False)
+                except Exception as index_error:
+                    print(f"⚠️ 매칭 후보 인덱스 등록 실패: {index_error}")
+
+            # 즉시 매칭 모드: 룰 기반 임시 매칭을 바로 응답에 포함 (AI 분석은 백그라운드)
+            if INSTANT_MATCHING and user_id is not None:
+                try:
+                    instant_matches = start_instant_matching({**data_to_insert, 'id': user_id})
+                except Exception as instant_error:
+                    print(f"⚠️ 즉시 매칭 실패 (관리자 매칭에서 처리): {instant_error}")
+
         except Exception as e:
             print(f"Supabase 저장 중 오류 발생: {e}")
             return jsonify({"error": f"데이터 저장 중 오류가 발생했습니다: {e}"}), 500
@@ -2154,16 +4932,25 @@ MBTI: {mbti}와 잘 맞는 {', '.join(get_compatible_mbti_examples(mbti)[:3])} 
     except Exception as e:
         return jsonify({"error": f"Gemini API 처리 중 오류 발생: {e}"}), 500
 
-    return jsonify({
+    response_data = {
         "saju_result": saju_text,
         "ai_analysis": ai_response,
         "user_id": user_id
-    })
+    }
+    if instant_matches is not None:
+        response_data["instant_matches"] = instant_matches
+    return jsonify(response_data)
 
 # Vercel에서 사용할 WSGI 애플리케이션 (파일 끝의 app 객체를 사용)
 
 # 로컬 개발용 코드 (Vercel에서는 실행되지 않음)
 if __name__ == '__main__':
+    # python api/index.py schema → Supabase SQL 에디터에서 실행할 테이블 생성 쿼리 출력
+    if sys.argv[1:] == ['schema']:
+        init_supabase_tables()
+        sys.exit(0)
+
+    print_env_summary()
     print("🚀 로컬 개발 서버 시작...")
     print(f"📍 FLASK_ENV: {os.getenv('FLASK_ENV', 'production')}")
     print(f"🔗 서버 주소: http://localhost:5000")
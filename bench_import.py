@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+api/index.py 콜드 스타트(모듈 import 시간) 벤치마크
+
+`python -X importtime`으로 새 프로세스에서 index를 여러 번 import해 최솟값을 재고,
+예산(--budget-ms)을 넘으면 종료 코드 1을 반환한다. --compare로 이전 커밋과 비교할 수 있다.
+
+사용법:
+    python bench_import.py
+    python bench_import.py --budget-ms 300 --compare HEAD~1
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+API_DIR = os.path.join(PROJECT_ROOT, 'api')
+HEAVY_MODULES = ('google.generativeai', 'supabase', 'pywebpush', 'py_vapid', 'requests')
+
+def measure_import(api_dir, runs):
+    """api_dir의 index를 runs번 import → (최소 누적 시간 ms, 가장 빠른 실행의 모듈별 누적 시간 us)"""
+    # 이전 버전은 import 시 Supabase 환경변수를 요구하므로 형식만 맞춘 임시 값을 넣음
+    env = dict(os.environ)
+    env.setdefault('SUPABASE_URL', 'http://localhost')
+    env.setdefault('SUPABASE_ANON_KEY', 'eyJhbGciOiJIUzI1NiJ9.e30.benchmark')
+
+    best = None
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', 'import index'],
+            cwd=api_dir, env=env, capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            raise SystemExit(f"❌ import 실패 ({api_dir}):\n{result.stderr[-2000:]}")
+
+        modules = {}
+        for line in result.stderr.splitlines():
+            if not line.startswith('import time:') or 'cumulative' in line:
+                continue
+            _, cumulative, name = line[len('import time:'):].split('|')
+            modules[name.strip()] = int(cumulative)
+        total_ms = modules['index'] / 1000
+        if best is None or total_ms < best[0]:
+            best = (total_ms, modules)
+    return best
+
+def print_report(label, total_ms, modules):
+    loaded = [name for name in HEAVY_MODULES if name in modules]
+    print(f"{label:>8}: {total_ms:7.1f}ms | 무거운 모듈: {', '.join(loaded) if loaded else '없음'}")
+
+def main():
+    parser = argparse.ArgumentParser(description='index 모듈 import 시간 벤치마크')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=400, help='현재 코드의 import 시간 예산 (ms)')
+    parser.add_argument('--compare', metavar='GIT_REF', help='비교할 이전 커밋 (예: HEAD~1)')
+    parser.add_argument('--top', type=int, default=8, help='출력할 느린 모듈 수')
+    args = parser.parse_args()
+
+    total_ms, modules = measure_import(API_DIR, args.runs)
+    print_report('현재', total_ms, modules)
+    top_level = sorted(((cumulative, name) for name, cumulative in modules.items() if '.' not in name and name != 'index'),
+                       reverse=True)[:args.top]
+    print("   느린 모듈: " + ', '.join(f"{name} {cumulative / 1000:.0f}ms" for cumulative, name in top_level))
+
+    if args.compare:
+        source = subprocess.run(['git', 'show', f'{args.compare}:api/index.py'], cwd=PROJECT_ROOT,
+                                capture_output=True, text=True, check=True).stdout
+        with tempfile.TemporaryDirectory() as temp_dir:
+            old_api_dir = os.path.join(temp_dir, 'api')
+            shutil.copytree(API_DIR, old_api_dir, ignore=shutil.ignore_patterns('__pycache__', '*.db*'))
+            with open(os.path.join(old_api_dir, 'index.py'), 'w', encoding='utf-8') as f:
+                f.write(source)
+            old_total_ms, old_modules = measure_import(old_api_dir, args.runs)
+        print_report(args.compare, old_total_ms, old_modules)
+        print(f"   차이: {old_total_ms - total_ms:+.1f}ms ({old_total_ms / total_ms:.1f}배)")
+
+    if total_ms > args.budget_ms:
+        print(f"❌ import 시간 {total_ms:.1f}ms가 예산 {args.budget_ms:.0f}ms를 넘었습니다")
+        sys.exit(1)
+    print(f"✅ 예산 {args.budget_ms:.0f}ms 이내")
+
+if __name__ == '__main__':
+    main()
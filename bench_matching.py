@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+1단계 후보 선정 벤치마크: 인당 상위 3명(greedy) vs 용량 제한 전역 배정(flow)
+
+사용법:
+    python bench_matching.py                  # 5000명 × 5000명
+    python bench_matching.py --size 2000 --capacity 2
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'api'))
+
+MBTI_TYPES = [a + b + c + d for a in 'EI' for b in 'SN' for c in 'TF' for d in 'JP']
+SAJU_ELEMENTS = ['목', '화', '토', '금', '수']
+
+def generate_users(count, start_id, rng):
+    """무작위 MBTI와 오행 조합을 가진 가상 사용자 생성"""
+    users = []
+    for i in range(count):
+        elements = [element for element in SAJU_ELEMENTS if rng.random() < 0.6]
+        users.append({
+            'id': start_id + i,
+            'name': f'user{start_id + i}',
+            'mbti': rng.choice(MBTI_TYPES),
+            'saju_result': '/'.join(elements) or '없음'
+        })
+    return users
+
+def run(select, group1, group2, **kwargs):
+    """후보 선정 함수를 실행하고 (소요 시간, 후보 목록) 반환 (모듈 로그는 숨김)"""
+    start = time.time()
+    with contextlib.redirect_stdout(io.StringIO()):
+        candidates = select(group1, group2, **kwargs)
+    return time.time() - start, candidates
+
+def summarize(name, elapsed, candidates, group2):
+    """후보 쌍 수, 룰 점수 합, 상대 그룹 사용자별 후보 집중도 출력"""
+    position = {user['id']: j for j, user in enumerate(group2)}
+    pairs = [(position[user2['id']], score) for items in candidates.values() for user2, score, _ in items]
+    partner_load = np.bincount([j for j, _ in pairs], minlength=len(group2))
+    print(f"{name:>6}: {elapsed:6.2f}초 | 후보 쌍 {len(pairs):6d} | 룰 점수 합 {sum(score for _, score in pairs):9d} | "
+          f"상대 최대 부하 {partner_load.max():4d} | 후보가 된 상대 {np.count_nonzero(partner_load):5d}/{len(group2)}")
+
+def main():
+    parser = argparse.ArgumentParser(description='1단계 후보 선정 벤치마크')
+    parser.add_argument('--size', type=int, default=5000, help='그룹별 사용자 수')
+    parser.add_argument('--capacity', type=int, default=3, help='전역 배정 시 상대 1명당 최대 후보 수')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        import index
+
+    rng = random.Random(args.seed)
+    group1 = generate_users(args.size, 1, rng)
+    group2 = generate_users(args.size, args.size + 1, rng)
+    print(f"📊 {args.size}명 × {args.size}명, 상대 용량 {args.capacity}")
+
+    elapsed, candidates = run(index.select_top_rule_candidates, group1, group2, top_k=3, min_score=70)
+    summarize('greedy', elapsed, candidates, group2)
+    elapsed, candidates = run(index.select_assigned_rule_candidates, group1, group2,
+                              top_k=3, min_score=70, partner_capacity=args.capacity)
+    summarize('flow', elapsed, candidates, group2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+사주 기둥 계산 벤치마크: 1900~2100년 전체 날짜 × 24시간
+
+절기 테이블 이진 탐색으로 계산하는 연주/월주가 배치(NumPy)와 단건 함수에서
+같은 결과를 내는지 확인하고, 양력 1월 1일/양력 월 기준 계산과 달라지는 비율을 출력
+
+사용법:
+    python bench_saju_pillars.py
+    python bench_saju_pillars.py --start 1990 --end 2010 --scalar-sample 50000
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'api'))
+
+def full_range_inputs(start_year, end_year):
+    """start_year~end_year의 모든 날짜 × 0~23시 입력 배열"""
+    days = np.arange(np.datetime64(f'{start_year:04d}-01-01'), np.datetime64(f'{end_year + 1:04d}-01-01'))
+    years = days.astype('datetime64[Y]').astype(np.int64) + 1970
+    months = days.astype('datetime64[M]').astype(np.int64) % 12 + 1
+    dates = (days - days.astype('datetime64[M]')).astype(np.int64) + 1
+    hours = np.tile(np.arange(24), len(days))
+    return np.repeat(years, 24), np.repeat(months, 24), np.repeat(dates, 24), hours
+
+def main():
+    parser = argparse.ArgumentParser(description='사주 기둥 계산 벤치마크')
+    parser.add_argument('--start', type=int, default=1900)
+    parser.add_argument('--end', type=int, default=2100)
+    parser.add_argument('--scalar-sample', type=int, default=200000, help='단건 함수로 비교할 입력 수')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        import index
+
+    years, months, days, hours = full_range_inputs(args.start, args.end)
+    print(f"📊 {args.start}~{args.end}년, 입력 {len(years):,}개 (날짜 × 24시간)")
+
+    start = time.time()
+    pillars = index.calculate_saju_pillars_batch(years, months, days, hours)
+    elapsed = time.time() - start
+    print(f" batch: {elapsed:6.2f}초 ({len(years) / elapsed / 1e6:.1f}M건/초)")
+
+    # 단건 함수는 LRU 캐시를 거치지 않고 측정
+    rng = np.random.default_rng(args.seed)
+    sample = rng.choice(len(years), size=min(args.scalar_sample, len(years)), replace=False)
+    calculate = index.calculate_saju_pillar_indices
+    start = time.time()
+    scalar = [calculate(int(years[i]), int(months[i]), int(days[i]), int(hours[i])) for i in sample]
+    elapsed = time.time() - start
+    print(f"scalar: {elapsed:6.2f}초 ({len(sample) / elapsed / 1e3:.0f}K건/초, 표본 {len(sample):,}개)")
+    mismatches = np.count_nonzero(np.any(pillars[sample] != np.array(scalar, dtype=np.int8), axis=1))
+    print(f"batch/scalar 불일치: {mismatches}건")
+
+    # 양력 기준(1월 1일 해 바뀜, 양력 월) 연주/월주와 비교
+    calendar_gan = (years - 4) % 10
+    calendar_year = (6 * calendar_gan - 5 * ((years - 4) % 12)) % 60
+    calendar_month = ((calendar_gan * 12 + (months - 4) % 12) % 60 + index.MONTH_PILLAR_CYCLE_OFFSET) % 60
+    print(f"양력 기준과 다른 연주: {np.mean(pillars[:, 0] != calendar_year):.1%}, "
+          f"월주: {np.mean(pillars[:, 1] != calendar_month):.1%}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+절기(節) 시각 테이블 생성기 → api/solar_terms.bin
+
+월주/연주 경계로 쓰는 12절(소한, 입춘, 경칩, ... 대설)의 시각을 계산해
+리틀엔디언 int32 배열로 저장한다. 서버는 이 파일을 읽어 이진 탐색만 하므로
+런타임에는 천문 계산을 하지 않는다.
+
+파일 형식:
+    - 값: 1900-01-01 00:00 (KST) 기준 경과 분 (KST = UTC+9)
+    - 순서: 1899년 대설, 이후 1900년 소한 ~ 2100년 대설까지 연도별 12절을 시간순으로
+    - 개수: 1 + 12 × 201 = 2413개 (9,652바이트)
+
+계산 방법 (Meeus, Astronomical Algorithms 25·27장):
+    - 태양 겉보기 황경 = VSOP87 지구 황경(축약 계수) + 180° + FK5 보정 + 장동 + 광행차
+    - 목표 황경에 도달하는 순간을 뉴턴 반복으로 찾고, ΔT(Espenak-Meeus 다항식)로 TT → UT 변환
+    - 정확도는 약 1분 이내 (시 단위로 입력받는 생시 판정에 충분)
+
+사용법:
+    python build_solar_terms.py
+    python build_solar_terms.py --start 1900 --end 2100 --output api/solar_terms.bin
+"""
+
+import argparse
+import math
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+
+# VSOP87 지구 일심 황경 L0~L5, 황위 B0~B1, 거리 R0 축약 계수 (A, B, C): A·cos(B + C·τ)
+VSOP87_L = (
+    (
+        (175347046, 0, 0), (3341656, 4.6692568, 6283.07585), (34894, 4.6261, 12566.1517),
+        (3497, 2.7441, 5753.3849), (3418, 2.8289, 3.5231), (3136, 3.6277, 77713.7715),
+        (2676, 4.4181, 7860.4194), (2343, 6.1352, 3930.2097), (1324, 0.7425, 11506.7698),
+        (1273, 2.0371, 529.691), (1199, 1.1096, 1577.3435), (990, 5.233, 5884.927),
+        (902, 2.045, 26.298), (857, 3.508, 398.149), (780, 1.179, 5223.694),
+        (753, 2.533, 5507.553), (505, 4.583, 18849.228), (492, 4.205, 775.523),
+        (357, 2.92, 0.067), (317, 5.849, 11790.629), (284, 1.899, 796.298),
+        (271, 0.315, 10977.079), (243, 0.345, 5486.778), (206, 4.806, 2544.314),
+        (205, 1.869, 5573.143), (202, 2.458, 6069.777), (156, 0.833, 213.299),
+        (132, 3.411, 2942.463), (126, 1.083, 20.775), (115, 0.645, 0.98),
+        (103, 0.636, 4694.003), (102, 0.976, 15720.839), (102, 4.267, 7.114),
+        (99, 6.21, 2146.17), (98, 0.68, 155.42), (86, 5.98, 161000.69),
+        (85, 1.3, 6275.96), (85, 3.67, 71430.7), (80, 1.81, 17260.15),
+        (79, 3.04, 12036.46), (75, 1.76, 5088.63), (74, 3.5, 3154.69),
+        (74, 4.68, 801.82), (70, 0.83, 9437.76), (62, 3.98, 8827.39),
+        (61, 1.82, 7084.9), (57, 2.78, 6286.6), (56, 4.39, 14143.5),
+        (56, 3.47, 6279.55), (52, 0.19, 12139.55), (52, 1.33, 1748.02),
+        (51, 0.28, 5856.48), (49, 0.49, 1194.45), (41, 5.37, 8429.24),
+        (41, 2.4, 19651.05), (39, 6.17, 10447.39), (37, 6.04, 10213.29),
+        (37, 2.57, 1059.38), (36, 1.71, 2352.87), (36, 1.78, 6812.77),
+        (33, 0.59, 17789.85), (30, 0.44, 83996.85), (30, 2.74, 1349.87),
+        (25, 3.16, 4690.48),
+    ),
+    (
+        (628331966747, 0, 0), (206059, 2.678235, 6283.07585), (4303, 2.6351, 12566.1517),
+        (425, 1.59, 3.523), (119, 5.796, 26.298), (109, 2.966, 1577.344),
+        (93, 2.59, 18849.23), (72, 1.14, 529.69), (68, 1.87, 398.15),
+        (67, 4.41, 5507.55), (59, 2.89, 5223.69), (56, 2.17, 155.42),
+        (45, 0.4, 796.3), (36, 0.47, 775.52), (29, 2.65, 7.11),
+        (21, 5.34, 0.98), (19, 1.85, 5486.78), (19, 4.97, 213.3),
+        (17, 2.99, 6275.96), (16, 0.03, 2544.31), (16, 1.43, 2146.17),
+        (15, 1.21, 10977.08), (12, 2.83, 1748.02), (12, 3.26, 5088.63),
+        (12, 5.27, 1194.45), (12, 2.08, 4694.0), (11, 0.77, 553.57),
+        (10, 1.3, 6286.6), (10, 4.24, 1349.87), (9, 2.7, 242.73),
+        (9, 5.64, 951.72), (8, 5.3, 2352.87), (6, 2.65, 9437.76),
+        (6, 4.67, 4690.48),
+    ),
+    (
+        (52919, 0, 0), (8720, 1.0721, 6283.0758), (309, 0.867, 12566.152),
+        (27, 0.05, 3.52), (16, 5.19, 26.3), (16, 3.68, 155.42),
+        (10, 0.76, 18849.23), (9, 2.06, 77713.77), (7, 0.83, 775.52),
+        (5, 4.66, 1577.34), (4, 1.03, 7.11), (4, 3.44, 5573.14),
+        (3, 5.14, 796.3), (3, 6.05, 5507.55), (3, 1.19, 242.73),
+        (3, 6.12, 529.69), (3, 0.31, 398.15), (3, 2.28, 553.57),
+        (2, 4.38, 5223.69), (2, 3.75, 0.98),
+    ),
+    (
+        (289, 5.844, 6283.076), (35, 0, 0), (17, 5.49, 12566.15),
+        (3, 5.2, 155.42), (1, 4.72, 3.52), (1, 5.3, 18849.23),
+        (1, 5.97, 242.73),
+    ),
+    (
+        (114, 3.142, 0), (8, 4.13, 6283.08), (1, 3.84, 12566.15),
+    ),
+    (
+        (1, 3.14, 0),
+    ),
+)
+VSOP87_B = (
+    ((280, 3.199, 84334.662), (102, 5.422, 5507.553), (80, 3.88, 5223.69),
+     (44, 3.7, 2352.87), (32, 4.0, 1577.34)),
+    ((9, 3.9, 5507.55), (6, 1.73, 5223.69)),
+)
+VSOP87_R0 = (
+    (100013989, 0, 0), (1670700, 3.0984635, 6283.07585), (13956, 3.05525, 12566.1517),
+    (3084, 5.1985, 77713.7715), (1628, 1.1739, 5753.3849), (1576, 2.8469, 7860.4194),
+)
+
+# 12절 이름과 태양 황경 (소한 285° 부터 30°씩)
+JEOL_NAMES = ('소한', '입춘', '경칩', '청명', '입하', '망종', '소서', '입추', '백로', '한로', '입동', '대설')
+JEOL_LONGITUDES = tuple((285 + 30 * k) % 360 for k in range(12))
+JEOL_APPROX_DAYS = (5, 35, 64, 94, 125, 156, 187, 219, 250, 281, 311, 341)  # 1월 1일 기준 대략적인 날짜 (초기값)
+
+KST_OFFSET_HOURS = 9
+EPOCH_JD_KST = 2415020.5 - KST_OFFSET_HOURS / 24  # 1900-01-01 00:00 KST의 율리우스일 (UT)
+
+def vsop_series(series, tau):
+    """VSOP87 급수 합 (Σ τ^i Σ A·cos(B + C·τ))"""
+    return sum(
+        sum(a * math.cos(b + c * tau) for a, b, c in terms) * tau ** power
+        for power, terms in enumerate(series)
+    )
+
+def apparent_solar_longitude(jde):
+    """JDE(역학시) → 태양의 겉보기 황경 (도)"""
+    tau = (jde - 2451545.0) / 365250.0
+    t = tau * 10
+
+    longitude = math.degrees(vsop_series(VSOP87_L, tau) / 1e8) + 180
+    latitude = -math.degrees(vsop_series(VSOP87_B, tau) / 1e8)
+    radius = vsop_series((VSOP87_R0,), tau) / 1e8
+
+    # FK5 좌표계 보정
+    fk5_longitude = longitude - 1.397 * t - 0.00031 * t * t
+    longitude += (-0.09033 + 0.03916 * (math.cos(math.radians(fk5_longitude)) + math.sin(math.radians(fk5_longitude)))
+                  * math.tan(math.radians(latitude))) / 3600
+
+    # 황경 장동 (Meeus 22장 저정밀 식)
+    omega = math.radians(125.04452 - 1934.136261 * t)
+    sun_mean = math.radians(280.4665 + 36000.7698 * t)
+    moon_mean = math.radians(218.3165 + 481267.8813 * t)
+    nutation = (-17.20 * math.sin(omega) - 1.32 * math.sin(2 * sun_mean)
+                - 0.23 * math.sin(2 * moon_mean) + 0.21 * math.sin(2 * omega)) / 3600
+
+    # 광행차
+    aberration = -20.4898 / radius / 3600
+
+    return (longitude + nutation + aberration) % 360
+
+def delta_t_seconds(year):
+    """ΔT = TT - UT (초), Espenak-Meeus 다항식 (1900~2150)"""
+    if year < 1920:
+        t = year - 1900
+        return -2.79 + 1.494119 * t - 0.0598939 * t ** 2 + 0.0061966 * t ** 3 - 0.000197 * t ** 4
+    if year < 1941:
+        t = year - 1920
+        return 21.20 + 0.84493 * t - 0.076100 * t ** 2 + 0.0020936 * t ** 3
+    if year < 1961:
+        t = year - 1950
+        return 29.07 + 0.407 * t - t ** 2 / 233 + t ** 3 / 2547
+    if year < 1986:
+        t = year - 1975
+        return 45.45 + 1.067 * t - t ** 2 / 260 - t ** 3 / 718
+    if year < 2005:
+        t = year - 2000
+        return (63.86 + 0.3345 * t - 0.060374 * t ** 2 + 0.0017275 * t ** 3
+                + 0.000651814 * t ** 4 + 0.00002373599 * t ** 5)
+    if year < 2050:
+        t = year - 2000
+        return 62.92 + 0.32217 * t + 0.005589 * t ** 2
+    return -20 + 32 * ((year - 1820) / 100) ** 2 - 0.5628 * (2150 - year)
+
+def find_solar_term_jd(year, term_index):
+    """year년 term_index번째 절(0=소한)의 시각 → 율리우스일 (UT)"""
+    target = JEOL_LONGITUDES[term_index]
+    jde = 2415020.5 + (datetime(year, 1, 1) - datetime(1900, 1, 1)).days + JEOL_APPROX_DAYS[term_index]
+    for _ in range(20):
+        difference = (target - apparent_solar_longitude(jde) + 180) % 360 - 180
+        jde += difference * 365.2422 / 360
+        if abs(difference) < 1e-7:
+            break
+    return jde - delta_t_seconds(year + term_index / 12) / 86400
+
+def jd_to_kst_minutes(jd):
+    """율리우스일 (UT) → 1900-01-01 00:00 KST 기준 경과 분"""
+    return int(round((jd - EPOCH_JD_KST) * 1440))
+
+def build_table(start_year, end_year):
+    """(start_year - 1)년 대설 + start_year~end_year 연도별 12절 시각 배열"""
+    minutes = [jd_to_kst_minutes(find_solar_term_jd(start_year - 1, 11))]
+    for year in range(start_year, end_year + 1):
+        for term_index in range(12):
+            minutes.append(jd_to_kst_minutes(find_solar_term_jd(year, term_index)))
+    return np.array(minutes, dtype='<i4')
+
+def format_minutes(minutes):
+    """경과 분 → 'YYYY-MM-DD HH:MM' (KST)"""
+    return (datetime(1900, 1, 1) + timedelta(minutes=int(minutes))).strftime('%Y-%m-%d %H:%M')
+
+def main():
+    parser = argparse.ArgumentParser(description='절기 시각 테이블 생성')
+    parser.add_argument('--start', type=int, default=1900)
+    parser.add_argument('--end', type=int, default=2100)
+    parser.add_argument('--output', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'api', 'solar_terms.bin'))
+    args = parser.parse_args()
+
+    table = build_table(args.start, args.end)
+    if np.any(np.diff(table.astype(np.int64)) <= 0):
+        raise SystemExit("❌ 절기 시각이 시간순이 아닙니다")
+
+    table.tofile(args.output)
+    print(f"✅ {args.start}~{args.end}년 절기 {len(table)}개 저장: {args.output} ({table.nbytes:,}바이트)")
+    for year in (args.start, 2000, 2024, 2025, args.end):
+        if args.start <= year <= args.end:
+            index = 1 + (year - args.start) * 12 + 1
+            print(f"   {year}년 {JEOL_NAMES[1]}: {format_minutes(table[index])} KST")
+
+if __name__ == '__main__':
+    main()
@@ -12,6 +12,9 @@ from cryptography.hazmat.primitives.asymmetric import ec
 from cryptography.hazmat.primitives import serialization, hashes
 from cryptography.hazmat.backends import default_backend
 
+# 여러 번 전송할 때 TLS 연결을 재사용하기 위한 keep-alive 세션
+http_session = requests.Session()
+
 def send_push_notification(subscription_info, title, body, data=None, vapid_email="", vapid_public_key="", vapid_private_key="", app_url=""):
     """푸시 알림 전송 - 직접 HTTP 요청 (Web Push 프로토콜)"""
     try:
@@ -75,7 +78,7 @@ def send_push_notification(subscription_info, title, body, data=None, vapid_emai
         print(f"📨 JWT 토큰 길이: {len(jwt_token)}")
 
         # HTTP 요청 전송
-        response = requests.post(
+        response = http_session.post(
             endpoint,
             data=push_payload.encode('utf-8'),
             headers=headers,